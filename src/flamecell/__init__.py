@@ -1,3 +1 @@
-# read version from installed package
-from importlib.metadata import version
-__version__ = "0.4.0"
\ No newline at end of file
+__version__ = "0.4.0"
@@ -6,7 +6,8 @@ This app allows users to:
 - Generate a simulation grid from raster data.
 - Set environmental parameters (wind, humidity, temperature).
 - Start a fire by clicking on the grid.
-- Run and visualize a step-by-step cellular automaton fire spread simulation.
+- Run and visualize a step-by-step cellular automaton fire spread simulation
+  in the background, with pause, resume and cancel.
 - View a risk map based on simulation results.
 
 Requirements:
@@ -17,12 +18,37 @@ import streamlit as st
 from streamlit_folium import st_folium
 from streamlit_image_coordinates import streamlit_image_coordinates
 import folium
-import rasterio
 import os
+import matplotlib.pyplot as plt
 import numpy as np
 import sys
+from time import sleep
 sys.path.append("../flamecell/src")
 from flamecell.sim_utils import *
+from flamecell.raster import RasterSource
+from flamecell.weather import WeatherClient, WeatherError, WeatherSchedule
+from flamecell.worker import SimulationWorker
+
+
+@st.cache_resource
+def open_raster(path, cache_dir):
+    """Open the land use map once per server process, with its tile caches."""
+    return RasterSource(path, cache_dir=cache_dir)
+
+
+@st.cache_resource
+def weather_client():
+    """Weather client shared by all sessions, with its connection pool and cache."""
+    return WeatherClient(ttl=600)
+
+
+def stop_worker():
+    """Cancel the background run of this session, if any."""
+    worker = st.session_state.get("worker")
+    if worker is not None:
+        worker.cancel()
+        worker.join()
+        st.session_state.worker = None
 
 
 def main():
@@ -34,110 +60,175 @@ def main():
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     TIF_PATH = os.path.join(BASE_DIR, 'data', 'DE_10m_3035_tiled.tif')
 
-    with rasterio.open(TIF_PATH) as src:
-        m = folium.Map(location=[51.1657, 10.4515], zoom_start=6)
-        map_data = st_folium(m, width=700, height=700)
-
-        bounds = map_data.get("bounds")
-        if not bounds:
-            st.warning("Waiting for map bounds...")
-            return
-
-        south = bounds['_southWest']['lat']
-        west = bounds['_southWest']['lng']
-        north = bounds['_northEast']['lat']
-        east = bounds['_northEast']['lng']
-
-        st.sidebar.write("Bounds:")
-        st.sidebar.write(f"South={south}, West={west}, North={north}, East={east}")
-
-        # Resolution
-        resolution = st.sidebar.selectbox("Resolution", [128, 256, 512, 1024, "Custom"], index=0)
-        if resolution == "Custom":
-            resolution = st.sidebar.number_input("Enter custom resolution", min_value=10, max_value=2000, value=256)
-
-        # Wind
-        wind_source = st.sidebar.selectbox("Wind", ["Current", "Custom"])
-        if wind_source == "Current":
-            wspd, wdir, time = get_current_wind((south + north) / 2, (west + east) / 2)
-            st.sidebar.write(f"Current wind speed: {wspd} km/h")
-            st.sidebar.write(f"Direction: {wdir}°")
-            st.sidebar.write(f"Data & Time: {time}")
-        else:
-            wdir = st.sidebar.number_input("Custom wind direction [degree]", min_value=0, max_value=360, value=0)
-            wspd = st.sidebar.number_input("Custom wind speed [km/h]", min_value=0, value=0)
-
-        wind = np.array([
-            wspd * np.cos(np.radians(wdir)),
-            wspd * np.sin(np.radians(wdir))
-        ])
-
-        # Humidity
-        humidity_source = st.sidebar.selectbox("Humidity", ["Current", "Custom"])
-        if humidity_source == "Current":
-            rel_humi, time = get_current_humidity((south + north) / 2, (west + east) / 2)
-            st.sidebar.write(f"Humidity: {rel_humi}%")
-            st.sidebar.write(f"Data & Time: {time}")
-        else:
-            rel_humi = st.sidebar.number_input("Custom humidity %", min_value=0, max_value=100, value=40)
-
-        # Temperature
-        temperature_source = st.sidebar.selectbox("Temperature", ["Current", "Custom"])
-        if temperature_source == "Current":
-            temp, time = get_current_temperature((south + north) / 2, (west + east) / 2)
-            st.sidebar.write(f"Temperature: {temp}°C")
-            st.sidebar.write(f"Data & Time: {time}")
-        else:
-            temp = st.sidebar.number_input("Custom temperature °C", min_value=-30, max_value=60, value=20)
-
-        # Session state setup
-        for key in ["grid", "img", "data", "sim"]:
-            if key not in st.session_state:
-                st.session_state[key] = None
-
-        if st.sidebar.button("Generate Grid"):
-            st.session_state.data, transform = crop_and_resample(src, bounds, output_size=(resolution, resolution))
-            st.session_state.grid = raster_to_grid(st.session_state.data[0])
-            st.session_state.img = grid_to_img(st.session_state.grid)
-            st.rerun()
-
-        if st.sidebar.button("Reset"):
-            st.session_state.grid = raster_to_grid(st.session_state.data[0])
-            st.session_state.img = grid_to_img(st.session_state.grid)
-            st.rerun()
-
-        if st.session_state.img is not None:
-            st.subheader("Click to set fire")
-            coords = streamlit_image_coordinates(st.session_state.img, width=512, key="set_fire")
-            if coords:
-                frac = resolution / coords["width"]
-                fire_source = (round(coords["x"] * frac), round(coords["y"] * frac))
-                if st.session_state.grid.state[fire_source[1], fire_source[0]] in ["TREE", "GRASS"]:
-                    st.session_state.grid.state[fire_source[1], fire_source[0]] = "FIRE"
-                    st.session_state.img = grid_to_img(st.session_state.grid)
-                    st.rerun()
-
-        # Run simulation
-        prob = 0.2
-        # prob = st.sidebar.slider("Ignition Probability per Neighbor", 0.0, 1.0, 0.2, 0.01)
-
-        if st.sidebar.button("Run Simulation"):
-            ruleset = RuleSet()
-            ruleset.add_rule(burning)
-            ruleset.add_rule(ignite)
-
-            sim = Simulation(st.session_state.grid, ruleset)
-            sim.max_steps = resolution
-            st.session_state.sim = sim
-
-            plot_area = st.empty()
-            while sim.step_count < sim.max_steps:
-                sim.step(prob=prob, humidity=rel_humi, wind=wind, temp=temp)
-                fig = plot_grid(st.session_state.grid)
-                plot_area.pyplot(fig, use_container_width=True)
-
-            risk_fig = plot_risk_map(sim)
+    src = open_raster(TIF_PATH, os.path.join(BASE_DIR, 'data', 'cache'))
+    m = folium.Map(location=[51.1657, 10.4515], zoom_start=6)
+    map_data = st_folium(m, width=700, height=700)
+
+    bounds = map_data.get("bounds")
+    if not bounds:
+        st.warning("Waiting for map bounds...")
+        return
+
+    south = bounds['_southWest']['lat']
+    west = bounds['_southWest']['lng']
+    north = bounds['_northEast']['lat']
+    east = bounds['_northEast']['lng']
+
+    st.sidebar.write("Bounds:")
+    st.sidebar.write(f"South={south}, West={west}, North={north}, East={east}")
+
+    # Resolution
+    resolution = st.sidebar.selectbox("Resolution", [128, 256, 512, 1024, "Custom"], index=0)
+    if resolution == "Custom":
+        resolution = st.sidebar.number_input("Enter custom resolution", min_value=10, max_value=2000, value=256)
+
+    # Current weather at the map centre: one request for all variables, fetched
+    # only if needed and cached by the client across reruns
+    fetched = {}
+    def current_weather():
+        if "weather" not in fetched:
+            try:
+                fetched["weather"] = weather_client().current((south + north) / 2, (west + east) / 2)
+            except WeatherError as e:
+                st.sidebar.warning(f"Current weather unavailable, using custom values: {e}")
+                fetched["weather"] = None
+        return fetched["weather"]
+
+    # Wind
+    wind_source = st.sidebar.selectbox("Wind", ["Current", "Custom"])
+    weather = current_weather() if wind_source == "Current" else None
+    if weather is not None:
+        wspd, wdir = weather.wind_speed, weather.wind_direction
+        st.sidebar.write(f"Current wind speed: {wspd} km/h")
+        st.sidebar.write(f"Direction: {wdir}°")
+        st.sidebar.write(f"Data & Time: {weather.time}")
+    else:
+        wdir = st.sidebar.number_input("Custom wind direction [degree]", min_value=0, max_value=360, value=0)
+        wspd = st.sidebar.number_input("Custom wind speed [km/h]", min_value=0, value=0)
+
+    wind = np.array([
+        wspd * np.cos(np.radians(wdir)),
+        wspd * np.sin(np.radians(wdir))
+    ])
+
+    # Humidity
+    humidity_source = st.sidebar.selectbox("Humidity", ["Current", "Custom"])
+    weather = current_weather() if humidity_source == "Current" else None
+    if weather is not None:
+        rel_humi = weather.humidity
+        st.sidebar.write(f"Humidity: {rel_humi}%")
+        st.sidebar.write(f"Data & Time: {weather.time}")
+    else:
+        rel_humi = st.sidebar.number_input("Custom humidity %", min_value=0, max_value=100, value=40)
+
+    # Temperature
+    temperature_source = st.sidebar.selectbox("Temperature", ["Current", "Custom"])
+    weather = current_weather() if temperature_source == "Current" else None
+    if weather is not None:
+        temp = weather.temperature
+        st.sidebar.write(f"Temperature: {temp}°C")
+        st.sidebar.write(f"Data & Time: {weather.time}")
+    else:
+        temp = st.sidebar.number_input("Custom temperature °C", min_value=-30, max_value=60, value=20)
+
+    # Changing weather over the run from the hourly forecast
+    use_forecast = st.sidebar.checkbox("Hourly forecast weather")
+    if use_forecast:
+        step_minutes = st.sidebar.number_input("Minutes per step", min_value=1, max_value=240, value=10)
+
+    # Session state setup
+    for key in ["grid", "img", "data", "sim", "worker"]:
+        if key not in st.session_state:
+            st.session_state[key] = None
+
+    if st.sidebar.button("Generate Grid"):
+        stop_worker()
+        st.session_state.data, transform = crop_and_resample(src, bounds, output_size=(resolution, resolution))
+        st.session_state.grid = raster_to_grid(st.session_state.data[0], compact=True)
+        st.session_state.img = grid_to_img(st.session_state.grid)
+        st.rerun()
+
+    if st.sidebar.button("Reset"):
+        stop_worker()
+        st.session_state.grid = raster_to_grid(st.session_state.data[0], compact=True)
+        st.session_state.img = grid_to_img(st.session_state.grid)
+        st.rerun()
+
+    if st.session_state.img is not None:
+        st.subheader("Click to set fire")
+        coords = streamlit_image_coordinates(st.session_state.img, width=512, key="set_fire")
+        if coords:
+            frac = resolution / coords["width"]
+            fire_source = (round(coords["x"] * frac), round(coords["y"] * frac))
+            if st.session_state.grid.state[fire_source[1], fire_source[0]] in (CellState.TREE, CellState.GRASS):
+                st.session_state.grid.state[fire_source[1], fire_source[0]] = CellState.FIRE
+                st.session_state.img = grid_to_img(st.session_state.grid)
+                st.rerun()
+
+    # Run simulation
+    prob = 0.2
+    # prob = st.sidebar.slider("Ignition Probability per Neighbor", 0.0, 1.0, 0.2, 0.01)
+    fps = st.sidebar.slider("Display frames per second", 1, 30, 10)
+    profile = st.sidebar.checkbox("Profile simulation steps", value=False)
+
+    if st.sidebar.button("Run Simulation"):
+        stop_worker()
+        ruleset = RuleSet()
+        ruleset.add_rule(burning)
+        ruleset.add_rule(ignite)
+
+        sim = Simulation(st.session_state.grid, ruleset, engine="vector")
+        sim.max_steps = resolution
+        if profile:
+            sim.profile(count_changes=False)
+        st.session_state.sim = sim
+
+        # the run continues in the background across reruns of this script
+        schedule = None
+        if use_forecast:
+            hours = int(np.ceil(sim.max_steps * step_minutes / 60)) + 1
+            try:
+                forecast = weather_client().forecast((south + north) / 2, (west + east) / 2, hours=hours)
+                schedule = WeatherSchedule.from_forecast(forecast, sim.max_steps, step_minutes=step_minutes)
+            except WeatherError as e:
+                st.sidebar.warning(f"Forecast unavailable, using fixed weather: {e}")
+        worker = SimulationWorker(sim, max_size=512)
+        worker.start(prob=prob, humidity=rel_humi, wind=wind, temp=temp, weather=schedule)
+        st.session_state.worker = worker
+
+    worker = st.session_state.worker
+    if worker is not None:
+        pause_col, resume_col, cancel_col = st.sidebar.columns(3)
+        if pause_col.button("Pause"):
+            worker.pause()
+        if resume_col.button("Resume"):
+            worker.resume()
+        if cancel_col.button("Cancel"):
+            worker.cancel()
+
+        # poll the newest frame at the display rate until the run ends or pauses
+        plot_area = st.empty()
+        status = st.sidebar.empty()
+        frame = None
+        while True:
+            frame = worker.latest() or frame
+            if frame is not None:
+                plot_area.image(frame.image, use_container_width=True)
+                status.write(f"Step {frame.step}: {frame.fire_count} burning, {frame.burned_area} burned")
+            if not worker.running or worker.paused:
+                break
+            sleep(1 / fps)
+
+        if worker.error is not None:
+            st.sidebar.error(f"Simulation failed: {worker.error}")
+        elif worker.done:
+            result = worker.result
+            st.sidebar.write(f"Simulation stopped after {result.step_count} steps ({result.reason})")
+            risk_fig = plot_risk_map(worker.sim)
             plot_area.pyplot(risk_fig, use_container_width=True)
+            plt.close(risk_fig)
+            if worker.sim.profiler is not None:
+                st.sidebar.code(worker.sim.profiler.summary())
 
 
 if __name__ == "__main__":
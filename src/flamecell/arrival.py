@@ -0,0 +1,261 @@
+"""
+Forest Fire Simulation Framework
+
+This module computes a deterministic fire arrival-time map in one pass, as a
+quick alternative to stepping the stochastic automaton many times.
+
+Fire spreads over the same 8-neighborhood as in the simulation. Each edge
+from a burning cell to a flammable neighbor gets the expected number of
+steps the spread takes. The cost uses the per-step ignition probability of
+`ignite` with a single burning neighbor (base probability, wind alignment,
+humidity and temperature at the target) and the burn duration of the source,
+i.e. the expected number of steps `burning` needs to burn down its health.
+The earliest arrival over all paths is found either with a priority queue
+(Dijkstra) or with repeated vectorized row sweeps that give the same times
+and handle grids of millions of cells.
+
+The result holds steps since the start, 0 at burning cells and NaN where the
+fire never arrives, so it can be passed as ``plot_risk_map(sim, risk=...)``.
+"""
+
+import heapq
+
+import numpy as np
+
+from flamecell.rules import NEIGHBOR_OFFSETS, CoarseField
+from flamecell.states import CellState
+
+# cost of an edge the fire does not cross; arrival times beyond half of it mean never
+BLOCKED = 1e6
+
+def expected_burn_steps(health, max_health=127):
+    """
+    Expected number of steps a cell burns before turning to ash.
+
+    `burning` takes 1 or 2 health points per step with equal chance, so a
+    cell with health h burns for E(h) = 1 + (E(h-1) + E(h-2)) / 2 steps.
+
+    Parameters
+    ----------
+    health : array_like
+        Health of the cells.
+    max_health : int, optional
+        Largest health in the table (default is 127, the int8 maximum).
+
+    Returns
+    -------
+    np.ndarray
+        Expected steps; at least 1, so burning cells with no health left
+        still spread for the step they burn out in.
+    """
+    table = np.zeros(max_health + 1)
+    for h in range(1, max_health + 1):
+        table[h] = 1 + (table[h - 1] + table[max(h - 2, 0)]) / 2
+    table[0] = 1
+    return table[np.clip(np.asarray(health, dtype=np.int64), 0, max_health)]
+
+def edge_cost(p, burn_steps, min_prob=0.01):
+    """
+    Expected steps for a burning cell to ignite a neighbor.
+
+    With per-step ignition probability `p` and `burn_steps` steps before the
+    source burns out, the spread happens at all with probability
+    ``q = 1 - (1 - p) ** burn_steps`` and, if it does, after
+    ``E = 1 / p - burn_steps * (1 - p) ** burn_steps / q`` steps on average.
+    The cost is ``E / q``, which is 1 for certain ignition and grows as
+    spreading becomes unlikely.
+
+    Parameters
+    ----------
+    p : np.ndarray
+        Per-step ignition probability.
+    burn_steps : np.ndarray
+        Burn duration of the source in steps.
+    min_prob : float, optional
+        Edges whose chance to spread ``q`` is below this are blocked
+        (default is 0.01).
+
+    Returns
+    -------
+    np.ndarray
+        Cost in steps, `BLOCKED` for edges the fire does not cross.
+    """
+    p = np.clip(p, 0.0, 1.0)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        miss = (1 - p) ** burn_steps
+        q = 1 - miss
+        cost = (1 / p - burn_steps * miss / q) / q
+    return np.where((q >= max(min_prob, 1e-9)) & (p > 0), cost, BLOCKED)
+
+def _field(value):
+    # per-cell input as a float array, or a float for the whole grid
+    if isinstance(value, CoarseField):
+        return value.toarray()
+    value = np.asarray(value, dtype=float)
+    return value if value.ndim else float(value)
+
+def spread_costs(grid, prob=0.2, humidity=40, wind=np.array([0, 0]), temp=20, burn_steps=None,
+                 min_prob=0.01, dtype=np.float32, chunk=512):
+    """
+    Cost of every edge of the grid, per neighbor offset.
+
+    Parameters
+    ----------
+    grid : Grid
+        Simulation grid.
+    prob, humidity, wind, temp : optional
+        Same as in `ignite_array`; humidity, temp and each wind component can
+        be per-cell fields.
+    burn_steps : array_like, optional
+        Burn duration per cell in steps (default is `expected_burn_steps` of
+        the grid health).
+    min_prob : float, optional
+        See `edge_cost`.
+    dtype : numpy dtype, optional
+        Type of the costs (default is float32).
+    chunk : int, optional
+        Rows computed at once, bounding temporary memory (default is 512).
+
+    Returns
+    -------
+    dict
+        (dx, dy) to an array whose cell (y, x) holds the cost of the edge
+        from (x + dx, y + dy) to (x, y).
+    """
+    codes = grid.state_codes()
+    height, width = codes.shape
+    burnable = (codes == CellState.TREE) | (codes == CellState.GRASS)
+    # computed in the precision of the costs, which is plenty for step counts
+    factor = prob * (1 - 0.009 * _field(humidity)) * (1 + 0.02 * (_field(temp) - 20))
+    factor = np.where(burnable, factor, 0.0).astype(dtype)
+    wind_x, wind_y = (np.broadcast_to(np.asarray(_field(w), dtype=dtype), codes.shape) for w in wind[:2])
+    steps = expected_burn_steps(grid.health) if burn_steps is None else np.broadcast_to(burn_steps, codes.shape)
+
+    costs = {}
+    for dx, dy in NEIGHBOR_OFFSETS:
+        # burn duration of the source of every edge, 0 where it is off the grid
+        source = np.zeros(codes.shape, dtype=dtype)
+        source[max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)] = \
+            steps[max(dy, 0):height - max(-dy, 0), max(dx, 0):width - max(-dx, 0)]
+        cost = np.empty(codes.shape, dtype=dtype)
+        for start in range(0, height, chunk):
+            rows = slice(start, start + chunk)
+            p = (1 + 0.02 * (dx * wind_x[rows] + dy * wind_y[rows])) * factor[rows]
+            cost[rows] = edge_cost(p, source[rows], min_prob)
+        costs[dx, dy] = cost
+    return costs
+
+def _offsets(costs):
+    # distance along each row from its first cell, fire moving to higher
+    # indices; costs[y, i] is the edge i-1 -> i
+    offsets = np.cumsum(costs, axis=1, dtype=float)
+    offsets -= offsets[:, :1]
+    return offsets
+
+def _scan(times, offsets):
+    # earliest times along a row with the offsets of `_offsets`
+    return np.minimum(times, offsets + np.minimum.accumulate(times - offsets))
+
+def _solve_sweep(times, costs, max_sweeps, tolerance=1e-6):
+    height = times.shape[0]
+    rightward = _offsets(costs[-1, 0])
+    leftward = _offsets(costs[1, 0][:, ::-1])
+    # a row is only revisited when the row the fire comes from changed since
+    # it was last processed, so later sweeps only touch the rows still improving
+    changed_at = np.zeros(height, dtype=np.int64)
+    processed_at = np.full(height, -1, dtype=np.int64)
+    clock = 0
+    for _ in range(max_sweeps):
+        changed = False
+        # downwards the fire comes from the row above (dy = -1), upwards from below
+        for rows, dy in ((range(height), -1), (range(height - 1, -1, -1), 1)):
+            straight, left, right = costs[0, dy], costs[-1, dy], costs[1, dy]
+            for y in rows:
+                has_prev = 0 <= y + dy < height
+                if processed_at[y] >= 0 and not (has_prev and changed_at[y + dy] > processed_at[y]):
+                    continue
+                clock += 1
+                processed_at[y] = clock
+                row = times[y]
+                if has_prev:
+                    prev = times[y + dy]
+                    new = np.minimum(row, prev + straight[y])
+                    np.minimum(new[1:], prev[:-1] + left[y, 1:], out=new[1:])
+                    np.minimum(new[:-1], prev[1:] + right[y, :-1], out=new[:-1])
+                else:
+                    new = row
+                new = _scan(new, rightward[y])
+                new = _scan(new[::-1], leftward[y])[::-1]
+                if (new < row - tolerance).any():
+                    changed = True
+                    changed_at[y] = clock
+                times[y] = new
+        if not changed:
+            break
+    return times
+
+def _solve_dijkstra(times, costs):
+    height, width = times.shape
+    flat = times.ravel()
+    edges = [(dx, dy, costs[dx, dy].ravel()) for dx, dy in NEIGHBOR_OFFSETS]
+    queue = [(0.0, int(cell)) for cell in np.flatnonzero(flat == 0)]
+    heapq.heapify(queue)
+    while queue:
+        time, cell = heapq.heappop(queue)
+        if time > flat[cell]:
+            continue
+        y, x = divmod(cell, width)
+        # the edge (dx, dy) of a target leaves the source at (x + dx, y + dy)
+        for dx, dy, cost in edges:
+            tx, ty = x - dx, y - dy
+            if 0 <= tx < width and 0 <= ty < height:
+                target = ty * width + tx
+                step = cost[target]
+                if step < BLOCKED and time + step < flat[target]:
+                    flat[target] = time + step
+                    heapq.heappush(queue, (time + step, target))
+    return times
+
+def arrival_time(grid, prob=0.2, humidity=40, wind=np.array([0, 0]), temp=20, burn_steps=None,
+                 min_prob=0.01, method="sweep", max_sweeps=100):
+    """
+    Expected step at which fire reaches every cell, from the burning cells.
+
+    Parameters
+    ----------
+    grid : Grid
+        Simulation grid; its burning cells are the ignition points.
+    prob : float, optional
+        Base ignition probability (default is 0.2, as in `Simulation.step`).
+    humidity, wind, temp : optional
+        Weather as passed to `Simulation.step`, each also per cell.
+    burn_steps : array_like, optional
+        Burn duration per cell in steps (default is `expected_burn_steps` of
+        the grid health).
+    min_prob : float, optional
+        Edges along which the fire spreads with a lower chance are blocked
+        (default is 0.01).
+    method : {'sweep', 'dijkstra'}, optional
+        Vectorized row sweeps (default) or a priority queue over single
+        cells; both give the same times, the queue is only fast on small grids.
+    max_sweeps : int, optional
+        Maximum number of down-and-up sweeps (default is 100); paths that
+        wind back and forth more often than this may end up late.
+
+    Returns
+    -------
+    np.ndarray
+        float32 arrival steps, 0 at burning cells and NaN where the fire never arrives.
+    """
+    if method not in ("sweep", "dijkstra"):
+        raise ValueError(f"Unknown method '{method}', expected 'sweep' or 'dijkstra'")
+    costs = spread_costs(grid, prob=prob, humidity=humidity, wind=wind, temp=temp, burn_steps=burn_steps,
+                         min_prob=min_prob)
+    times = np.full((grid.height, grid.width), np.inf)
+    times[grid.state_codes() == CellState.FIRE] = 0
+    if method == "sweep":
+        _solve_sweep(times, costs, max_sweeps)
+    else:
+        _solve_dijkstra(times, costs)
+    times[times >= BLOCKED / 2] = np.nan
+    return times.astype(np.float32)
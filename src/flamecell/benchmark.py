@@ -0,0 +1,398 @@
+"""
+Forest Fire Simulation Framework
+
+This module benchmarks the hot paths of flamecell on synthetic data, so the
+effect of a change on speed and memory can be measured offline: stepping a
+simulation on grids of several sizes and fire densities, converting land
+cover to a grid, rendering a grid, and cropping a generated GeoTIFF.
+
+Every case is timed `repeat` times on fresh inputs, then run once more under
+`tracemalloc` for its peak memory. Results are written as JSON, and two
+result files can be compared case by case::
+
+    python -m flamecell.benchmark -o before.json
+    python -m flamecell.benchmark -o after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+# land-cover classes of the synthetic rasters: trees, grassland, farmland, water, unmapped
+LANDCOVER_CLASSES = np.array([31, 32, 22, 5, 0], dtype=np.uint8)
+LANDCOVER_WEIGHTS = np.array([0.45, 0.25, 0.15, 0.1, 0.05])
+
+DEFAULT_SIZES = (128, 256, 512, 1024, 2048)
+DEFAULT_DENSITIES = (0.001, 0.01, 0.1)
+DEFAULT_ENGINES = ("vector", "sparse")
+
+def synthetic_landcover(size, patch=16, seed=0):
+    """
+    Land-cover raster of random square patches.
+
+    Parameters
+    ----------
+    size : int
+        Side of the raster in pixels.
+    patch : int, optional
+        Side of a patch of one class (default is 16).
+    seed : int, optional
+        Random seed (default is 0).
+
+    Returns
+    -------
+    np.ndarray
+        uint8 array of shape (size, size) with classes of `LANDCOVER_CLASSES`.
+    """
+    rng = np.random.RandomState(seed)
+    blocks = -(-size // patch)
+    coarse = rng.choice(LANDCOVER_CLASSES, size=(blocks, blocks), p=LANDCOVER_WEIGHTS)
+    return np.repeat(np.repeat(coarse, patch, axis=0), patch, axis=1)[:size, :size]
+
+def write_synthetic_raster(path, size=4096, pixel=10.0, seed=0):
+    """
+    Write a synthetic land-cover GeoTIFF in EPSG:3035.
+
+    Parameters
+    ----------
+    path : str
+        Output file.
+    size : int, optional
+        Side of the raster in pixels (default is 4096).
+    pixel : float, optional
+        Pixel size in metres (default is 10).
+    seed : int, optional
+        Random seed (default is 0).
+
+    Returns
+    -------
+    str
+        The output file.
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+
+    with rasterio.open(path, "w", driver="GTiff", width=size, height=size, count=1, dtype="uint8",
+                       crs="EPSG:3035", transform=from_origin(4000000.0, 3000000.0, pixel, pixel),
+                       tiled=True, blockxsize=256, blockysize=256) as dst:
+        dst.write(synthetic_landcover(size, seed=seed), 1)
+    return path
+
+def fire_grid(size, density, seed=0):
+    """
+    Compact grid of synthetic land cover with a share of its vegetation burning.
+
+    Parameters
+    ----------
+    size : int
+        Side of the grid in cells.
+    density : float
+        Share of burnable cells set on fire, at random positions.
+    seed : int, optional
+        Random seed (default is 0).
+
+    Returns
+    -------
+    Grid
+        Simulation grid.
+    """
+    from flamecell.sim_utils import raster_to_grid
+    from flamecell.states import CellState
+
+    grid = raster_to_grid(synthetic_landcover(size, seed=seed), compact=True)
+    burnable = np.flatnonzero((grid.state == CellState.TREE) | (grid.state == CellState.GRASS))
+    count = max(int(len(burnable) * density), 1)
+    fires = np.random.RandomState(seed + 1).choice(burnable, size=count, replace=False)
+    grid.state.ravel()[fires] = CellState.FIRE
+    return grid
+
+def measure(func, setup=None, repeat=5):
+    """
+    Time a function and record its peak memory.
+
+    Parameters
+    ----------
+    func : callable
+        Function to time; it is passed the result of `setup`, if given.
+    setup : callable, optional
+        Untimed function preparing fresh arguments before every call.
+    repeat : int, optional
+        Number of timed calls (default is 5).
+
+    Returns
+    -------
+    dict
+        ``best`` and ``median`` seconds of one call and ``peak_bytes``
+        allocated by one extra call traced with `tracemalloc`.
+    """
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    args = () if setup is None else (setup(),)
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"best": min(times), "median": float(np.median(times)), "peak_bytes": peak}
+
+def bench_step(sizes, densities, engines, steps=5, repeat=5):
+    """
+    Benchmark `Simulation.step` on grids of every size, fire density and engine.
+
+    Parameters
+    ----------
+    sizes, densities, engines : sequence
+        Grid sides, fire densities (see `fire_grid`) and engine names.
+    steps : int, optional
+        Steps per timed call (default is 5).
+    repeat : int, optional
+        Number of timed calls (default is 5).
+
+    Returns
+    -------
+    list of dict
+        One result per case, with the grid cells processed per second.
+    """
+    from flamecell.rules import burning, ignite
+    from flamecell.sim_utils import Grid, RuleSet, Simulation
+
+    ruleset = RuleSet()
+    ruleset.add_rule(burning)
+    ruleset.add_rule(ignite)
+    results = []
+    for size in sizes:
+        for density in densities:
+            initial = fire_grid(size, density)
+            for engine in engines:
+                def setup():
+                    grid = Grid.from_arrays(initial.state.copy(), initial.health.copy())
+                    return Simulation(grid, ruleset, engine=engine, seed=0)
+
+                def run(sim):
+                    with sim:
+                        for _ in range(steps):
+                            sim.step(prob=0.3, humidity=30, wind=np.array([3, 1]))
+
+                result = measure(run, setup, repeat)
+                result["median"] /= steps
+                result["best"] /= steps
+                results.append({"case": "step", "engine": engine, "size": size, "density": density,
+                                "cells_per_second": size * size / result["median"], **result})
+    return results
+
+def bench_convert(sizes, repeat=5):
+    """
+    Benchmark `raster_to_grid`, `grid_to_img` and `plot_grid` on every size.
+
+    Parameters
+    ----------
+    sizes : sequence
+        Grid sides.
+    repeat : int, optional
+        Number of timed calls (default is 5).
+
+    Returns
+    -------
+    list of dict
+        One result per function and size.
+    """
+    import matplotlib.pyplot as plt
+
+    from flamecell.sim_utils import grid_to_img, plot_grid, raster_to_grid
+
+    def plot(grid):
+        plt.close(plot_grid(grid))
+
+    results = []
+    for size in sizes:
+        data = synthetic_landcover(size)
+        grid = raster_to_grid(data, compact=True)
+        cases = [("raster_to_grid", lambda: raster_to_grid(data, compact=True)),
+                 ("grid_to_img", lambda: grid_to_img(grid)),
+                 ("plot_grid", lambda: plot(grid))]
+        for case, func in cases:
+            result = measure(func, repeat=repeat)
+            results.append({"case": case, "size": size, "cells_per_second": size * size / result["median"],
+                            **result})
+    return results
+
+def bench_crop(path, output_sizes, repeat=5):
+    """
+    Benchmark `crop_and_resample` on a GeoTIFF, reading it directly and
+    through a `RasterSource` with cold and warm tile caches.
+
+    Parameters
+    ----------
+    path : str
+        Land-cover GeoTIFF, e.g. from `write_synthetic_raster`.
+    output_sizes : sequence
+        Output sides in pixels.
+    repeat : int, optional
+        Number of timed calls (default is 5).
+
+    Returns
+    -------
+    list of dict
+        One result per reader and output size.
+    """
+    import rasterio
+    from rasterio.warp import transform_bounds
+
+    from flamecell.raster import RasterSource
+    from flamecell.sim_utils import crop_and_resample
+
+    results = []
+    with rasterio.open(path) as src:
+        left, bottom, right, top = src.bounds
+        # central half of the raster as Leaflet bounds
+        west, south, east, north = transform_bounds(
+            src.crs, "EPSG:4326", left + (right - left) / 4, bottom + (top - bottom) / 4,
+            right - (right - left) / 4, top - (top - bottom) / 4)
+        bounds = {"_southWest": {"lat": south, "lng": west}, "_northEast": {"lat": north, "lng": east}}
+        for size in output_sizes:
+            result = measure(lambda: crop_and_resample(src, bounds, (size, size)), repeat=repeat)
+            results.append({"case": "crop", "reader": "rasterio", "size": size, **result})
+
+    for size in output_sizes:
+        def cold():
+            with RasterSource(path) as source:
+                crop_and_resample(source, bounds, (size, size))
+
+        result = measure(cold, repeat=repeat)
+        results.append({"case": "crop", "reader": "RasterSource cold", "size": size, **result})
+        with RasterSource(path) as source:
+            crop_and_resample(source, bounds, (size, size))
+            result = measure(lambda: crop_and_resample(source, bounds, (size, size)), repeat=repeat)
+        results.append({"case": "crop", "reader": "RasterSource warm", "size": size, **result})
+    return results
+
+def run_benchmarks(sizes=DEFAULT_SIZES, densities=DEFAULT_DENSITIES, engines=DEFAULT_ENGINES, steps=5,
+                   repeat=5, raster_size=4096, raster=None):
+    """
+    Run all benchmarks.
+
+    Parameters
+    ----------
+    sizes : sequence, optional
+        Grid and crop output sides (default is `DEFAULT_SIZES`).
+    densities : sequence, optional
+        Fire densities of the step benchmark (default is `DEFAULT_DENSITIES`).
+    engines : sequence, optional
+        Engines of the step benchmark (default is `DEFAULT_ENGINES`).
+    steps : int, optional
+        Steps per timed call of the step benchmark (default is 5).
+    repeat : int, optional
+        Number of timed calls per case (default is 5).
+    raster_size : int, optional
+        Side of the generated GeoTIFF in pixels (default is 4096).
+    raster : str, optional
+        GeoTIFF to crop instead of a generated one.
+
+    Returns
+    -------
+    dict
+        ``environment`` of the run and the list of ``results``.
+    """
+    import flamecell
+
+    results = bench_step(sizes, densities, engines, steps=steps, repeat=repeat)
+    results += bench_convert(sizes, repeat=repeat)
+    if raster is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_synthetic_raster(os.path.join(tmp, "landcover.tif"), size=raster_size)
+            results += bench_crop(path, sizes, repeat=repeat)
+    else:
+        results += bench_crop(raster, sizes, repeat=repeat)
+    environment = {
+        "flamecell": flamecell.__version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "raster": raster if raster is not None else f"synthetic {raster_size}x{raster_size}",
+    }
+    return {"environment": environment, "results": results}
+
+def case_key(result):
+    """Fields identifying the case of a result, for matching across runs."""
+    return tuple((name, result[name]) for name in ("case", "engine", "reader", "size", "density")
+                 if name in result)
+
+def compare(old, new):
+    """
+    Ratio of median times of the cases two benchmark runs have in common.
+
+    Parameters
+    ----------
+    old, new : dict
+        Results of `run_benchmarks`, e.g. loaded from their JSON files.
+
+    Returns
+    -------
+    list of tuple
+        (case key, old median, new median, speedup) with speedup above 1 when
+        the new run is faster.
+    """
+    before = {case_key(result): result for result in old["results"]}
+    rows = []
+    for result in new["results"]:
+        key = case_key(result)
+        if key in before:
+            rows.append((key, before[key]["median"], result["median"], before[key]["median"] / result["median"]))
+    return rows
+
+def format_results(results):
+    """Results as an aligned text table."""
+    lines = [f"{'case':<44} {'median ms':>10} {'best ms':>10} {'peak MiB':>9} {'Mcells/s':>9}"]
+    for result in results:
+        name = " ".join(str(value) for _, value in case_key(result))
+        rate = result.get("cells_per_second")
+        lines.append(f"{name:<44} {result['median'] * 1e3:>10.2f} {result['best'] * 1e3:>10.2f} "
+                     f"{result['peak_bytes'] / 2**20:>9.1f} {'' if rate is None else f'{rate / 1e6:.1f}':>9}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark flamecell on synthetic land cover.")
+    parser.add_argument("-o", "--output", help="JSON file to write the results to")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare with")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="grid sides")
+    parser.add_argument("--densities", type=float, nargs="+", default=DEFAULT_DENSITIES, help="fire densities")
+    parser.add_argument("--engines", nargs="+", default=DEFAULT_ENGINES, help="simulation engines")
+    parser.add_argument("--steps", type=int, default=5, help="steps per timed call")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per case")
+    parser.add_argument("--raster-size", type=int, default=4096, help="side of the generated GeoTIFF")
+    parser.add_argument("--raster", help="GeoTIFF to crop instead of a generated one")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.densities, args.engines, steps=args.steps, repeat=args.repeat,
+                            raster_size=args.raster_size, raster=args.raster)
+    print(format_results(report["results"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print()
+        for key, before, after, speedup in compare(old, report):
+            name = " ".join(str(value) for _, value in key)
+            print(f"{name:<44} {before * 1e3:>10.2f} -> {after * 1e3:>10.2f} ms  x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Forest Fire Simulation Framework
+
+This module saves a simulation to a checkpoint directory and loads it back
+with the grid arrays memory-mapped, so a long run can be interrupted and
+resumed, and many what-if runs can be forked from one mid-fire state without
+reading or copying the arrays up front.
+
+A checkpoint holds ``state.npy`` (uint8 state codes), ``health.npy``,
+``ignite_time.npy``, ``burnout_time.npy``, ``series.npy`` (fire counts per
+step) and ``meta.json`` with the step count, fire counts, engine settings
+and the state of the random source. Rules are code and are
+not saved; they are passed again to `load_checkpoint`.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from flamecell.parallel import CounterRNG
+from flamecell.states import decode_states
+
+CHECKPOINT_VERSION = 2
+
+def _save_array(path, name, array):
+    # write next to the target and rename, so a simulation loaded from this
+    # checkpoint keeps its memory map of the old file while being saved over it
+    target = os.path.join(path, name)
+    with open(target + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(target + ".tmp", target)
+
+def _rng_state(rng, path):
+    # JSON-able description of a random source; MT19937 keys go to an .npy file
+    if isinstance(rng, CounterRNG):
+        return {"kind": "counter", "seed": int(rng.seed), "step": int(rng.step), "calls": int(rng.calls)}
+    if rng is np.random or isinstance(rng, np.random.RandomState):
+        name, keys, pos, has_gauss, cached_gaussian = rng.get_state()
+        _save_array(path, "rng_keys.npy", keys)
+        return {"kind": "global" if rng is np.random else "random_state", "name": name, "pos": int(pos),
+                "has_gauss": int(has_gauss), "cached_gaussian": float(cached_gaussian)}
+    raise TypeError(f"Cannot save the state of random source {type(rng).__name__}")
+
+def _restore_rng(info, path):
+    if info["kind"] == "counter":
+        rng = CounterRNG()
+        rng.seed, rng.step, rng.calls = info["seed"], info["step"], info["calls"]
+        return rng
+    state = (info["name"], np.load(os.path.join(path, "rng_keys.npy")), info["pos"],
+             info["has_gauss"], info["cached_gaussian"])
+    rng = np.random if info["kind"] == "global" else np.random.RandomState()
+    rng.set_state(state)
+    return rng
+
+def save_checkpoint(sim, path):
+    """
+    Save the grid, ignition and burn-out times, counters and random state of a simulation.
+
+    Parameters
+    ----------
+    sim : Simulation
+        Simulation to save; it can keep running afterwards.
+    path : str
+        Directory to write; created if missing, existing files are replaced.
+
+    Raises
+    ------
+    TypeError
+        If the random source of the simulation cannot be saved.
+    """
+    os.makedirs(path, exist_ok=True)
+    grid = sim.grid
+    _save_array(path, "state.npy", grid.state_codes())
+    _save_array(path, "health.npy", grid.health)
+    _save_array(path, "ignite_time.npy", sim.ignite_time)
+    _save_array(path, "burnout_time.npy", sim.burnout_time)
+    _save_array(path, "series.npy", sim._series[:sim.step_count + 1])
+    tiles_path = os.path.join(path, "active_tiles.npy")
+    if sim.active_tiles is not None:
+        _save_array(path, "active_tiles.npy", sim.active_tiles)
+    elif os.path.exists(tiles_path):
+        os.remove(tiles_path)
+    meta = {
+        "version": CHECKPOINT_VERSION,
+        "width": grid.width,
+        "height": grid.height,
+        "compact": grid.compact,
+        "engine": sim.engine,
+        "tile_size": sim.tile_size,
+        "step_count": sim.step_count,
+        "max_steps": sim.max_steps,
+        "fire_count": sim.fire_count,
+        "burned_area": sim.burned_area,
+        "rng": _rng_state(sim.rng, path),
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+def load_checkpoint(path, ruleset, engine=None, mmap_mode="c", workers=None):
+    """
+    Restore a simulation saved by `save_checkpoint`.
+
+    The arrays of compact grids are memory-mapped: only the pages a step
+    touches are read. With the default copy-on-write mode every loaded
+    simulation steps on private copies of those pages and the checkpoint is
+    never modified, so many runs can be forked from one checkpoint.
+
+    Parameters
+    ----------
+    path : str
+        Checkpoint directory.
+    ruleset : RuleSet
+        Rules of the simulation.
+    engine : str, optional
+        Engine to continue with (default is the saved one).
+    mmap_mode : {'c', 'r', None}, optional
+        Memory-map mode of the arrays: 'c' (copy-on-write, default), 'r'
+        (read-only, for inspection; stepping fails) or None to read them into memory.
+    workers : int, optional
+        Number of processes of the tiled engine.
+
+    Returns
+    -------
+    Simulation
+        Simulation at the saved step with the saved random state, so that
+        stepping it continues the original run draw for draw.
+    """
+    from flamecell.sim_utils import Grid, Simulation
+
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {meta.get('version')}")
+    state = np.load(os.path.join(path, "state.npy"), mmap_mode=mmap_mode)
+    health = np.load(os.path.join(path, "health.npy"), mmap_mode=mmap_mode)
+    ignite_time = np.load(os.path.join(path, "ignite_time.npy"), mmap_mode=mmap_mode)
+    burnout_time = np.load(os.path.join(path, "burnout_time.npy"), mmap_mode=mmap_mode)
+
+    grid = Grid.from_arrays(state if meta["compact"] else decode_states(state), health)
+    engine = meta["engine"] if engine is None else engine
+    sim = Simulation(grid, ruleset, engine=engine, tile_size=meta["tile_size"],
+                     rng=_restore_rng(meta["rng"], path), workers=workers)
+    sim.ignite_time = ignite_time
+    sim.burnout_time = burnout_time
+    sim._series = np.load(os.path.join(path, "series.npy"))
+    sim.step_count = meta["step_count"]
+    sim.max_steps = meta["max_steps"]
+    sim.fire_count = meta["fire_count"]
+    sim.burned_area = meta["burned_area"]
+    if engine == "sparse" and sim.fire_count is not None:
+        tiles_path = os.path.join(path, "active_tiles.npy")
+        if os.path.exists(tiles_path):
+            sim.active_tiles = np.load(tiles_path)
+        else:
+            # saved from another engine; the first step rebuilds the bitmap
+            sim.fire_count = None
+    return sim
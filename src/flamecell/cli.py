@@ -0,0 +1,416 @@
+"""
+Forest Fire Simulation Framework
+
+This module is the ``flamecell`` command line. ``flamecell run`` simulates
+one scenario, or a JSON file of many, without the Streamlit app: it crops
+the land-cover raster, sets the ignition points, runs the simulation with
+fixed, current, forecast or CSV weather and writes ``ignite_time.npy``,
+``burnout_time.npy``, ``state.npy``, ``health.npy`` and ``stats.json`` per
+scenario. Scenarios of
+one invocation share the opened rasters with their tile and crop caches,
+and the weather client with its cache.
+
+A scenario file holds a list of scenarios, or an object with ``defaults``
+and ``scenarios``. Keys are those of `SCENARIO_DEFAULTS`; options given on
+the command line are defaults for every scenario of the file::
+
+    [
+      {"name": "north", "bounds": [51.10, 10.40, 51.12, 10.43], "ignitions": [[64, 64]]},
+      {"name": "north-dry", "bounds": [51.10, 10.40, 51.12, 10.43], "ignitions": [[64, 64]],
+       "humidity": 15, "seed": 1}
+    ]
+
+``flamecell overviews`` and ``flamecell bench`` run `flamecell.raster` and
+`flamecell.benchmark`.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from flamecell.raster import RasterSource
+from flamecell.rules import burning, ignite
+from flamecell.sim_utils import RuleSet, Simulation, raster_to_grid
+from flamecell.states import CellState
+from flamecell.weather import WeatherClient, WeatherError, WeatherSchedule, wind_vector
+
+DEFAULT_RASTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "DE_10m_3035_tiled.tif")
+
+SCENARIO_DEFAULTS = {
+    "name": None,
+    # land-cover GeoTIFF and the area to simulate as [south, west, north, east];
+    # the whole raster without bounds
+    "raster": DEFAULT_RASTER,
+    "bounds": None,
+    "resolution": 128,
+    # ignition points as grid cells [x, y] and as [lat, lon]
+    "ignitions": [],
+    "ignitions_latlon": [],
+    # "fixed", "current" (at the centre of the area) or "forecast"; a CSV file
+    # of weather records replaces them
+    "weather": "fixed",
+    "weather_csv": None,
+    "humidity": 40.0,
+    "temperature": 20.0,
+    "wind_speed": 0.0,
+    "wind_direction": 0.0,
+    "step_minutes": 60,
+    "prob": 0.2,
+    "max_steps": None,
+    "time_budget": None,
+    "stable_steps": None,
+    "seed": None,
+    "engine": "vector",
+    "workers": None,
+}
+
+def load_scenarios(path):
+    """
+    Read a scenario file.
+
+    Parameters
+    ----------
+    path : str
+        JSON file with a list of scenarios, or an object with ``defaults``
+        and ``scenarios``.
+
+    Returns
+    -------
+    list of dict
+        Scenarios with the defaults of the file applied.
+
+    Raises
+    ------
+    ValueError
+        If the file holds no scenarios or unknown keys.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    defaults = {}
+    if isinstance(data, dict):
+        defaults = data.get("defaults", {})
+        data = data.get("scenarios")
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"No scenarios in {path}")
+    scenarios = [{**defaults, **scenario} for scenario in data]
+    for scenario in scenarios:
+        unknown = set(scenario) - set(SCENARIO_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown scenario keys in {path}: {sorted(unknown)}")
+    return scenarios
+
+def leaflet_bounds(bounds):
+    """Leaflet-style bounds dict of [south, west, north, east]."""
+    south, west, north, east = bounds
+    return {"_southWest": {"lat": south, "lng": west}, "_northEast": {"lat": north, "lng": east}}
+
+class ScenarioRunner:
+    """
+    Run scenarios headless, sharing rasters and the weather client.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Directory of the disk tile caches of the rasters.
+    weather_client : WeatherClient, optional
+        Client for current and forecast weather; created on first use.
+    """
+
+    def __init__(self, cache_dir=None, weather_client=None):
+        self.cache_dir = cache_dir
+        self._weather_client = weather_client
+        self._rasters = {}
+
+    def raster(self, path):
+        """The open `RasterSource` of a raster file, opened on first use."""
+        path = os.path.abspath(path)
+        if path not in self._rasters:
+            self._rasters[path] = RasterSource(path, cache_dir=self.cache_dir)
+        return self._rasters[path]
+
+    @property
+    def weather_client(self):
+        """Shared `WeatherClient`."""
+        if self._weather_client is None:
+            self._weather_client = WeatherClient()
+        return self._weather_client
+
+    def grid(self, scenario):
+        """
+        Land-cover grid of a scenario with its ignition points on fire.
+
+        Parameters
+        ----------
+        scenario : dict
+            Scenario with all keys of `SCENARIO_DEFAULTS`.
+
+        Returns
+        -------
+        tuple
+            (compact Grid, transform of the grid, raster CRS, centre (lat, lon))
+
+        Raises
+        ------
+        ValueError
+            If an ignition point is outside the grid, or none is on burnable land.
+        """
+        from rasterio.warp import transform, transform_bounds
+
+        src = self.raster(scenario["raster"])
+        size = (scenario["resolution"], scenario["resolution"])
+        if scenario["bounds"] is None:
+            data, grid_transform = src.read(src.dataset.bounds, size)
+            west, south, east, north = transform_bounds(src.crs, "EPSG:4326", *src.dataset.bounds)
+        else:
+            data, grid_transform = src.crop(leaflet_bounds(scenario["bounds"]), size)
+            south, west, north, east = scenario["bounds"]
+        grid = raster_to_grid(data[0], compact=True)
+
+        points = [tuple(point) for point in scenario["ignitions"]]
+        if scenario["ignitions_latlon"]:
+            lats, lons = zip(*scenario["ignitions_latlon"])
+            xs, ys = transform("EPSG:4326", src.crs, lons, lats)
+            for x, y in zip(xs, ys):
+                col, row = ~grid_transform * (x, y)
+                points.append((int(np.floor(col)), int(np.floor(row))))
+        if not points:
+            raise ValueError("A scenario needs at least one ignition point")
+        lit = 0
+        for x, y in points:
+            if not (0 <= x < grid.width and 0 <= y < grid.height):
+                raise ValueError(f"Ignition point {(x, y)} is outside the {grid.width}x{grid.height} grid")
+            # like in the app, only vegetation catches fire
+            if grid.state[y, x] in (CellState.TREE, CellState.GRASS):
+                grid.state[y, x] = CellState.FIRE
+                lit += 1
+        if lit == 0:
+            raise ValueError("No ignition point is on burnable land")
+        return grid, grid_transform, src.crs, ((south + north) / 2, (west + east) / 2)
+
+    def weather(self, scenario, centre, steps):
+        """
+        Step arguments and schedule of the weather of a scenario.
+
+        Returns
+        -------
+        tuple
+            (dict with humidity, wind and temp, WeatherSchedule or None)
+        """
+        humidity, temperature = scenario["humidity"], scenario["temperature"]
+        speed, direction = scenario["wind_speed"], scenario["wind_direction"]
+        schedule = None
+        if scenario["weather_csv"] is not None:
+            schedule = WeatherSchedule.from_csv(scenario["weather_csv"], steps, scenario["step_minutes"])
+        elif scenario["weather"] == "current":
+            current = self.weather_client.current(*centre)
+            humidity, temperature = current.humidity, current.temperature
+            speed, direction = current.wind_speed, current.wind_direction
+        elif scenario["weather"] == "forecast":
+            hours = int(np.ceil(steps * scenario["step_minutes"] / 60)) + 1
+            forecast = self.weather_client.forecast(*centre, hours=hours)
+            schedule = WeatherSchedule.from_forecast(forecast, steps, step_minutes=scenario["step_minutes"])
+        elif scenario["weather"] != "fixed":
+            raise ValueError(f"Unknown weather '{scenario['weather']}', expected fixed, current or forecast")
+        kwargs = {"humidity": humidity, "temp": temperature, "wind": wind_vector(speed, direction)}
+        return kwargs, schedule
+
+    def weather_stats(self, scenario, weather, schedule, steps):
+        """
+        Weather a scenario ran with, for its stats.
+
+        Parameters
+        ----------
+        scenario : dict
+            Scenario with all keys of `SCENARIO_DEFAULTS`.
+        weather, schedule :
+            Step arguments and schedule returned by `weather`.
+        steps : int
+            Number of steps the run took.
+
+        Returns
+        -------
+        dict
+            The weather source and either the fixed humidity, temp and wind,
+            or the step minutes and the temp, humidity and wind of every step
+            of a scheduled run.
+        """
+        if schedule is None:
+            return {"source": scenario["weather"],
+                    **{name: np.asarray(value).tolist() for name, value in weather.items()}}
+        return {"source": "csv" if scenario["weather_csv"] is not None else scenario["weather"],
+                "step_minutes": schedule.step_minutes,
+                "temp": schedule.temperature[:steps].tolist(),
+                "humidity": schedule.humidity[:steps].tolist(),
+                "wind": schedule.wind[:steps].tolist()}
+
+    def run(self, scenario, output):
+        """
+        Simulate a scenario and write its results.
+
+        Parameters
+        ----------
+        scenario : dict
+            Scenario; missing keys take the values of `SCENARIO_DEFAULTS`.
+        output : str
+            Directory to write ``ignite_time.npy``, ``burnout_time.npy``,
+            ``state.npy``, ``health.npy`` and ``stats.json`` to.
+
+        Returns
+        -------
+        dict
+            Stats of the run, as written to ``stats.json``.
+        """
+        scenario = {**SCENARIO_DEFAULTS, **scenario}
+        grid, grid_transform, crs, centre = self.grid(scenario)
+        max_steps = scenario["max_steps"] or scenario["resolution"]
+        weather, schedule = self.weather(scenario, centre, max_steps)
+
+        ruleset = RuleSet()
+        ruleset.add_rule(burning)
+        ruleset.add_rule(ignite)
+        with Simulation(grid, ruleset, engine=scenario["engine"], seed=scenario["seed"],
+                        workers=scenario["workers"]) as sim:
+            result = sim.run(max_steps=max_steps, time_budget=scenario["time_budget"],
+                             stable_steps=scenario["stable_steps"], weather=schedule,
+                             prob=scenario["prob"], **weather)
+
+        os.makedirs(output, exist_ok=True)
+        np.save(os.path.join(output, "ignite_time.npy"), sim.ignite_time)
+        np.save(os.path.join(output, "burnout_time.npy"), sim.burnout_time)
+        np.save(os.path.join(output, "state.npy"), grid.state_codes())
+        np.save(os.path.join(output, "health.npy"), grid.health)
+        stats = {
+            "name": scenario["name"],
+            "reason": result.reason,
+            "steps": result.steps,
+            "step_count": result.step_count,
+            "elapsed": result.elapsed,
+            "fire_count": sim.fire_count,
+            "burned_area": sim.burned_area,
+            "front_series": sim.front_series.tolist(),
+            "burned_series": sim.burned_series.tolist(),
+            "cells": grid.width * grid.height,
+            "crs": str(crs),
+            "transform": list(grid_transform)[:6],
+            "weather": self.weather_stats(scenario, weather, schedule, result.steps),
+            "scenario": scenario,
+        }
+        with open(os.path.join(output, "stats.json"), "w") as f:
+            json.dump(stats, f, indent=2)
+        return stats
+
+    def run_all(self, scenarios, output, log=None):
+        """
+        Simulate scenarios one after the other, each into its own directory.
+
+        A failing scenario is reported and skipped.
+
+        Parameters
+        ----------
+        scenarios : list of dict
+            Scenarios; unnamed ones are named by their position.
+        output : str
+            Directory holding a subdirectory per scenario and ``summary.json``.
+        log : file, optional
+            Where a line per scenario is printed (default is stdout).
+
+        Returns
+        -------
+        list of dict
+            Stats of every scenario; failed ones hold an ``error``.
+        """
+        log = sys.stdout if log is None else log
+        summary = []
+        for i, scenario in enumerate(scenarios):
+            name = scenario.get("name") or f"scenario_{i:03d}"
+            try:
+                stats = self.run({**scenario, "name": name}, os.path.join(output, name))
+            except (ValueError, OSError, WeatherError) as e:
+                stats = {"name": name, "error": str(e)}
+                print(f"{name}: failed: {e}", file=log)
+            else:
+                print(f"{name}: {stats['reason']} after {stats['step_count']} steps, "
+                      f"{stats['burned_area']} cells burned in {stats['elapsed']:.2f} s", file=log)
+            summary.append(stats)
+        os.makedirs(output, exist_ok=True)
+        with open(os.path.join(output, "summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def close(self):
+        """Close the rasters and the weather client."""
+        for src in self._rasters.values():
+            src.close()
+        self._rasters.clear()
+        if self._weather_client is not None:
+            self._weather_client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _run_parser(parser):
+    # options default to None so that only given ones override a scenario file
+    parser.add_argument("--scenarios", metavar="JSON", help="file of scenarios to run")
+    parser.add_argument("-o", "--output", default="flamecell_output", help="output directory")
+    parser.add_argument("--name", help="name of the scenario")
+    parser.add_argument("--raster", help="land-cover GeoTIFF (default: the map of the app)")
+    parser.add_argument("--bounds", type=float, nargs=4, metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                        help="area to simulate (default: the whole raster)")
+    parser.add_argument("--resolution", type=int, help="grid side in cells (default: 128)")
+    parser.add_argument("--ignite", type=int, nargs=2, action="append", metavar=("X", "Y"),
+                        dest="ignitions", help="ignition cell, repeatable")
+    parser.add_argument("--ignite-latlon", type=float, nargs=2, action="append", metavar=("LAT", "LON"),
+                        dest="ignitions_latlon", help="ignition point, repeatable")
+    parser.add_argument("--weather", choices=["fixed", "current", "forecast"], help="weather source")
+    parser.add_argument("--weather-csv", help="CSV file of weather records")
+    parser.add_argument("--humidity", type=float, help="fixed relative humidity in %%")
+    parser.add_argument("--temperature", type=float, help="fixed temperature in °C")
+    parser.add_argument("--wind-speed", type=float, help="fixed wind speed in km/h")
+    parser.add_argument("--wind-direction", type=float, help="fixed wind direction in degrees")
+    parser.add_argument("--step-minutes", type=float, help="simulated minutes per step of scheduled weather")
+    parser.add_argument("--prob", type=float, help="base ignition probability")
+    parser.add_argument("--steps", type=int, dest="max_steps", help="maximum steps (default: the resolution)")
+    parser.add_argument("--time-budget", type=float, help="wall-clock budget per scenario in seconds")
+    parser.add_argument("--stable-steps", type=int, help="stop after this many steps without new ignitions")
+    parser.add_argument("--seed", type=int, help="random seed")
+    parser.add_argument("--engine", choices=Simulation.engines, help="simulation engine (default: vector)")
+    parser.add_argument("--workers", type=int, help="processes of the tiled engine")
+    parser.add_argument("--cache-dir", help="directory of the raster tile caches")
+
+def main(argv=None):
+    """Entry point of the ``flamecell`` console script."""
+    parser = argparse.ArgumentParser(prog="flamecell", description="Headless forest fire simulations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    _run_parser(commands.add_parser("run", help="simulate one scenario or a file of scenarios"))
+    for name, description in (("overviews", "build the overview pyramid of a raster"),
+                              ("bench", "run the benchmarks")):
+        commands.add_parser(name, help=description, add_help=False).add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.command == "overviews":
+        from flamecell.raster import main as overviews
+        return overviews(args.args)
+    if args.command == "bench":
+        from flamecell.benchmark import main as bench
+        return bench(args.args)
+
+    options = {key: value for key, value in vars(args).items()
+               if key in SCENARIO_DEFAULTS and value is not None}
+    try:
+        scenarios = load_scenarios(args.scenarios) if args.scenarios else [{}]
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    with ScenarioRunner(cache_dir=args.cache_dir) as runner:
+        summary = runner.run_all([{**options, **scenario} for scenario in scenarios], args.output)
+    return 1 if any("error" in stats for stats in summary) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,391 @@
+"""
+Forest Fire Simulation Framework
+
+This module runs Monte Carlo ensembles of a simulation and reduces them to
+per-cell burn probabilities and ignition time statistics, either as separate
+simulations in a process pool or as one batched (runs, height, width) simulation.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from flamecell.rules import neighborhood_fields
+from flamecell.sim_utils import Simulation
+from flamecell.states import CellState, HEALTH_DTYPE, TIME_DTYPE, NEVER
+
+
+class EnsembleResult:
+    """
+    Running per-cell statistics of an ensemble of realizations.
+
+    Realizations are added one at a time with `add` and partial results are
+    combined with `merge`, so no realization grid is kept in memory. With
+    `time_bins`, ignition times are also kept as a per-cell histogram, from
+    which quantiles are read; it takes ``4 * time_bins`` bytes per cell.
+
+    Parameters
+    ----------
+    shape : tuple
+        (height, width) of the grid.
+    max_steps : int
+        Upper bound of the ignition times.
+    time_bins : int, optional
+        Number of histogram bins of the ignition times; None (default) keeps
+        no histogram, so `ignite_time_quantile` is not available.
+    """
+
+    def __init__(self, shape, max_steps, time_bins=None):
+        self.n_runs = 0
+        self.burn_count = np.zeros(shape, dtype=np.int32)
+        self.time_sum = np.zeros(shape, dtype=np.float64)
+        self.bin_edges = None
+        self.time_hist = None
+        if time_bins:
+            self.bin_edges = np.linspace(0, max_steps, time_bins + 1)
+            self.time_hist = np.zeros((time_bins,) + tuple(shape), dtype=np.uint32)
+        self.reasons = {}
+
+    def add(self, burned, ignite_time, reason=None):
+        """
+        Add one realization, or a stack of realizations.
+
+        Parameters
+        ----------
+        burned : np.ndarray or None
+            Boolean mask of the cells that burned, shape (height, width) or
+            (runs, height, width); None for the cells with an ignition time.
+        ignite_time : np.ndarray
+            First ignition step of each cell, same shape as `burned`, NEVER
+            for cells that did not burn; only read where `burned` is set.
+        reason : str or list of str, optional
+            Termination reason of each realization.
+        """
+        ignite_time = np.asarray(ignite_time)
+        burned = ignite_time != NEVER if burned is None else np.asarray(burned, dtype=bool)
+        if burned.ndim == 2:
+            burned, ignite_time = burned[None], ignite_time[None]
+            reason = None if reason is None else [reason]
+        self.n_runs += len(burned)
+        self.burn_count += burned.sum(axis=0, dtype=np.int32)
+        self.time_sum += np.where(burned, ignite_time, 0).sum(axis=0)
+        if self.time_hist is not None:
+            _, rows, cols = np.nonzero(burned)
+            times = ignite_time[burned]
+            bins = np.clip(np.searchsorted(self.bin_edges, times, side="right") - 1, 0, len(self.time_hist) - 1)
+            cells = rows * self.burn_count.shape[1] + cols
+            np.add.at(self.time_hist.reshape(-1), bins * self.burn_count.size + cells, 1)
+        for name in reason or []:
+            self.reasons[name] = self.reasons.get(name, 0) + 1
+
+    def merge(self, other):
+        """
+        Add the realizations of another result with the same shape and bins.
+
+        Parameters
+        ----------
+        other : EnsembleResult
+            Partial result to merge into this one.
+
+        Returns
+        -------
+        EnsembleResult
+            This result.
+        """
+        self.n_runs += other.n_runs
+        self.burn_count += other.burn_count
+        self.time_sum += other.time_sum
+        if self.time_hist is not None:
+            self.time_hist += other.time_hist
+        for reason, count in other.reasons.items():
+            self.reasons[reason] = self.reasons.get(reason, 0) + count
+        return self
+
+    @property
+    def burn_probability(self):
+        """Fraction of the realizations in which each cell burned."""
+        return self.burn_count / max(self.n_runs, 1)
+
+    @property
+    def mean_ignite_time(self):
+        """Mean ignition time of each cell over the realizations it burned in, NaN if it never burned."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.burn_count > 0, self.time_sum / self.burn_count, np.nan)
+
+    def ignite_time_quantile(self, q):
+        """
+        Ignition time quantile of each cell, interpolated in the histogram.
+
+        Parameters
+        ----------
+        q : float
+            Quantile in [0, 1].
+
+        Returns
+        -------
+        np.ndarray
+            Quantile per cell, NaN where the cell never burned.
+
+        Raises
+        ------
+        ValueError
+            If the result keeps no ignition time histogram.
+        """
+        if self.time_hist is None:
+            raise ValueError("Ignition time quantiles need a result created with time_bins")
+        cumulative = np.cumsum(self.time_hist, axis=0)
+        target = q * self.burn_count
+        # first bin whose cumulative count reaches the target
+        index = np.minimum(np.sum(cumulative < target, axis=0), len(self.time_hist) - 1)
+        before = np.take_along_axis(cumulative, index[None], axis=0)[0] - np.take_along_axis(self.time_hist, index[None], axis=0)[0]
+        in_bin = np.take_along_axis(self.time_hist, index[None], axis=0)[0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = np.where(in_bin > 0, (target - before) / in_bin, 0.0)
+        width = np.diff(self.bin_edges)[index]
+        quantile = self.bin_edges[index] + np.clip(fraction, 0, 1) * width
+        return np.where(self.burn_count > 0, quantile, np.nan)
+
+
+def _run_realizations(grid, ruleset, seeds, engine, max_steps, stable_steps, time_bins, weather):
+    # run a worker's share of the realizations and reduce them into one result
+    result = EnsembleResult((grid.height, grid.width), max_steps, time_bins)
+    for seed in seeds:
+        realization = grid.to_compact()
+        sim = Simulation(realization, ruleset, engine=engine, seed=seed)
+        outcome = sim.run(max_steps=max_steps, stable_steps=stable_steps, **weather)
+        result.add(None, sim.ignite_time, outcome.reason)
+    return result
+
+def run_ensemble(grid, ruleset, n_runs, weather=None, seed=None, engine="vector",
+                 max_steps=1000, stable_steps=None, workers=None, time_bins=None, chunk_size=None):
+    """
+    Run independent realizations of a simulation and reduce them on the fly.
+
+    Each realization gets its own `np.random.RandomState` seeded from
+    ``np.random.SeedSequence(seed).spawn(n_runs)``, so the result depends only
+    on `seed` and not on the number of workers or the chunking.
+
+    Parameters
+    ----------
+    grid : Grid
+        Initial grid, including the ignition cells. It is not modified.
+    ruleset : RuleSet
+        Rules of the simulation; must be picklable for `workers` > 1.
+    n_runs : int
+        Number of realizations.
+    weather : dict, optional
+        Arguments passed to `Simulation.step`, e.g. prob, humidity, wind and temp.
+    seed : int, optional
+        Root seed of the ensemble.
+    engine : str, optional
+        Simulation engine; "vector" (default) or "sparse", the engines that draw
+        from the per-realization random state.
+    max_steps : int, optional
+        Step limit of each realization (default is 1000).
+    stable_steps : int, optional
+        Stop a realization once its burned area has not grown for this many steps.
+    workers : int, optional
+        Number of worker processes (default is the CPU count); 1 runs in-process.
+    time_bins : int, optional
+        Histogram bins used for ignition time quantiles (default is None, no
+        quantiles).
+    chunk_size : int, optional
+        Realizations per task. The default gives each worker one task, so each
+        worker sends back a single partial result.
+
+    Returns
+    -------
+    EnsembleResult
+        Burn counts and ignition time statistics of all realizations.
+
+    Raises
+    ------
+    ValueError
+        If `n_runs` is not positive or `engine` is not "vector" or "sparse".
+    """
+    if n_runs <= 0:
+        raise ValueError("n_runs must be a positive integer")
+    # the cell engine draws from the global np.random, so the seeds would be
+    # ignored, and the tiled engine would start a process pool in every worker
+    if engine not in ("vector", "sparse"):
+        raise ValueError(f"Unknown engine '{engine}', expected 'vector' or 'sparse'")
+    weather = weather or {}
+    workers = workers or os.cpu_count() or 1
+    seeds = [child.generate_state(4) for child in np.random.SeedSequence(seed).spawn(n_runs)]
+    chunk_size = chunk_size or -(-n_runs // workers)
+    chunks = [seeds[i:i + chunk_size] for i in range(0, n_runs, chunk_size)]
+    args = (engine, max_steps, stable_steps, time_bins, weather)
+
+    result = EnsembleResult((grid.height, grid.width), max_steps, time_bins)
+    if workers == 1:
+        for chunk in chunks:
+            result.merge(_run_realizations(grid, ruleset, chunk, *args))
+        return result
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_realizations, grid, ruleset, chunk, *args) for chunk in chunks]
+        for future in as_completed(futures):
+            result.merge(future.result())
+    return result
+
+
+class BatchSimulation:
+    """
+    Advances many realizations of the same grid together as one (runs, height, width) array.
+
+    All realizations share the initial fuel layout and the weather of each
+    step; the array rules see the stacked arrays and handle them in one call.
+
+    Parameters
+    ----------
+    grid : Grid
+        Initial grid, including the ignition cells. It is not modified.
+    ruleset : RuleSet
+        Array rules, or cell rules with array equivalents.
+    n_runs : int
+        Number of realizations.
+    seed : int or array_like, optional
+        Seed of the random state shared by the batch.
+
+    Attributes
+    ----------
+    state, health, ignite_time : np.ndarray
+        Per-realization state codes, health and first ignition steps (NEVER
+        for cells that have not burned).
+    fire_count : np.ndarray
+        Number of burning cells of each realization after the last step.
+    bbox : tuple
+        (y0, y1, x0, x1) bounding box of the burning cells of all realizations.
+    """
+
+    def __init__(self, grid, ruleset, n_runs, seed=None):
+        self.ruleset = ruleset.to_arrays()
+        self.state = np.repeat(grid.state_codes()[None], n_runs, axis=0)
+        self.health = np.repeat(grid.health.astype(HEALTH_DTYPE)[None], n_runs, axis=0)
+        self.ignite_time = np.where(self.state == CellState.FIRE, 0, NEVER).astype(TIME_DTYPE)
+        self.rng = np.random.RandomState(seed)
+        self.step_count = 0
+        self._track_fire(self.state == CellState.FIRE, 0, 0)
+
+    def _track_fire(self, fire, y0, x0):
+        # per-realization fire counts and the bounding box of all burning cells
+        self.fire_count = np.count_nonzero(fire.reshape(len(fire), -1), axis=1)
+        rows = np.flatnonzero(fire.any(axis=(0, 2)))
+        cols = np.flatnonzero(fire.any(axis=(0, 1)))
+        if len(rows):
+            self.bbox = (y0 + rows[0], y0 + rows[-1] + 1, x0 + cols[0], x0 + cols[-1] + 1)
+        else:
+            self.bbox = (0, 0, 0, 0)
+
+    def step(self, prob=0.2, humidity=0.4, wind=np.array([0,0]), **kwargs):
+        """
+        Advances all realizations by one step.
+
+        Only the bounding box of the burning cells, grown by one cell, is
+        evaluated, since no other cell can change.
+
+        Parameters
+        ----------
+        prob, humidity, wind, kwargs :
+            Same as in `Simulation.step`, shared by all realizations.
+        """
+        height, width = self.state.shape[1:]
+        y0, y1, x0, x1 = self.bbox
+        window = (slice(None), slice(max(y0 - 1, 0), min(y1 + 1, height)), slice(max(x0 - 1, 0), min(x1 + 1, width)))
+        state = self.state[window].copy()
+        fire = state == CellState.FIRE
+        fields = neighborhood_fields(fire)
+        fields.origin = (window[1].start, window[2].start)
+        state, health = self.ruleset.apply_arrays(
+            state, self.health[window].copy(), fields, rng=self.rng, prob=prob, humidity=humidity, wind=wind, **kwargs)
+        self.state[window] = state
+        self.health[window] = health
+        new_fire = state == CellState.FIRE
+        ignited = new_fire & ~fire
+        cells = np.nonzero(ignited)
+        times = self.ignite_time[window]
+        first = times[cells] == NEVER
+        times[tuple(index[first] for index in cells)] = self.step_count + 1
+        self._track_fire(new_fire, window[1].start, window[2].start)
+        self.step_count += 1
+
+    def pop(self, index):
+        """
+        Remove realizations from the batch.
+
+        Parameters
+        ----------
+        index : np.ndarray
+            Boolean mask or indices of the realizations to remove.
+
+        Returns
+        -------
+        tuple
+            (burned, ignite_time) of the removed realizations.
+        """
+        keep = np.ones(len(self.state), dtype=bool)
+        keep[index] = False
+        ignite_time = self.ignite_time[~keep]
+        burned = ignite_time != NEVER
+        self.state, self.health = self.state[keep], self.health[keep]
+        self.ignite_time, self.fire_count = self.ignite_time[keep], self.fire_count[keep]
+        return burned, ignite_time
+
+def run_batched_ensemble(grid, ruleset, n_runs, weather=None, seed=None, max_steps=1000,
+                         batch_size=256, time_bins=None):
+    """
+    Run an ensemble in-process with `BatchSimulation`.
+
+    Realizations leave the batch as soon as their fire is out, so later steps
+    only advance the ones still burning. This avoids the per-run overhead of
+    `run_ensemble` for small grids; batches get their own seeds from
+    ``np.random.SeedSequence(seed)``, so results are reproducible for a given
+    `seed` and `batch_size` but differ from `run_ensemble` draw-by-draw.
+
+    Parameters
+    ----------
+    grid : Grid
+        Initial grid, including the ignition cells. It is not modified.
+    ruleset : RuleSet
+        Array rules, or cell rules with array equivalents.
+    n_runs : int
+        Number of realizations.
+    weather : dict, optional
+        Arguments passed to `BatchSimulation.step`.
+    seed : int, optional
+        Root seed of the ensemble.
+    max_steps : int, optional
+        Step limit of each realization (default is 1000).
+    batch_size : int, optional
+        Realizations advanced together, bounding the memory use (default is 256).
+    time_bins : int, optional
+        Histogram bins used for ignition time quantiles (default is None, no
+        quantiles).
+
+    Returns
+    -------
+    EnsembleResult
+        Same statistics as `run_ensemble`.
+
+    Raises
+    ------
+    ValueError
+        If `n_runs` is not positive.
+    """
+    if n_runs <= 0:
+        raise ValueError("n_runs must be a positive integer")
+    weather = weather or {}
+    result = EnsembleResult((grid.height, grid.width), max_steps, time_bins)
+    sizes = [min(batch_size, n_runs - start) for start in range(0, n_runs, batch_size)]
+    for size, child in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))):
+        batch = BatchSimulation(grid, ruleset, size, seed=child.generate_state(4))
+        while len(batch.state):
+            done = batch.fire_count == 0
+            if done.any():
+                result.add(*batch.pop(done), ["extinguished"] * int(done.sum()))
+            elif batch.step_count >= max_steps:
+                n = len(batch.state)
+                result.add(*batch.pop(slice(None)), ["max_steps"] * n)
+            else:
+                batch.step(**weather)
+    return result
@@ -0,0 +1,232 @@
+"""
+Forest Fire Simulation Framework
+
+This module records the history of a run as a sparse transition log: one
+record (cell, step, state, health) for every cell a step changed. Only the
+fire front changes from step to step, so the log grows with the burned area
+instead of the grid area times the number of steps, and any step can be
+rebuilt from the initial grid and the records up to it.
+"""
+
+import os
+
+import numpy as np
+
+from flamecell.states import STATE_DTYPE, encode_states
+
+# one changed cell: flat grid index, step after which it holds the new values,
+# new state code and new health
+TRANSITION_DTYPE = np.dtype([("cell", "<u4"), ("step", "<u4"), ("state", "u1"), ("health", "<i2")])
+
+class History:
+    """
+    Transition log of a simulation, kept in memory or appended to files.
+
+    With a `path` the log is written incrementally to a directory holding
+    ``initial.npz`` (the grid at `start_step`), ``transitions.bin`` (the
+    records) and ``steps.bin`` (the number of records up to each step), so a
+    run that stops early still leaves a readable history; `History.load`
+    opens it with the records memory-mapped.
+
+    Parameters
+    ----------
+    grid : Grid
+        Grid at the first recorded step.
+    path : str, optional
+        Directory to write the log to; the log is kept in memory if omitted.
+    start_step : int, optional
+        Step count of the simulation at `grid` (default is 0).
+    """
+
+    def __init__(self, grid, path=None, start_step=0):
+        self.shape = (grid.height, grid.width)
+        self.start_step = start_step
+        self.initial_state = np.array(grid.state_codes(), dtype=STATE_DTYPE)
+        self.initial_health = np.array(grid.health, dtype=TRANSITION_DTYPE["health"])
+        self.path = path
+        # last recorded grid, diffed against the next step
+        self._state = self.initial_state.ravel().copy()
+        self._health = self.initial_health.ravel().copy()
+        self._counts = [0]
+        self._chunks = []
+        self._files = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            np.savez(os.path.join(path, "initial.npz"), state=self.initial_state,
+                     health=self.initial_health, start_step=start_step)
+            self._files = (open(os.path.join(path, "transitions.bin"), "wb"),
+                           open(os.path.join(path, "steps.bin"), "wb"))
+            self._files[1].write(np.array(self._counts, dtype="<u8").tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open a history written to disk, with the records memory-mapped.
+
+        Parameters
+        ----------
+        path : str
+            Directory passed as `path` when recording.
+
+        Returns
+        -------
+        History
+            Read-only history.
+        """
+        with np.load(os.path.join(path, "initial.npz")) as initial:
+            state, health, start_step = initial["state"], initial["health"], int(initial["start_step"])
+        history = cls.__new__(cls)
+        history.shape = state.shape
+        history.start_step = start_step
+        history.initial_state = state
+        history.initial_health = health
+        history.path = path
+        history._state = history._health = None
+        history._counts = list(np.fromfile(os.path.join(path, "steps.bin"), dtype="<u8"))
+        history._chunks = []
+        history._files = None
+        return history
+
+    @property
+    def end_step(self):
+        """Step count of the last recorded step."""
+        return self.start_step + len(self._counts) - 1
+
+    def record(self, grid, step, cells=None):
+        """
+        Append the cells that changed since the last recorded step.
+
+        Parameters
+        ----------
+        grid : Grid
+            Grid after the step.
+        step : int
+            Step count of the simulation after the step.
+        cells : np.ndarray, optional
+            Flat indices of the only cells that can have changed, e.g. the
+            cells a step evaluated; only these are compared. The whole grid is
+            compared if omitted.
+        """
+        if cells is None:
+            state = grid.state_codes().ravel()
+            health = np.asarray(grid.health).ravel()
+            changed = np.flatnonzero((state != self._state) | (health != self._health))
+            state, health = state[changed], health[changed]
+        else:
+            cells = np.sort(np.asarray(cells).ravel())
+            rows, cols = np.divmod(cells, self.shape[1])
+            state = grid.state[rows, cols]
+            state = state if grid.compact else encode_states(state)
+            health = np.asarray(grid.health)[rows, cols]
+            differ = (state != self._state[cells]) | (health != self._health[cells])
+            changed, state, health = cells[differ], state[differ], health[differ]
+        records = np.empty(len(changed), dtype=TRANSITION_DTYPE)
+        records["cell"] = changed
+        records["step"] = step
+        records["state"] = self._state[changed] = state
+        records["health"] = self._health[changed] = health
+        # steps that were not recorded carry the changes over to `step`
+        added = step - self.end_step
+        self._counts.extend([self._counts[-1]] * (added - 1) + [self._counts[-1] + len(records)])
+        if self._files is None:
+            self._chunks.append(records)
+        else:
+            self._files[0].write(records.tobytes())
+            self._files[1].write(np.array(self._counts[-added:], dtype="<u8").tobytes())
+
+    def flush(self):
+        """Write buffered records of a history on disk."""
+        if self._files is not None:
+            for file in self._files:
+                file.flush()
+
+    def close(self):
+        """Finish writing a history on disk."""
+        if self._files is not None:
+            for file in self._files:
+                file.close()
+            self._files = None
+
+    @property
+    def transitions(self):
+        """All records in step order, memory-mapped for histories on disk."""
+        if self.path is None:
+            if len(self._chunks) > 1:
+                self._chunks = [np.concatenate(self._chunks)]
+            return self._chunks[0] if self._chunks else np.empty(0, dtype=TRANSITION_DTYPE)
+        self.flush()
+        if self._counts[-1] == 0:
+            return np.empty(0, dtype=TRANSITION_DTYPE)
+        return np.memmap(os.path.join(self.path, "transitions.bin"), dtype=TRANSITION_DTYPE,
+                         mode="r", shape=(int(self._counts[-1]),))
+
+    @property
+    def nbytes(self):
+        """Size of the records in bytes."""
+        return int(self._counts[-1]) * TRANSITION_DTYPE.itemsize
+
+    def _check_step(self, step):
+        if not self.start_step <= step <= self.end_step:
+            raise ValueError(f"Step {step} is outside the recorded steps {self.start_step}..{self.end_step}")
+
+    def state_at(self, step):
+        """
+        Rebuild the grid after a recorded step.
+
+        Parameters
+        ----------
+        step : int
+            Step count, from `start_step` to `end_step`.
+
+        Returns
+        -------
+        tuple
+            (state codes, health) arrays of the grid.
+
+        Raises
+        ------
+        ValueError
+            If the step was not recorded.
+        """
+        self._check_step(step)
+        state = self.initial_state.ravel().copy()
+        health = self.initial_health.ravel().copy()
+        records = self.transitions[:int(self._counts[step - self.start_step])]
+        # the last record of each cell holds its values at `step`
+        cells, last = np.unique(records["cell"][::-1], return_index=True)
+        last = len(records) - 1 - last
+        state[cells] = records["state"][last]
+        health[cells] = records["health"][last]
+        return state.reshape(self.shape), health.reshape(self.shape)
+
+    def frames(self, start=None, stop=None, every=1):
+        """
+        Iterate over the recorded grids, applying one step of records at a time.
+
+        Parameters
+        ----------
+        start, stop : int, optional
+            First and last step to yield (default is all recorded steps).
+        every : int, optional
+            Yield every n-th step from `start` (default is 1).
+
+        Yields
+        ------
+        tuple
+            (step, state codes, health) with fresh arrays for every step.
+        """
+        start = self.start_step if start is None else start
+        stop = self.end_step if stop is None else stop
+        self._check_step(start)
+        self._check_step(stop)
+        state, health = self.state_at(start)
+        state, health = state.ravel(), health.ravel()
+        transitions = self.transitions
+        for step in range(start, stop + 1):
+            if step > start:
+                begin, end = self._counts[step - 1 - self.start_step], self._counts[step - self.start_step]
+                records = transitions[int(begin):int(end)]
+                state[records["cell"]] = records["state"]
+                health[records["cell"]] = records["health"]
+            if (step - start) % every == 0:
+                yield step, state.reshape(self.shape).copy(), health.reshape(self.shape).copy()
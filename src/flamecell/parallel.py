@@ -0,0 +1,393 @@
+"""
+Forest Fire Simulation Framework
+
+This module splits a simulation grid into horizontal strips that worker
+processes advance in parallel on shared-memory arrays, and provides the
+position-keyed random source that makes such runs reproducible.
+"""
+
+import multiprocessing as mp
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from flamecell.rules import Neighborhood, neighborhood_fields
+from flamecell.states import CellState, STATE_DTYPE, HEALTH_DTYPE, TIME_DTYPE, record_transitions
+
+_MASK64 = (1 << 64) - 1
+
+def _mix(value):
+    # splitmix64 finalizer on a Python int
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+def _mix_array(values):
+    # splitmix64 finalizer on a uint64 array, wrapping on overflow
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+class CounterRNG:
+    """
+    Random source whose draws are a hash of (seed, step, call, cell).
+
+    The array rules draw through `rules.draw_uniform` and `rules.draw_integers`,
+    which use `rand_at` and `randint_at` here, so a cell gets the same numbers
+    whether the grid is stepped whole, in tiles or in strips by several
+    processes. The engines call `start_step` before every step.
+
+    Parameters
+    ----------
+    seed : int, optional
+        Seed of the stream; a fresh random seed if omitted.
+    """
+
+    def __init__(self, seed=None):
+        self.seed = int(np.random.SeedSequence(seed).entropy) & _MASK64
+        self.step = 0
+        self.calls = 0
+
+    def start_step(self, step):
+        """
+        Start the draws of a step.
+
+        Parameters
+        ----------
+        step : int
+            Step number.
+        """
+        self.step = step
+        self.calls = 0
+
+    def _next_key(self):
+        key = _mix(_mix(_mix(self.seed) ^ self.step) ^ self.calls)
+        self.calls += 1
+        return np.uint64(key)
+
+    def rand_at(self, cells):
+        """
+        Uniform numbers in [0, 1), one per flat grid index in `cells`.
+
+        Parameters
+        ----------
+        cells : np.ndarray
+            Flat grid indices.
+
+        Returns
+        -------
+        np.ndarray
+            Draws in the order of `cells`.
+        """
+        bits = _mix_array(np.asarray(cells, dtype=np.uint64) ^ self._next_key())
+        return (bits >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    def randint_at(self, low, high, cells):
+        """
+        Integers in [low, high), one per flat grid index in `cells`.
+
+        Parameters
+        ----------
+        low, high : int
+            Range of the integers.
+        cells : np.ndarray
+            Flat grid indices.
+
+        Returns
+        -------
+        np.ndarray
+            Draws in the order of `cells`.
+        """
+        return low + (self.rand_at(cells) * (high - low)).astype(np.int64)
+
+    def rand(self, *shape):
+        """Unkeyed uniform draws for rules that do not pass cell positions."""
+        return np.random.RandomState(self._next_key() & np.uint64(0xFFFFFFFF)).rand(*shape)
+
+    def randint(self, low, high, size=None):
+        """Unkeyed integer draws for rules that do not pass cell positions."""
+        return np.random.RandomState(self._next_key() & np.uint64(0xFFFFFFFF)).randint(low, high, size=size)
+
+
+class StripField:
+    """
+    Rows of a per-cell field sent to the worker of a strip.
+
+    Rules read per-cell inputs only at the cells they evaluate, which for a
+    worker are the rows of its strip, so only those rows are pickled; `at`
+    takes grid positions like `CoarseField.at`.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Rows [y0, y0 + len(values)) of the field.
+    y0 : int
+        First grid row of `values`.
+    shape : tuple
+        (height, width) of the whole grid.
+    """
+
+    def __init__(self, values, y0, shape):
+        self.values = values
+        self.y0 = y0
+        self.shape = tuple(shape)
+
+    @property
+    def ndim(self):
+        return 2
+
+    def at(self, rows, cols):
+        """Values at grid cells, which must lie in the strip."""
+        return self.values[rows - self.y0, cols]
+
+def strip_kwargs(kwargs, y0, y1, shape):
+    """
+    Rule arguments for the worker of rows [y0, y1).
+
+    Per-cell (height, width) arrays become `StripField` slices, including the
+    components of a (2, height, width) wind; scalars and `CoarseField` blocks
+    are passed as they are.
+
+    Parameters
+    ----------
+    kwargs : dict
+        Arguments passed to the rules.
+    y0, y1 : int
+        Rows of the strip.
+    shape : tuple
+        (height, width) of the grid.
+
+    Returns
+    -------
+    dict
+        Arguments to send to the worker.
+    """
+    def strip(value):
+        if isinstance(value, np.ndarray) and value.ndim >= 2 and value.shape[-2:] == tuple(shape):
+            if value.ndim == 2:
+                return StripField(value[y0:y1], y0, shape)
+            return [strip(component) for component in value]
+        if isinstance(value, (list, tuple)):
+            return type(value)(strip(component) for component in value)
+        return value
+    return {name: strip(value) for name, value in kwargs.items()}
+
+def step_strip(read, write, health, ignite_time, burnout_time, y0, y1, ruleset, rng, step, kwargs, changes=False):
+    """
+    Advance rows [y0, y1) of a grid by one step.
+
+    The rows are read from `read` with a one-row halo on each side and written
+    to `write`, so strips can be stepped concurrently; health, ignition and
+    burn-out times of the strip are updated in place.
+
+    Parameters
+    ----------
+    read, write : np.ndarray
+        State codes of the whole grid before and after the step.
+    health, ignite_time, burnout_time : np.ndarray
+        Health, first ignition and burn-out steps of the whole grid.
+    y0, y1 : int
+        Rows of the strip.
+    ruleset : RuleSet
+        Array rules.
+    rng : CounterRNG
+        Position-keyed random source.
+    step : int
+        Step number.
+    kwargs : dict
+        Arguments passed to the rules.
+    changes : bool, optional
+        Also return the flat grid indices of the cells whose state or health
+        changed (default is False).
+
+    Returns
+    -------
+    tuple
+        (change in burning cells, number of ignitions, changed cells) of the
+        strip; changed cells is None unless `changes` is set.
+    """
+    height, width = read.shape
+    top, bottom = max(y0 - 1, 0), min(y1 + 1, height)
+    fire = read[top:bottom] == CellState.FIRE
+    fields = neighborhood_fields(fire)
+    rows = slice(y0 - top, y0 - top + y1 - y0)
+    fields = Neighborhood(fields.fire_count[rows], fields.fire_dx[rows], fields.fire_dy[rows],
+                          cells=np.arange(y0 * width, y1 * width).reshape(y1 - y0, width))
+    fire = fire[rows]
+    rng.start_step(step)
+    state, strip_health = ruleset.apply_arrays(read[y0:y1].copy(), health[y0:y1].copy(), fields, rng=rng, **kwargs)
+    changed = None
+    if changes:
+        changed = y0 * width + np.flatnonzero((state != read[y0:y1]) | (strip_health != health[y0:y1]))
+    write[y0:y1] = state
+    health[y0:y1] = strip_health
+    fire_change, ignitions = record_transitions(ignite_time[y0:y1], burnout_time[y0:y1], fire,
+                                                state == CellState.FIRE, step + 1)
+    return fire_change, ignitions, changed
+
+def _send_error(conn, error):
+    # exceptions that cannot be pickled are sent as a RuntimeError with their traceback
+    try:
+        conn.send(("error", error))
+    except Exception:
+        text = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+        conn.send(("error", RuntimeError(f"Worker failed:\n{text}")))
+
+def _worker(conn, names, shape, y0, y1, ruleset, rng):
+    # serve step commands for one strip until told to close
+    blocks = [SharedMemory(name=name) for name in names]
+    states = [np.ndarray(shape, dtype=STATE_DTYPE, buffer=blocks[i].buf) for i in (0, 1)]
+    health = np.ndarray(shape, dtype=HEALTH_DTYPE, buffer=blocks[2].buf)
+    ignite_time, burnout_time = (np.ndarray(shape, dtype=TIME_DTYPE, buffer=block.buf) for block in blocks[3:5])
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "close":
+                break
+            _, step, current, kwargs, changes = message
+            try:
+                result = step_strip(states[current], states[1 - current], health, ignite_time, burnout_time,
+                                    y0, y1, ruleset, rng, step, kwargs, changes)
+            except Exception as e:
+                # report the error to the parent and keep serving, so it can close the worker
+                _send_error(conn, e)
+            else:
+                conn.send(("ok", result))
+    finally:
+        del states, health, ignite_time, burnout_time
+        for block in blocks:
+            block.close()
+        conn.close()
+
+
+class DomainDecomposition:
+    """
+    Strips of a grid stepped by worker processes on shared-memory arrays.
+
+    The state codes are double-buffered: every worker reads its strip and a
+    one-row halo from the current buffer and writes the other one, and the
+    buffers are swapped once all workers have finished the step.
+
+    Parameters
+    ----------
+    grid : Grid
+        Compact grid; its arrays are copied into shared memory.
+    ignite_time, burnout_time : np.ndarray
+        First ignition and burn-out steps; copied into shared memory.
+    ruleset : RuleSet
+        Array rules, sent to every worker.
+    rng : CounterRNG
+        Position-keyed random source, copied to every worker.
+    workers : int
+        Number of worker processes (at most one per row).
+    """
+
+    def __init__(self, grid, ignite_time, burnout_time, ruleset, rng, workers):
+        shape = (grid.height, grid.width)
+        dtypes = (STATE_DTYPE, STATE_DTYPE, HEALTH_DTYPE, TIME_DTYPE, TIME_DTYPE)
+        self._blocks = [SharedMemory(create=True, size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1))
+                        for dtype in dtypes]
+        arrays = [np.ndarray(shape, dtype=dtype, buffer=block.buf) for dtype, block in zip(dtypes, self._blocks)]
+        self._states = arrays[:2]
+        self.health, self.ignite_time, self.burnout_time = arrays[2:]
+        self._states[0][:] = grid.state
+        self.health[:] = grid.health
+        self.ignite_time[:] = ignite_time
+        self.burnout_time[:] = burnout_time
+        self.current = 0
+
+        bounds = np.linspace(0, grid.height, min(workers, grid.height) + 1).astype(int)
+        names = [block.name for block in self._blocks]
+        self.shape = shape
+        self._strips = list(zip(bounds[:-1], bounds[1:]))
+        self._connections = []
+        self._processes = []
+        for y0, y1 in self._strips:
+            parent, child = mp.Pipe()
+            process = mp.Process(target=_worker, args=(child, names, shape, y0, y1, ruleset, rng), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    @property
+    def state(self):
+        """State codes of the current step, a view on shared memory."""
+        return self._states[self.current]
+
+    def step(self, step, kwargs, changes=False):
+        """
+        Advance all strips by one step.
+
+        Parameters
+        ----------
+        step : int
+            Step number.
+        kwargs : dict
+            Arguments passed to the rules; every worker gets only the rows of
+            its strip of per-cell fields, see `strip_kwargs`.
+        changes : bool, optional
+            Also collect the flat indices of the cells whose state or health
+            changed (default is False).
+
+        Returns
+        -------
+        tuple
+            (change in burning cells, number of ignitions, changed cells) of
+            the whole grid; changed cells is None unless `changes` is set.
+
+        Raises
+        ------
+        Exception
+            The error a rule raised in a worker.
+        RuntimeError
+            If a worker exited without answering.
+        """
+        for conn, (y0, y1) in zip(self._connections, self._strips):
+            try:
+                conn.send(("step", step, self.current, strip_kwargs(kwargs, y0, y1, self.shape), changes))
+            except (BrokenPipeError, OSError) as e:
+                raise RuntimeError("A worker process of the tiled engine exited") from e
+        # wait for every worker, so the next step finds them all idle
+        replies = []
+        for conn in self._connections:
+            try:
+                replies.append(conn.recv())
+            except EOFError:
+                replies.append(("error", RuntimeError("A worker process of the tiled engine exited")))
+        for kind, value in replies:
+            if kind == "error":
+                raise value
+        self.current = 1 - self.current
+        changed = np.concatenate([value[2] for _, value in replies]) if changes else None
+        return sum(value[0] for _, value in replies), sum(value[1] for _, value in replies), changed
+
+    def close(self):
+        """
+        Stop the workers and release the shared memory.
+
+        Returns
+        -------
+        tuple
+            Copies of (state, health, ignite_time, burnout_time).
+        """
+        try:
+            for conn in self._connections:
+                # workers that already exited cannot be told to
+                try:
+                    conn.send(("close",))
+                except (BrokenPipeError, OSError):
+                    pass
+                conn.close()
+            for process in self._processes:
+                process.join()
+            arrays = (self.state.copy(), self.health.copy(), self.ignite_time.copy(), self.burnout_time.copy())
+        finally:
+            del self._states, self.health, self.ignite_time, self.burnout_time
+            for block in self._blocks:
+                block.close()
+                block.unlink()
+        return arrays
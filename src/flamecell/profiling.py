@@ -0,0 +1,275 @@
+"""
+Forest Fire Simulation Framework
+
+This module instruments simulation steps. A `Profiler` attached with
+`Simulation.profile` times the phases of every step (preparing the state,
+gathering neighbors, copying, applying each rule, writing the grid back,
+recording history), counts the cells evaluated and changed, and passes the
+resulting `StepStats` to observers and to a JSON-lines log. Without a
+profiler a step only checks that none is attached.
+
+Phases of the engines:
+
+- cell: "copy", "neighbors", "rules", "write"
+- vector: "prepare", "neighbors", "copy", "rules", "write"
+- sparse: "prepare" (tile selection), "neighbors" (gathering tiles and
+  halos), "rules", "write"
+- tiled: "workers" (the whole parallel step; rules run in the workers and
+  are not timed one by one)
+
+plus "history" when a history is recorded. Work timed outside of steps, such
+as rendering frames, is added with `Profiler.time`.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+
+@dataclass
+class StepStats:
+    """
+    Timings and counters of one simulation step.
+
+    Attributes
+    ----------
+    step : int
+        Step count of the simulation after the step.
+    engine : str
+        Engine that ran the step.
+    elapsed : float
+        Wall-clock time of the step in seconds.
+    phases : dict
+        Seconds spent in each phase of the step.
+    rules : dict
+        Seconds spent in each rule, by rule name.
+    cells_evaluated : int
+        Number of cells the rules were applied to.
+    cells_changed : int
+        Number of cells whose state or health changed, or -1 if not counted.
+    fire_count : int
+        Number of burning cells after the step.
+    ignitions : int
+        Number of cells that caught fire in the step.
+    burned_area : int
+        Number of cells that have ignited so far.
+    run : str, optional
+        Label of the run, to tell runs apart in a shared log.
+    """
+    step: int
+    engine: str
+    elapsed: float
+    phases: dict
+    rules: dict
+    cells_evaluated: int
+    cells_changed: int
+    fire_count: int
+    ignitions: int
+    burned_area: int
+    run: str = None
+
+    def to_dict(self):
+        """Plain dict of the stats, as written to the log."""
+        return asdict(self)
+
+class Profiler:
+    """
+    Collector of per-step timings and counters.
+
+    Parameters
+    ----------
+    observers : sequence of callable, optional
+        Called with the `StepStats` of every step.
+    log : str or file, optional
+        JSON-lines file the stats of every step are appended to.
+    run : str, optional
+        Label of the run, stored with every step.
+    count_changes : bool, optional
+        Count the changed cells by comparing the grid before and after each
+        step (default is True); this copies the grid once per step, outside
+        of the timed phases.
+    clock : callable, optional
+        Time source in seconds (default is `time.perf_counter`).
+    """
+
+    def __init__(self, observers=(), log=None, run=None, count_changes=True, clock=time.perf_counter):
+        self.observers = list(observers)
+        self.run = run
+        self.count_changes = count_changes
+        self.clock = clock
+        self.steps = []
+        # seconds of work timed outside of steps, e.g. rendering
+        self.extra = {}
+        self._own_log = isinstance(log, str)
+        self._log = open(log, "a") if self._own_log else log
+        self.phases = None
+        self.rules = None
+        self.cells_evaluated = None
+        self._before = None
+        self._start = self._last = None
+
+    def add_observer(self, observer):
+        """
+        Call `observer` with the `StepStats` of every following step.
+
+        Parameters
+        ----------
+        observer : callable
+            Function taking a `StepStats`.
+        """
+        self.observers.append(observer)
+
+    def begin(self, sim):
+        """Start timing a step of `sim`; called by `Simulation.step`."""
+        if self.count_changes:
+            self._before = (sim.grid.state_codes().copy(), np.array(sim.grid.health, copy=True))
+        self.phases = {}
+        self.rules = {}
+        self.cells_evaluated = sim.grid.width * sim.grid.height
+        self._start = self._last = self.clock()
+
+    def mark(self, phase):
+        """
+        Add the time since the previous mark to a phase of the current step.
+
+        Parameters
+        ----------
+        phase : str
+            Name of the phase that just ended.
+        """
+        now = self.clock()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def end(self, sim, ignitions):
+        """
+        Finish a step of `sim` and report its stats; called by `Simulation.step`.
+
+        Returns
+        -------
+        StepStats
+            Stats of the step.
+        """
+        elapsed = self.clock() - self._start
+        changed = -1
+        if self._before is not None:
+            state, health = self._before
+            changed = int(np.count_nonzero((sim.grid.state_codes() != state) | (sim.grid.health != health)))
+            self._before = None
+        stats = StepStats(sim.step_count, sim.engine, elapsed, self.phases, self.rules, int(self.cells_evaluated),
+                          changed, int(sim.fire_count), int(ignitions), int(sim.burned_area), self.run)
+        self.steps.append(stats)
+        if self._log is not None:
+            self._log.write(json.dumps(stats.to_dict()) + "\n")
+        for observer in self.observers:
+            observer(stats)
+        return stats
+
+    @contextmanager
+    def time(self, name):
+        """
+        Time a block of work outside of the steps, e.g. rendering a frame.
+
+        Parameters
+        ----------
+        name : str
+            Name the time is summed under.
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.extra[name] = self.extra.get(name, 0.0) + self.clock() - start
+
+    def records(self):
+        """Stats of all profiled steps as plain dicts."""
+        return [stats.to_dict() for stats in self.steps]
+
+    def summary(self):
+        """
+        Table of the time spent per phase, per rule and outside of steps.
+
+        Returns
+        -------
+        str
+            Text table, see `summarize`.
+        """
+        return summarize(self.records(), extra=self.extra)
+
+    def close(self):
+        """Close the log file opened by the profiler."""
+        if self._log is not None:
+            self._log.flush()
+            if self._own_log:
+                self._log.close()
+            self._log = None
+
+
+def read_log(*paths):
+    """
+    Read the step records of one or more profiler logs.
+
+    Parameters
+    ----------
+    paths : str
+        JSON-lines files written by `Profiler`.
+
+    Returns
+    -------
+    list of dict
+        Records of all files in order.
+    """
+    records = []
+    for path in paths:
+        with open(path) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+def summarize(records, extra=None):
+    """
+    Aggregate step records into a table of total and mean time per phase and
+    per rule, followed by the mean counters of a step.
+
+    Parameters
+    ----------
+    records : list of dict
+        Step records, from `Profiler.records` or `read_log`; records of
+        several runs are aggregated together.
+    extra : dict, optional
+        Seconds of work outside of steps to list after the phases.
+
+    Returns
+    -------
+    str
+        Text table.
+    """
+    steps = len(records)
+    total = sum(record["elapsed"] for record in records)
+    lines = [f"{'':<28} {'total s':>9} {'mean ms':>9} {'share':>7}"]
+
+    def add(name, seconds, count):
+        share = f"{100 * seconds / total:.1f}%" if total else ""
+        lines.append(f"{name:<28} {seconds:>9.3f} {1e3 * seconds / max(count, 1):>9.3f} {share:>7}")
+
+    add(f"step ({steps} steps)", total, steps)
+    for key, prefix in (("phases", ""), ("rules", "rule ")):
+        sums = {}
+        for record in records:
+            for name, seconds in record[key].items():
+                sums[name] = sums.get(name, 0.0) + seconds
+        for name, seconds in sums.items():
+            add(f"  {prefix}{name}", seconds, steps)
+    for name, seconds in (extra or {}).items():
+        add(f"{name} (outside steps)", seconds, steps)
+    if steps:
+        changed = [record["cells_changed"] for record in records if record["cells_changed"] >= 0]
+        counters = [f"cells evaluated {np.mean([record['cells_evaluated'] for record in records]):.0f}",
+                    f"ignitions {np.mean([record['ignitions'] for record in records]):.1f}",
+                    f"burning {np.mean([record['fire_count'] for record in records]):.1f}"]
+        if changed:
+            counters.insert(1, f"cells changed {np.mean(changed):.1f}")
+        lines.append("mean per step: " + ", ".join(counters))
+    return "\n".join(lines)
@@ -0,0 +1,493 @@
+"""
+Forest Fire Simulation Framework
+
+This module provides cached, windowed access to the land-cover raster.
+
+A `RasterSource` keeps the dataset open and reads it in square tiles on a
+fixed grid of power-of-two zoom levels: level ``k`` has pixels ``2**k`` times
+the native size, and each tile holds ``tile_size`` mode-resampled pixels per
+side. A crop is assembled from the tiles of the coarsest level that still
+resolves the requested output size and mode-resampled to it, so panning or zooming around an area
+reuses the tiles that are already cached in memory or on disk.
+
+`build_overviews` (``python -m flamecell.raster <raster>``) writes the coarser
+levels once into a tiled pyramid file next to the raster; tiles of those
+levels are then read from the pyramid instead of mode-resampling large
+windows of the full-resolution raster.
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds as transform_from_bounds, from_origin
+from rasterio.warp import transform_bounds
+from rasterio.windows import Window
+
+TILE_SIZE = 256
+
+# input pixels mode_resample handles at a time
+MODE_BLOCK = 1 << 20
+
+def overview_path(path):
+    """
+    Default location of the overview pyramid of a raster.
+
+    Parameters
+    ----------
+    path : str
+        Path of the raster.
+
+    Returns
+    -------
+    str
+        ``<name>_overviews.tif`` next to the raster.
+    """
+    return os.path.splitext(path)[0] + "_overviews.tif"
+
+def build_overviews(path, out_path=None, levels=None, block_size=4096):
+    """
+    Write mode-resampled overview levels of a raster into a tiled GeoTIFF.
+
+    The main image of the output is level 1 (twice the native pixel size),
+    built block by block from the raster; levels 2, 3, ... are stored as its
+    internal overviews.
+
+    Parameters
+    ----------
+    path : str
+        Path of the land-cover raster.
+    out_path : str, optional
+        Output file (default is `overview_path(path)`).
+    levels : int, optional
+        Number of levels to build; by default until a level fits in one tile.
+    block_size : int, optional
+        Side in native pixels of the blocks read at a time (default is 4096).
+
+    Returns
+    -------
+    str
+        Path of the written file.
+    """
+    out_path = overview_path(path) if out_path is None else out_path
+    block_size -= block_size % 2
+    with rasterio.open(path) as src:
+        if levels is None:
+            levels = max(1, math.ceil(math.log2(max(src.width, src.height) / TILE_SIZE)))
+        profile = src.profile.copy()
+        profile.update(
+            driver="GTiff", width=-(-src.width // 2), height=-(-src.height // 2),
+            transform=from_origin(src.transform.c, src.transform.f, abs(src.res[0]) * 2, abs(src.res[1]) * 2),
+            tiled=True, blockxsize=TILE_SIZE, blockysize=TILE_SIZE, compress="deflate",
+        )
+        with rasterio.open(out_path, "w", **profile) as dst:
+            for y in range(0, src.height, block_size):
+                for x in range(0, src.width, block_size):
+                    width, height = min(block_size, src.width - x), min(block_size, src.height - y)
+                    out_width, out_height = -(-width // 2), -(-height // 2)
+                    data = src.read(window=Window(x, y, width, height),
+                                    out_shape=(src.count, out_height, out_width), resampling=Resampling.mode)
+                    dst.write(data, window=Window(x // 2, y // 2, out_width, out_height))
+            if levels > 1:
+                dst.build_overviews([2 ** k for k in range(1, levels)], Resampling.mode)
+    return out_path
+
+def _class_codes(values):
+    # distinct values and the index of every value among them; small integer
+    # classes are mapped with a lookup table instead of sorting
+    if values.dtype.kind in "ui" and values.dtype.itemsize <= 2:
+        offset = int(values.min())
+        present = np.bincount((values.astype(np.int64) - offset)) > 0
+        lookup = np.cumsum(present) - 1
+        return (np.flatnonzero(present) + offset).astype(values.dtype), lookup[values.astype(np.int64) - offset]
+    return np.unique(values, return_inverse=True)
+
+def _mode_of_cells(cells, codes, n_cells, n_classes):
+    # most common code of every output pixel, on ties the one met first in
+    # row-major order; few classes are counted per output pixel, many sorted
+    size = len(codes)
+    pairs = cells * n_classes + codes
+    if n_cells * n_classes <= 4 * MODE_BLOCK:
+        counts = np.bincount(pairs, minlength=n_cells * n_classes)
+        best = counts.reshape(n_cells, n_classes).max(axis=1)
+        first = np.full(n_cells, size)
+        top = np.flatnonzero(counts[pairs] == best[cells])
+        np.minimum.at(first, cells[top], top)
+        return codes[first]
+    # one sort groups the pixels by output pixel and class, in row-major order
+    keys = np.sort(pairs * size + np.arange(size))
+    keys, position = np.divmod(keys, size)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    keys, position = keys[starts], position[starts]
+    score = np.diff(np.r_[starts, size]) * size - position
+    cell = keys // n_classes
+    cell_starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+    best = score == np.repeat(np.maximum.reduceat(score, cell_starts), np.diff(np.r_[cell_starts, len(cell)]))
+    return keys[best] % n_classes
+
+def mode_resample(data, out_width, out_height):
+    """
+    Resample class data to another size, keeping the most common class.
+
+    Every input pixel counts for the output pixel its centre falls in, and
+    each output pixel takes the most common value among its input pixels,
+    on ties the one met first in row-major order as in GDAL's mode
+    resampling, so class codes are never mixed. Axes with fewer
+    input than output pixels are upsampled by repeating the nearest pixel.
+    Output rows are handled in blocks of about `MODE_BLOCK` input pixels,
+    which bounds the memory used.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Input of shape (bands, height, width).
+    out_width, out_height : int
+        Output size.
+
+    Returns
+    -------
+    np.ndarray
+        Resampled data of shape (bands, out_height, out_width).
+    """
+    bands, height, width = data.shape
+    if out_height > height:
+        data = data[:, ((np.arange(out_height) + 0.5) * height / out_height).astype(np.int64)]
+        height = out_height
+    if out_width > width:
+        data = data[:, :, ((np.arange(out_width) + 0.5) * width / out_width).astype(np.int64)]
+        width = out_width
+    if (height, width) == (out_height, out_width):
+        return np.ascontiguousarray(data)
+    rows = ((np.arange(height) + 0.5) * out_height / height).astype(np.int64)
+    cols = ((np.arange(width) + 0.5) * out_width / width).astype(np.int64)
+    out = np.empty((bands, out_height, out_width), dtype=data.dtype)
+    block_rows = max(1, MODE_BLOCK * out_height // (height * width))
+    for r0 in range(0, out_height, block_rows):
+        r1 = min(r0 + block_rows, out_height)
+        y0, y1 = np.searchsorted(rows, [r0, r1])
+        cells = ((rows[y0:y1, None] - r0) * out_width + cols).ravel()
+        for band in range(bands):
+            values, codes = _class_codes(data[band, y0:y1].ravel())
+            mode = _mode_of_cells(cells, codes, (r1 - r0) * out_width, len(values))
+            out[band, r0:r1] = values[mode].reshape(r1 - r0, out_width)
+    return out
+
+class LRUCache:
+    """
+    Mapping that keeps the `maxsize` most recently used entries.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries; 0 disables the cache.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return the entry for `key` and mark it as recently used."""
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        """Store an entry, dropping the least recently used one when full."""
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries."""
+        self._data.clear()
+
+
+class RasterSource:
+    """
+    Open land-cover raster with cached, tiled reads.
+
+    Parameters
+    ----------
+    path : str
+        Path of the raster (a north-up GeoTIFF).
+    cache_size : int, optional
+        Number of tiles kept in memory (default is 512).
+    crop_cache_size : int, optional
+        Number of finished crops kept in memory (default is 16).
+    cache_dir : str, optional
+        Directory for an on-disk tile cache that survives restarts; tiles are
+        only cached in memory if omitted.
+    tile_size : int, optional
+        Pixels per tile side (default is `TILE_SIZE`).
+    resampling : rasterio.enums.Resampling, optional
+        Resampling used to build the coarser levels (default is mode, which
+        keeps the land-cover classes intact).
+    overviews : str or bool, optional
+        Overview pyramid written by `build_overviews`. By default the file at
+        `overview_path(path)` is used if it exists; False reads every level
+        from the raster itself.
+    """
+
+    def __init__(self, path, cache_size=512, crop_cache_size=16, cache_dir=None,
+                 tile_size=TILE_SIZE, resampling=Resampling.mode, overviews=None):
+        self.path = path
+        self.dataset = rasterio.open(path)
+        if overviews is None:
+            overviews = overview_path(path) if os.path.exists(overview_path(path)) else False
+        self.overviews = overviews or None
+        # datasets per level: the raster, the pyramid's main image and its overviews
+        self._levels = [self.dataset]
+        if self.overviews is not None:
+            self._levels.append(rasterio.open(self.overviews))
+            for index in range(len(self._levels[1].overviews(1))):
+                self._levels.append(rasterio.open(self.overviews, overview_level=index))
+        self.bytes_read = 0
+        self.tile_size = tile_size
+        self.resampling = resampling
+        self.tile_reads = 0
+        self._tiles = LRUCache(cache_size)
+        self._crops = LRUCache(crop_cache_size)
+        self._lock = threading.RLock()
+        self.cache_dir = None
+        if cache_dir is not None:
+            self.cache_dir = os.path.join(cache_dir, self._fingerprint())
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _fingerprint(self):
+        # tiles on disk are only valid for this file, tile size and resampling
+        key = f"{self.tile_size}|{self.resampling.name}"
+        for path in (self.path, self.overviews):
+            if path is not None:
+                info = os.stat(path)
+                key += f"|{os.path.abspath(path)}|{info.st_size}|{info.st_mtime_ns}"
+        return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    @property
+    def crs(self):
+        """CRS of the raster."""
+        return self.dataset.crs
+
+    def close(self):
+        """Close the datasets and drop the memory caches."""
+        for dataset in self._levels:
+            dataset.close()
+        self._tiles.clear()
+        self._crops.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def project_bounds(self, bounds):
+        """
+        Convert Leaflet-style bounds to the CRS of the raster.
+
+        Parameters
+        ----------
+        bounds : dict
+            Leaflet-style bounds with '_southWest' and '_northEast'.
+
+        Returns
+        -------
+        tuple
+            (left, bottom, right, top) in the raster CRS.
+        """
+        south = bounds['_southWest']['lat']
+        west = bounds['_southWest']['lng']
+        north = bounds['_northEast']['lat']
+        east = bounds['_northEast']['lng']
+        return transform_bounds('EPSG:4326', self.dataset.crs, west, south, east, north)
+
+    def level_for(self, pixel_size):
+        """
+        Coarsest zoom level whose pixels are no larger than `pixel_size`.
+
+        Parameters
+        ----------
+        pixel_size : float
+            Requested output pixel size in raster units.
+
+        Returns
+        -------
+        int
+            Level ``k``, with pixels ``2**k`` times the native size.
+        """
+        ratio = pixel_size / min(abs(self.dataset.res[0]), abs(self.dataset.res[1]))
+        if ratio < 2:
+            return 0
+        return int(math.floor(math.log2(ratio) + 1e-9))
+
+    def tile(self, level, col, row):
+        """
+        One tile of a zoom level, from the caches or read from the raster.
+
+        Parameters
+        ----------
+        level : int
+            Zoom level.
+        col, row : int
+            Tile position on the level's tile grid, counted from the raster's
+            top-left corner.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (bands, tile_size, tile_size); zero outside the raster.
+        """
+        key = (level, col, row)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                return tile
+            path = None
+            if self.cache_dir is not None:
+                path = os.path.join(self.cache_dir, f"{level}_{col}_{row}.npy")
+                if os.path.exists(path):
+                    tile = np.load(path)
+            if tile is None:
+                tile = self._read_tile(level, col, row)
+                if path is not None:
+                    np.save(path, tile)
+            self._tiles.put(key, tile)
+            return tile
+
+    def _read_tile(self, level, col, row):
+        # read from the coarsest stored level that is not coarser than `level`
+        stored = min(level, len(self._levels) - 1)
+        dataset = self._levels[stored]
+        size = self.tile_size
+        factor = 2 ** (level - stored)
+        span = size * factor
+        tile = np.zeros((self.dataset.count, size, size), dtype=self.dataset.dtypes[0])
+        x0, y0 = col * span, row * span
+        x1, y1 = min(x0 + span, dataset.width), min(y0 + span, dataset.height)
+        if x0 < 0 or y0 < 0 or x1 <= x0 or y1 <= y0:
+            return tile
+        # tiles on the right and bottom edge only cover part of a full tile
+        width, height = -(-(x1 - x0) // factor), -(-(y1 - y0) // factor)
+        tile[:, :height, :width] = dataset.read(
+            window=Window(x0, y0, x1 - x0, y1 - y0),
+            out_shape=(dataset.count, height, width),
+            resampling=self.resampling,
+        )
+        self.tile_reads += 1
+        self.bytes_read += (x1 - x0) * (y1 - y0) * dataset.count * np.dtype(dataset.dtypes[0]).itemsize
+        return tile
+
+    def read(self, projected_bounds, output_size=(128, 128)):
+        """
+        Crop the raster to projected bounds and resample to `output_size`.
+
+        The bounds are snapped outward to the pixel grid of the chosen zoom
+        level, so the same area always maps to the same cached tiles. The
+        level window is mode-resampled to the output size (`mode_resample`),
+        like `crop_and_resample` does when reading the raster directly; when
+        the output pixels are not exactly level pixels, the next finer level
+        is used so that every output pixel takes the mode of several values.
+
+        Parameters
+        ----------
+        projected_bounds : tuple
+            (left, bottom, right, top) in the raster CRS.
+        output_size : tuple
+            Desired output shape (width, height).
+
+        Returns
+        -------
+        tuple
+            (resampled data of shape (bands, height, width), transform)
+        """
+        left, bottom, right, top = projected_bounds
+        out_width, out_height = int(output_size[0]), int(output_size[1])
+        pixel_size = min((right - left) / out_width, (top - bottom) / out_height)
+        level = self.level_for(pixel_size)
+        native = min(abs(self.dataset.res[0]), abs(self.dataset.res[1]))
+        if level > 0 and not math.isclose(pixel_size, native * 2 ** level, rel_tol=1e-6):
+            # output pixels spanning one to two level pixels would take their
+            # mode from one to four values, mostly ties; one level finer gives
+            # two to four per axis
+            level -= 1
+        origin_x, origin_y = self.dataset.transform.c, self.dataset.transform.f
+        pixel_x = abs(self.dataset.res[0]) * 2 ** level
+        pixel_y = abs(self.dataset.res[1]) * 2 ** level
+        col0 = math.floor((left - origin_x) / pixel_x + 1e-9)
+        col1 = math.ceil((right - origin_x) / pixel_x - 1e-9)
+        row0 = math.floor((origin_y - top) / pixel_y + 1e-9)
+        row1 = math.ceil((origin_y - bottom) / pixel_y - 1e-9)
+        col1, row1 = max(col1, col0 + 1), max(row1, row0 + 1)
+
+        key = (level, col0, col1, row0, row1, out_width, out_height)
+        transform = transform_from_bounds(origin_x + col0 * pixel_x, origin_y - row1 * pixel_y,
+                                          origin_x + col1 * pixel_x, origin_y - row0 * pixel_y,
+                                          out_width, out_height)
+        with self._lock:
+            data = self._crops.get(key)
+            if data is None:
+                data = self._sample(level, col0, col1, row0, row1, out_width, out_height)
+                self._crops.put(key, data)
+        return data.copy(), transform
+
+    def _sample(self, level, col0, col1, row0, row1, out_width, out_height):
+        # level window of the crop, mode-resampled to the output size
+        size = self.tile_size
+        tile_cols = range(col0 // size, (col1 - 1) // size + 1)
+        tile_rows = range(row0 // size, (row1 - 1) // size + 1)
+        mosaic = np.concatenate([
+            np.concatenate([self.tile(level, tc, tr) for tc in tile_cols], axis=2)
+            for tr in tile_rows
+        ], axis=1)
+        window = mosaic[:, row0 - tile_rows[0] * size:row1 - tile_rows[0] * size,
+                        col0 - tile_cols[0] * size:col1 - tile_cols[0] * size]
+        return mode_resample(window, out_width, out_height)
+
+    def crop(self, bounds, output_size=(128, 128)):
+        """
+        Crop the raster to Leaflet-style bounds and resample to `output_size`
+        with mode resampling, see `read`.
+
+        Parameters
+        ----------
+        bounds : dict
+            Leaflet-style bounds with '_southWest' and '_northEast'.
+        output_size : tuple
+            Desired output shape (width, height).
+
+        Returns
+        -------
+        tuple
+            (resampled data, transform)
+        """
+        return self.read(self.project_bounds(bounds), output_size)
+
+
+def main(argv=None):
+    """Build the overview pyramid of a raster from the command line."""
+    parser = argparse.ArgumentParser(description="Build mode-resampled overview levels of a land-cover raster.")
+    parser.add_argument("raster", help="land-cover GeoTIFF")
+    parser.add_argument("-o", "--output", help="output file (default: <raster>_overviews.tif)")
+    parser.add_argument("--levels", type=int, help="number of levels (default: until a level fits one tile)")
+    args = parser.parse_args(argv)
+    print(build_overviews(args.raster, args.output, levels=args.levels))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Forest Fire Simulation Framework
+
+This module turns grid states into RGB images with palette lookup tables,
+so a whole frame is colored by one indexing operation, and provides a live
+view that shows a running simulation without creating a figure per step.
+"""
+
+import time
+from contextlib import nullcontext
+from functools import lru_cache
+
+import numpy as np
+
+from flamecell.states import CellState
+
+color_map = {
+    "FIRE": (1.0, 0.5, 0),
+    "TREE": (0.1, 0.45, 0.1),
+    "GRASS": (0.6, 1.0, 0.6),
+    "WATER": (0.0, 0.0, 1.0),
+    "ASH": (0.0, 0.0, 0.0),
+    "EMPTY": (0.75, 0.75, 0.75)
+}
+
+# RGB color of each state code, as floats in [0, 1] and as uint8
+PALETTE_FLOAT = np.array([color_map[state.name] for state in CellState], dtype=float)
+PALETTE = (PALETTE_FLOAT * 255).astype(np.uint8)
+
+@lru_cache(maxsize=None)
+def colormap_lut(name, size=256):
+    """
+    Sample a matplotlib colormap into an RGB lookup table.
+
+    Parameters
+    ----------
+    name : str
+        Name of the colormap.
+    size : int, optional
+        Number of entries (default is 256).
+
+    Returns
+    -------
+    np.ndarray
+        Float array of shape (size, 3).
+    """
+    import matplotlib
+    return matplotlib.colormaps[name](np.linspace(0, 1, size))[:, :3]
+
+def _state_codes(grid):
+    # state codes of a Grid, or the given code array
+    return grid.state_codes() if hasattr(grid, "state_codes") else np.asarray(grid)
+
+def overlay_bins(values, size=256):
+    """
+    Scale a scalar field to colormap indices over its min-max range.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Field to scale.
+    size : int, optional
+        Number of colormap entries (default is 256).
+
+    Returns
+    -------
+    np.ndarray
+        Indices in [0, size); NaN values get index `size`.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    valid = ~np.isnan(values)
+    bins = np.full(values.shape, size, dtype=np.intp)
+    if valid.any():
+        low, high = values[valid].min(), values[valid].max()
+        scale = 0.0 if high == low else (size - 1) / (high - low)
+        bins[valid] = ((values[valid] - low) * scale).astype(np.intp)
+    return bins
+
+def render_grid(grid, overlay=None, cmap="hot", alpha=0.4, dtype=np.uint8):
+    """
+    Convert grid states to an RGB image, optionally with a blended overlay.
+
+    The overlay is scaled to its min-max range and colored with `cmap`, like
+    ``imshow(overlay, cmap=cmap, alpha=alpha)`` on top of the states; NaN
+    values leave the state color unchanged. Colors come from a table over all
+    (state, overlay bin) pairs, so blending is a single lookup as well.
+
+    Parameters
+    ----------
+    grid : Grid or np.ndarray
+        Simulation grid, or an array of `CellState` codes.
+    overlay : np.ndarray, optional
+        Per-cell values blended over the states.
+    cmap : str, optional
+        Colormap of the overlay (default is 'hot').
+    alpha : float, optional
+        Opacity of the overlay (default is 0.4).
+    dtype : numpy dtype, optional
+        np.uint8 (default) for 0-255 values, or a float type for values in [0, 1].
+
+    Returns
+    -------
+    np.ndarray
+        Image of shape (height, width, 3).
+    """
+    codes = _state_codes(grid)
+    floating = np.issubdtype(dtype, np.floating)
+    if overlay is None:
+        palette = PALETTE_FLOAT.astype(dtype) if floating else PALETTE
+        return np.take(palette, codes, axis=0)
+    lut = colormap_lut(cmap)
+    # blended color of every state with every colormap entry, plus the plain state for NaN
+    table = np.concatenate([(1 - alpha) * PALETTE_FLOAT[:, None] + alpha * lut[None],
+                            PALETTE_FLOAT[:, None]], axis=1)
+    table = table.astype(dtype) if floating else (table * 255 + 0.5).astype(np.uint8)
+    index = codes.astype(np.intp) * (len(lut) + 1) + overlay_bins(overlay, len(lut))
+    return np.take(table.reshape(-1, 3), index, axis=0)
+
+
+class LiveView:
+    """
+    Throttled display of a running simulation.
+
+    Frames are rendered from the state codes subsampled to at most `max_size`
+    pixels per side. They are sent either as raw RGB images with
+    ``target.image(frame)`` or, with ``use_figure=True``, through a single
+    matplotlib figure whose image data is updated in place and passed to
+    ``target.pyplot(figure)``. The figure is not registered with pyplot, so
+    no figures pile up over a long run.
+
+    Parameters
+    ----------
+    target : object, optional
+        Display element with ``image`` / ``pyplot`` methods, e.g. a Streamlit
+        placeholder from ``st.empty()``; frames are only kept in `frame` if omitted.
+    every : int, optional
+        Render only every n-th step (default is 1).
+    fps : float, optional
+        Maximum frames per second; not limited if omitted.
+    max_size : int, optional
+        Maximum frame side in pixels (default is 512).
+    use_figure : bool, optional
+        Show frames through a matplotlib figure instead of raw images.
+    clock : callable, optional
+        Time source in seconds (default is `time.perf_counter`).
+    """
+
+    def __init__(self, target=None, every=1, fps=None, max_size=512, use_figure=False, clock=time.perf_counter):
+        self.target = target
+        self.every = max(int(every), 1)
+        self.fps = fps
+        self.max_size = max_size
+        self.use_figure = use_figure
+        self.clock = clock
+        self.frame = None
+        self.frames_shown = 0
+        self._last_time = None
+        self._figure = None
+        self._image = None
+
+    def should_render(self, step):
+        """
+        Whether the frame of `step` is due under the step and rate limits.
+
+        Parameters
+        ----------
+        step : int
+            Step number.
+
+        Returns
+        -------
+        bool
+            True if the frame should be shown.
+        """
+        if step % self.every:
+            return False
+        if self.fps is not None and self._last_time is not None:
+            return self.clock() - self._last_time >= 1.0 / self.fps
+        return True
+
+    def render(self, grid, overlay=None):
+        """
+        Downsampled RGB frame of a grid.
+
+        Parameters
+        ----------
+        grid : Grid or np.ndarray
+            Simulation grid, or an array of `CellState` codes.
+        overlay : np.ndarray, optional
+            Per-cell values blended over the states (see `render_grid`).
+
+        Returns
+        -------
+        np.ndarray
+            uint8 image with sides of at most `max_size` pixels.
+        """
+        codes = _state_codes(grid)
+        stride = max(-(-max(codes.shape) // self.max_size), 1)
+        if overlay is not None:
+            overlay = np.asarray(overlay)[::stride, ::stride]
+        return render_grid(codes[::stride, ::stride], overlay=overlay)
+
+    @property
+    def figure(self):
+        """The figure showing the last frame (created on first use)."""
+        if self._figure is None:
+            from matplotlib.figure import Figure
+            self._figure = Figure()
+            ax = self._figure.subplots()
+            ax.set_xticks([])
+            ax.set_yticks([])
+            self._image = ax.imshow(np.zeros((1, 1, 3), dtype=np.uint8), interpolation='none')
+        return self._figure
+
+    def show(self, frame):
+        """
+        Send a frame to the target.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            uint8 RGB image.
+        """
+        self.frame = frame
+        self._last_time = self.clock()
+        self.frames_shown += 1
+        if self.use_figure:
+            figure = self.figure
+            self._image.set_data(frame)
+            self._image.set_extent((-0.5, frame.shape[1] - 0.5, frame.shape[0] - 0.5, -0.5))
+            if self.target is not None:
+                self.target.pyplot(figure)
+        elif self.target is not None:
+            self.target.image(frame)
+
+    def update(self, sim, force=False, overlay=None):
+        """
+        Show the current grid of a simulation if a frame is due.
+
+        Can be passed directly as the `callback` of `Simulation.run`.
+
+        Parameters
+        ----------
+        sim : Simulation
+            Running simulation.
+        force : bool, optional
+            Show the frame regardless of the limits, e.g. for the last step.
+        overlay : np.ndarray, optional
+            Per-cell values blended over the states.
+
+        Returns
+        -------
+        bool
+            True if a frame was shown.
+        """
+        if not (force or self.should_render(sim.step_count)):
+            return False
+        # rendering shows up in the profile of the simulation, if any
+        profiler = getattr(sim, "profiler", None)
+        with nullcontext() if profiler is None else profiler.time("render"):
+            self.show(self.render(sim.grid, overlay=overlay))
+        return True
+
+    def close(self):
+        """Release the figure."""
+        self._figure = None
+        self._image = None
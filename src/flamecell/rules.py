@@ -2,10 +2,244 @@
 Forest Fire Simulation Framework
 
 This module provides rule functions for the grid update.
+
+Cell rules are called once per cell as
+``rule(x, y, state, health, neighbors, **kwargs)`` and return the new
+``(state, health)`` of that cell. Array rules, marked with `array_rule`, are
+called once per step as ``rule(state, health, fields, **kwargs)`` on the
+uint8 state code and health arrays of the whole grid plus the `Neighborhood`
+fields of the current step, and return the updated ``(state, health)`` arrays
+(new arrays or the given ones updated in place).
+
+The weather arguments of the array rules (humidity, temp and each component
+of wind) can be scalars for the whole grid or per-cell fields: (height,
+width) arrays or `CoarseField` blocks; `field_at` reads them at the cells a
+rule evaluates.
 """
 
 import numpy as np
 
+from flamecell.states import CellState
+
+# relative (dx, dy) positions of the eight Moore neighbors
+NEIGHBOR_OFFSETS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+RULE_KINDS = ("cell", "array")
+
+def array_rule(rule):
+    """
+    Mark a function as an array rule.
+
+    Parameters
+    ----------
+    rule : callable
+        Function with the signature ``(state, health, fields, **kwargs)``.
+
+    Returns
+    -------
+    callable
+        The same function, tagged with ``rule_kind = "array"``.
+    """
+    rule.rule_kind = "array"
+    return rule
+
+class Neighborhood:
+    """
+    Burning-neighbor fields of the whole grid, passed to array rules.
+
+    Parameters
+    ----------
+    fire_count : np.ndarray
+        Number of burning Moore neighbors of each cell.
+    fire_dx, fire_dy : np.ndarray
+        Sums of the relative x and y offsets of the burning neighbors.
+    cells : np.ndarray, optional
+        Flat grid index of each evaluated cell, when the rules see only part of
+        the grid; None means the arrays are the whole grid.
+    origin : tuple, optional
+        (row, column) of the grid at which the last two axes of the arrays
+        start when `cells` is None (default is (0, 0)).
+    """
+
+    def __init__(self, fire_count, fire_dx, fire_dy, cells=None, origin=(0, 0)):
+        self.fire_count = fire_count
+        self.fire_dx = fire_dx
+        self.fire_dy = fire_dy
+        self.cells = cells
+        self.origin = origin
+
+    def cell_index(self, index):
+        """
+        Map flat indices of the evaluated arrays to flat grid indices.
+
+        Parameters
+        ----------
+        index : np.ndarray
+            Flat indices into the arrays passed to the rules.
+
+        Returns
+        -------
+        np.ndarray
+            Flat indices into the grid.
+        """
+        return index if self.cells is None else self.cells.ravel()[index]
+
+    def grid_position(self, index, shape, width):
+        """
+        Grid rows and columns of evaluated cells.
+
+        Parameters
+        ----------
+        index : np.ndarray
+            Flat indices into the arrays passed to the rules.
+        shape : tuple
+            Shape of those arrays; leading axes (e.g. realizations) are ignored.
+        width : int
+            Width of the grid.
+
+        Returns
+        -------
+        tuple
+            (rows, columns) arrays.
+        """
+        if self.cells is not None:
+            return np.divmod(self.cells.ravel()[index], width)
+        coords = np.unravel_index(index, shape)
+        return coords[-2] + self.origin[0], coords[-1] + self.origin[1]
+
+    def wind_alignment(self, wind, index=None):
+        """
+        Sum of ``dx * wind[0] + dy * wind[1]`` over the burning neighbors.
+
+        Parameters
+        ----------
+        wind : np.ndarray
+            Wind vector (dx, dy).
+        index : np.ndarray, optional
+            Flat cell indices to evaluate; the whole grid if omitted.
+
+        Returns
+        -------
+        np.ndarray
+            Wind alignment per cell (or per index).
+        """
+        if index is None:
+            return self.fire_dx * wind[0] + self.fire_dy * wind[1]
+        return self.fire_dx.ravel()[index] * wind[0] + self.fire_dy.ravel()[index] * wind[1]
+
+def neighborhood_fields(fire):
+    """
+    Count the burning neighbors of every cell with shifted-array sums.
+
+    Parameters
+    ----------
+    fire : np.ndarray
+        Boolean mask of burning cells, shape (..., height, width).
+
+    Returns
+    -------
+    Neighborhood
+        Burning-neighbor counts and offset sums with the shape of `fire`.
+    """
+    # separable sums: column triples give the counts and x offsets, row
+    # triples give the y offsets
+    pad = [(0, 0)] * (fire.ndim - 2) + [(1, 1), (1, 1)]
+    padded = np.pad(fire.astype(np.int8), pad)
+    columns = padded[..., :-2, :] + padded[..., 1:-1, :] + padded[..., 2:, :]
+    rows = padded[..., :, :-2] + padded[..., :, 1:-1] + padded[..., :, 2:]
+    count = columns[..., :-2] + columns[..., 1:-1] + columns[..., 2:] - fire
+    dx_sum = columns[..., 2:] - columns[..., :-2]
+    dy_sum = rows[..., 2:, :] - rows[..., :-2, :]
+    return Neighborhood(count, dx_sum, dy_sum)
+
+class CoarseField:
+    """
+    Per-cell input that is constant over blocks of cells.
+
+    A coarse grid of values, e.g. one per forecast point, stands for a full
+    resolution field without being upsampled: `at` reads the block of each
+    requested cell.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Value of each block, shape (block rows, block columns).
+    block : int or tuple
+        Block size in cells, as one size or (rows, columns).
+    shape : tuple, optional
+        (height, width) of the grid (default is the blocks times their size).
+    """
+
+    def __init__(self, values, block, shape=None):
+        self.values = np.asarray(values, dtype=float)
+        self.block = (block, block) if np.ndim(block) == 0 else tuple(block)
+        if shape is None:
+            shape = (self.values.shape[0] * self.block[0], self.values.shape[1] * self.block[1])
+        self.shape = tuple(shape)
+
+    @property
+    def ndim(self):
+        return 2
+
+    def at(self, rows, cols):
+        """
+        Values at grid cells.
+
+        Parameters
+        ----------
+        rows, cols : np.ndarray
+            Grid rows and columns.
+
+        Returns
+        -------
+        np.ndarray
+            Value of the block of each cell.
+        """
+        return self.values[rows // self.block[0], cols // self.block[1]]
+
+    def toarray(self):
+        """Full-resolution (height, width) array with the block values repeated."""
+        full = np.repeat(np.repeat(self.values, self.block[0], axis=0), self.block[1], axis=1)
+        return full[:self.shape[0], :self.shape[1]]
+
+    def interpolate(self):
+        """
+        Full-resolution (height, width) array interpolated bilinearly between
+        the block centres, for smoothly varying inputs.
+        """
+        rows = (np.arange(self.shape[0]) + 0.5) / self.block[0] - 0.5
+        cols = (np.arange(self.shape[1]) + 0.5) / self.block[1] - 0.5
+        by_row = np.stack([np.interp(cols, np.arange(self.values.shape[1]), line) for line in self.values])
+        return np.stack([np.interp(rows, np.arange(self.values.shape[0]), line) for line in by_row.T], axis=1)
+
+def field_at(value, fields, index, shape):
+    """
+    Read a scalar or per-cell input at the cells a rule evaluates.
+
+    Parameters
+    ----------
+    value : float, np.ndarray or CoarseField
+        Scalar for the whole grid, (height, width) array or an object with
+        ``shape`` and an ``at(rows, cols)`` method such as `CoarseField`.
+    fields : Neighborhood
+        Fields of the current step, used to locate the cells.
+    index : np.ndarray
+        Flat indices of the cells into the arrays passed to the rule.
+    shape : tuple
+        Shape of the arrays passed to the rule.
+
+    Returns
+    -------
+    float or np.ndarray
+        `value` itself if it is a scalar, else its value at each index.
+    """
+    if np.ndim(value) == 0:
+        return value
+    rows, cols = fields.grid_position(index, shape, value.shape[1])
+    if hasattr(value, "at"):
+        return value.at(rows, cols)
+    return np.asarray(value)[rows, cols]
+
 # Rules
 # ignite under certain probability, humidity and wind
 def ignite(x, y, state, health, neighbors, 
@@ -122,4 +356,162 @@ def burning(x, y, state, health, neighbors, **kwargs):
         health -= np.random.randint(1,3)
         if health <= 0:
             return "ASH", 0
-    return state, health
\ No newline at end of file
+    return state, health
+
+# Array rules
+def draw_uniform(rng, fields, index):
+    """
+    Draw one uniform number in [0, 1) for each cell in `index`.
+
+    Random sources with a ``rand_at`` method (e.g. `flamecell.parallel.CounterRNG`)
+    are keyed by grid position, so the draws do not depend on how the grid is
+    split up; others are called as ``rng.rand(len(index))``.
+
+    Parameters
+    ----------
+    rng : numpy.random.RandomState or CounterRNG
+        Random source passed to the rule.
+    fields : Neighborhood
+        Fields of the current step, used to locate the cells.
+    index : np.ndarray
+        Flat indices of the cells into the arrays passed to the rule.
+
+    Returns
+    -------
+    np.ndarray
+        One draw per index.
+    """
+    if hasattr(rng, "rand_at"):
+        return rng.rand_at(fields.cell_index(index))
+    return rng.rand(len(index))
+
+def draw_integers(rng, fields, index, low, high):
+    """
+    Draw one integer in [low, high) for each cell in `index`, like `draw_uniform`.
+
+    Parameters
+    ----------
+    rng : numpy.random.RandomState or CounterRNG
+        Random source passed to the rule.
+    fields : Neighborhood
+        Fields of the current step, used to locate the cells.
+    index : np.ndarray
+        Flat indices of the cells into the arrays passed to the rule.
+    low, high : int
+        Range of the integers.
+
+    Returns
+    -------
+    np.ndarray
+        One draw per index.
+    """
+    if hasattr(rng, "randint_at"):
+        return rng.randint_at(low, high, fields.cell_index(index))
+    return rng.randint(low, high, size=len(index))
+
+def _flammable_near_fire(state, fields):
+    # flat indices of TREE/GRASS cells with at least one burning neighbor
+    index = np.flatnonzero(fields.fire_count)
+    near = state.ravel()[index]
+    return index[(near == CellState.TREE) | (near == CellState.GRASS)]
+
+@array_rule
+def ignite_array(state, health, fields,
+                 prob=0.15, humidity=40, wind=np.array([0,0]), temp=20, rng=np.random, **kwargs):
+    """
+    Array form of `ignite` for the whole grid.
+
+    Parameters
+    ----------
+    state : np.ndarray
+        uint8 state codes of the grid.
+    health : np.ndarray
+        Health values of the grid.
+    fields : Neighborhood
+        Burning-neighbor fields of the current step.
+    prob : float, optional
+        Base ignition probability (default is 0.15).
+    humidity : float, np.ndarray or CoarseField, optional
+        Humidity percentage, for the grid or per cell (default is 40).
+    wind : np.ndarray, optional
+        Wind vector (default is [0, 0]); each of its two components can be a
+        per-cell field, e.g. a (2, height, width) array.
+    temp : float, np.ndarray or CoarseField, optional
+        Temperature in degrees Celsius, for the grid or per cell (default is 20).
+    rng : numpy.random.RandomState, optional
+        Random source (default is the global `np.random`).
+
+    Returns
+    -------
+    tuple
+        Updated state and health arrays.
+    """
+    index = _flammable_near_fire(state, fields)
+    wind = (field_at(wind[0], fields, index, state.shape), field_at(wind[1], fields, index, state.shape))
+    humidity = field_at(humidity, fields, index, state.shape)
+    temp = field_at(temp, fields, index, state.shape)
+    ignition_prob = fields.fire_count.ravel()[index] + fields.wind_alignment(wind, index) * 0.02
+    p = ignition_prob * prob * (1 - 0.009 * humidity) * (1 + 0.02 * (temp - 20))
+    state.flat[index[draw_uniform(rng, fields, index) < p]] = CellState.FIRE
+    return state, health
+
+@array_rule
+def ignite1_array(state, health, fields,
+                  prob=0.15, humidity=40, wind=np.array([0,0]), temp=20, wspd=0, **kwargs):
+    """
+    Array form of `ignite1` for the whole grid.
+    Like `ignite1`, every flammable cell next to a fire ignites.
+
+    Parameters
+    ----------
+    state : np.ndarray
+        uint8 state codes of the grid.
+    health : np.ndarray
+        Health values of the grid.
+    fields : Neighborhood
+        Burning-neighbor fields of the current step.
+    prob, humidity, wind, temp, wspd : optional
+        Same as in `ignite1`.
+
+    Returns
+    -------
+    tuple
+        Updated state and health arrays.
+    """
+    state.flat[_flammable_near_fire(state, fields)] = CellState.FIRE
+    return state, health
+
+@array_rule
+def burning_array(state, health, fields, rng=np.random, **kwargs):
+    """
+    Array form of `burning` for the whole grid.
+
+    Parameters
+    ----------
+    state : np.ndarray
+        uint8 state codes of the grid.
+    health : np.ndarray
+        Health values of the grid.
+    fields : Neighborhood
+        Burning-neighbor fields of the current step.
+    rng : numpy.random.RandomState, optional
+        Random source (default is the global `np.random`).
+
+    Returns
+    -------
+    tuple
+        Updated state and health arrays.
+    """
+    fire = state == CellState.FIRE
+    health[fire] -= draw_integers(rng, fields, np.flatnonzero(fire), 1, 3).astype(health.dtype)
+    ash = fire & (health <= 0)
+    state[ash] = CellState.ASH
+    health[ash] = 0
+    return state, health
+
+# cell rules and the array rules that reproduce them
+ARRAY_EQUIVALENTS = {
+    ignite: ignite_array,
+    ignite1: ignite1_array,
+    burning: burning_array,
+}
@@ -4,39 +4,70 @@ Forest Fire Simulation Framework
 This module provides classes and functions for simulating and visualizing a forest 
 fireusing cellular automata. It supports raster input, dynamic rule-based evolution,
 and external weather data integration.
+
+Only numpy is needed to import it and run simulations: matplotlib, requests
+and rasterio are imported on first use by the functions that need them, and
+are also available as module attributes (``sim_utils.plt``,
+``sim_utils.requests``, ...) that load them on first access.
 """
 
+import importlib
 import numbers
-import requests
-import matplotlib.pyplot as plt
-from rasterio.enums import Resampling
-from rasterio.windows import from_bounds
-from rasterio.warp import transform_bounds
+import os
+import time
+from dataclasses import dataclass
 import sys
 sys.path.append("../flamecell/src")
 from flamecell.rules import *
+from flamecell.rules import NEIGHBOR_OFFSETS, Neighborhood
+from flamecell.parallel import CounterRNG, DomainDecomposition
+from flamecell.history import History
+from flamecell.profiling import Profiler
+from flamecell.render import color_map, render_grid
+from flamecell.states import (CellState, STATE_DTYPE, HEALTH_DTYPE, TIME_DTYPE, NEVER, encode_states, decode_states,
+                              record_transitions)
 
-
-# color map for visualization, relative RGB values from [0.0, 1.0]
-color_map = {
-    "FIRE": (1.0, 0.5, 0),
-    "TREE": (0.1, 0.45, 0.1),
-    "GRASS": (0.6, 1.0, 0.6),
-    "WATER": (0.0, 0.0, 1.0),
-    "ASH": (0.0, 0.0, 0.0),
-    "EMPTY": (0.75, 0.75, 0.75)
+# heavy dependencies imported on first use, by name in this module: (module, attribute)
+_LAZY_IMPORTS = {
+    "plt": ("matplotlib.pyplot", None),
+    "requests": ("requests", None),
+    "Resampling": ("rasterio.enums", "Resampling"),
+    "from_bounds": ("rasterio.windows", "from_bounds"),
+    "transform_bounds": ("rasterio.warp", "transform_bounds"),
+    "RasterSource": ("flamecell.raster", "RasterSource"),
 }
 
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module, attribute = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+def _lazy(name):
+    # a lazily imported name, or whatever has replaced it in this module (e.g. a mock)
+    return globals()[name] if name in globals() else __getattr__(name)
+
+
 class Grid:
     """
     Grid represents the simulation area with state and health matrices.
 
+    By default `state` holds state strings ("TREE", "FIRE", ...). A compact grid
+    stores `state` as uint8 `CellState` codes and `health` as int8, which uses
+    about 8x less memory and is what the vectorized engine works on.
+
     Parameters
     ----------
     width : int
         Width of the grid.
     height : int
         Height of the grid.
+    compact : bool, optional
+        Store integer state codes instead of strings (default is False).
 
     Raises
     ------
@@ -44,25 +75,125 @@ class Grid:
         If width or height is not a positive integer.
     """
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, compact=False):
         if not isinstance(width, int) or width <= 0:
             raise ValueError("Width must be a positive integer")
         if not isinstance(height, int) or height <= 0:
             raise ValueError("Height must be a positive integer")
         self.width = width
         self.height = height
-        self.state = np.full((height, width), "EMPTY", dtype=object)
-        self.health = np.zeros((height, width), dtype=int)
+        self.compact = compact
+        if compact:
+            self.state = np.full((height, width), CellState.EMPTY, dtype=STATE_DTYPE)
+            self.health = np.zeros((height, width), dtype=HEALTH_DTYPE)
+        else:
+            self.state = np.full((height, width), "EMPTY", dtype=object)
+            self.health = np.zeros((height, width), dtype=int)
+
+    @classmethod
+    def from_arrays(cls, state, health):
+        """
+        Build a grid around existing state and health arrays without copying them.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            State strings (object array) or uint8 `CellState` codes; codes make
+            a compact grid.
+        health : np.ndarray
+            Health values with the shape of `state`.
+
+        Returns
+        -------
+        Grid
+            Grid whose `state` and `health` are the given arrays.
+        """
+        grid = cls.__new__(cls)
+        grid.height, grid.width = state.shape
+        grid.compact = state.dtype != object
+        grid.state = state
+        grid.health = health
+        return grid
+
+    def state_codes(self):
+        """
+        Return the state matrix as `CellState` codes.
+
+        Returns
+        -------
+        np.ndarray
+            uint8 code matrix; the stored array itself for compact grids.
+        """
+        return self.state if self.compact else encode_states(self.state)
+
+    def state_names(self):
+        """
+        Return the state matrix as state strings.
+
+        Returns
+        -------
+        np.ndarray
+            Object matrix of state names; the stored array itself for string grids.
+        """
+        return decode_states(self.state) if self.compact else self.state
+
+    def set_state(self, state):
+        """
+        Replace the state matrix, converting it to the grid's representation.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            Matrix of state names or `CellState` codes.
+        """
+        is_codes = state.dtype != object
+        if self.compact:
+            self.state = state.astype(STATE_DTYPE, copy=False) if is_codes else encode_states(state)
+        else:
+            self.state = decode_states(state) if is_codes else state
+
+    def to_compact(self):
+        """
+        Return a compact copy of the grid.
+
+        Returns
+        -------
+        Grid
+            Grid with uint8 states and int8 health.
+        """
+        grid = Grid(self.width, self.height, compact=True)
+        grid.state = self.state_codes().copy()
+        grid.health = self.health.astype(HEALTH_DTYPE)
+        return grid
+
+    def to_strings(self):
+        """
+        Return a copy of the grid with string states.
+
+        Returns
+        -------
+        Grid
+            Grid with object-dtype state names and int health.
+        """
+        grid = Grid(self.width, self.height)
+        grid.state = self.state_names().copy()
+        grid.health = self.health.astype(int)
+        return grid
 
 class RuleSet:
     """
     RuleSet manages and applies update rules to each cell.
+
+    A RuleSet holds either cell rules, applied per cell with `apply`, or array
+    rules, applied to the whole grid with `apply_arrays`; the kind is fixed by
+    the first rule added.
     """
 
     def __init__(self):
         self.rules = []
+        self.kind = None
 
-    def add_rule(self, rule):
+    def add_rule(self, rule, kind=None):
         """
         Add a transition rule.
 
@@ -70,10 +201,48 @@ class RuleSet:
         ----------
         rule : callable
             A rule function to apply to cells.
+        kind : str, optional
+            "cell" or "array". Defaults to "array" for functions decorated with
+            `array_rule` and "cell" otherwise.
+
+        Raises
+        ------
+        ValueError
+            If the kind is unknown or differs from the rules already added.
         """
+        kind = kind or getattr(rule, "rule_kind", "cell")
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Unknown rule kind '{kind}', expected one of {RULE_KINDS}")
+        if self.kind is not None and kind != self.kind:
+            raise ValueError(f"Cannot add {kind} rule to a RuleSet of {self.kind} rules")
         self.rules.append(rule)
+        self.kind = kind
 
-    def apply(self, x, y, state_matrix, health_matrix, neighbors, **kwargs):
+    def to_arrays(self):
+        """
+        Return an equivalent RuleSet of array rules.
+
+        Returns
+        -------
+        RuleSet
+            This RuleSet if it already holds array rules, otherwise a new one
+            with the array form of each cell rule.
+
+        Raises
+        ------
+        ValueError
+            If a cell rule has no array equivalent.
+        """
+        if self.kind != "cell":
+            return self
+        ruleset = RuleSet()
+        for rule in self.rules:
+            if rule not in ARRAY_EQUIVALENTS:
+                raise ValueError(f"Rule '{getattr(rule, '__name__', rule)}' has no array equivalent")
+            ruleset.add_rule(ARRAY_EQUIVALENTS[rule])
+        return ruleset
+
+    def apply(self, x, y, state_matrix, health_matrix, neighbors, timings=None, **kwargs):
         """
         Apply all rules to a specific cell.
 
@@ -87,6 +256,8 @@ class RuleSet:
             Current health matrix.
         neighbors : list of tuple
             Neighbor states and relative positions.
+        timings : dict, optional
+            Seconds per rule name, added to with the time of each rule.
         kwargs : dict
             Additional parameters like wind, humidity, etc.
 
@@ -97,10 +268,73 @@ class RuleSet:
         """
         new_state = state_matrix[y, x]
         new_health = health_matrix[y, x]
+        if timings is not None:
+            return self._apply_timed(timings, lambda rule, state, health: rule(
+                x, y, state, health, neighbors, **kwargs), new_state, new_health)
         for rule in self.rules:
             new_state, new_health = rule(x, y, new_state, new_health, neighbors, **kwargs)
         return new_state, new_health
 
+    def apply_arrays(self, state, health, fields, timings=None, **kwargs):
+        """
+        Apply all array rules to the whole grid.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            uint8 state codes; may be updated in place.
+        health : np.ndarray
+            Health values; may be updated in place.
+        fields : Neighborhood
+            Burning-neighbor fields of the current step.
+        timings : dict, optional
+            Seconds per rule name, added to with the time of each rule.
+        kwargs : dict
+            Additional parameters like wind, humidity, etc.
+
+        Returns
+        -------
+        tuple
+            New state and health arrays.
+        """
+        if timings is not None:
+            return self._apply_timed(timings, lambda rule, state, health: rule(
+                state, health, fields, **kwargs), state, health)
+        for rule in self.rules:
+            state, health = rule(state, health, fields, **kwargs)
+        return state, health
+
+    def _apply_timed(self, timings, call, state, health):
+        # apply the rules in order, summing the time of each under its name
+        for rule in self.rules:
+            name = getattr(rule, "__name__", repr(rule))
+            start = time.perf_counter()
+            state, health = call(rule, state, health)
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+        return state, health
+
+@dataclass
+class RunResult:
+    """
+    Outcome of `Simulation.run`.
+
+    Attributes
+    ----------
+    reason : str
+        Why the run stopped: "cancelled", "extinguished", "stabilized",
+        "time_budget" or "max_steps".
+    steps : int
+        Number of steps run by the call.
+    step_count : int
+        Step count of the simulation after the run.
+    elapsed : float
+        Wall-clock time of the run in seconds.
+    """
+    reason: str
+    steps: int
+    step_count: int
+    elapsed: float
+
 class Simulation:
     """
     Manages simulation steps and grid evolution.
@@ -111,14 +345,98 @@ class Simulation:
         The simulation grid.
     ruleset : RuleSet
         The ruleset to apply during updates.
+    engine : str, optional
+        "cell" (default) evaluates cell rules cell by cell, "vector" advances the
+        whole grid with array rules. The vector engine also accepts cell rules
+        that have an array equivalent (`ignite`, `ignite1`, `burning`); it draws
+        random numbers per grid instead of per cell, so runs agree statistically
+        but not draw-by-draw. It is fastest on compact grids, which it can update
+        without converting state names. "sparse" runs the same array rules only
+        on the tiles around burning cells, so a step costs time proportional to
+        the fire front instead of the grid area; it needs a compact grid.
+        "tiled" splits a compact grid into strips advanced by `workers`
+        processes on shared memory; call `close` when done with it.
+    tile_size : int, optional
+        Edge length of the tiles tracked by the sparse engine (default is 32).
+    seed : int or array_like, optional
+        Seed of the `np.random.RandomState` passed to array rules as `rng`.
+        Without a seed they draw from the global `np.random`; cell rules always do.
+        The tiled engine seeds a `CounterRNG` instead.
+    rng : object, optional
+        Random source passed to array rules, overriding `seed`. With a
+        `flamecell.parallel.CounterRNG` the vector, sparse and tiled engines
+        produce identical runs for the same seed.
+    workers : int, optional
+        Number of processes of the tiled engine (default is the CPU count).
+
+    Raises
+    ------
+    ValueError
+        If the engine is unknown or cannot run the ruleset or grid.
     """
 
-    def __init__(self, grid, ruleset):
+    engines = ("cell", "vector", "sparse", "tiled")
+
+    def __init__(self, grid, ruleset, engine="cell", tile_size=32, seed=None, rng=None, workers=None):
+        if engine not in self.engines:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.engines}")
+        if engine == "cell" and getattr(ruleset, "kind", None) == "array":
+            raise ValueError("The cell engine cannot apply array rules, use engine='vector'")
+        if engine in ("sparse", "tiled") and not grid.compact:
+            raise ValueError(f"The {engine} engine needs a compact grid, see Grid.to_compact")
         self.grid = grid
         self.ruleset = ruleset
+        self.engine = engine
+        self.tile_size = tile_size
+        if rng is None and engine == "tiled":
+            rng = CounterRNG(seed)
+        if rng is None:
+            rng = np.random if seed is None else np.random.RandomState(seed)
+        self.rng = rng
+        self.workers = workers or os.cpu_count() or 1
+        # worker processes of the tiled engine, started on the first step
+        self.domain = None
         self.step_count = 0
         self.max_steps = 1000
-        self.ignite_time = np.zeros_like(grid.state, dtype=np.int32)
+        # step count after which each cell first burned and last stopped
+        # burning, NEVER if it has not; written only for the cells that change
+        self.ignite_time = np.full((grid.height, grid.width), NEVER, dtype=TIME_DTYPE)
+        self.burnout_time = np.full((grid.height, grid.width), NEVER, dtype=TIME_DTYPE)
+        # fire tracking, counted from the grid on the first step and then
+        # updated by each step from the cells it changed
+        self.fire_count = None
+        self.burned_area = None
+        # (fire_count, burned_area) after every step, indexed by step count,
+        # see front_series and burned_series
+        self._series = np.full((0, 2), NEVER, dtype=TIME_DTYPE)
+        # bitmap of tiles holding burning cells, used by the sparse engine
+        self.active_tiles = None
+        # transition log written by every step, see record_history
+        self.history = None
+        # timings and counters of every step, see profile
+        self.profiler = None
+
+    def reset_active_front(self):
+        """
+        Recount burning and burned cells and rebuild the bitmap of tiles holding
+        burning cells from the grid.
+
+        The steps keep these up to date as the fire spreads; call this after
+        setting cells on fire by editing the grid directly. Burning cells
+        without an ignition time get the current step count.
+        """
+        codes = self.grid.state_codes()
+        fire = codes == CellState.FIRE
+        self.fire_count = int(np.count_nonzero(fire))
+        self.burned_area = self.fire_count + int(np.count_nonzero(codes == CellState.ASH))
+        record_transitions(self.ignite_time, self.burnout_time, np.zeros_like(fire), fire, self.step_count)
+        self._record_series()
+        if self.engine == "sparse":
+            size = self.tile_size
+            ny, nx = -(-self.grid.height // size), -(-self.grid.width // size)
+            tiles = np.zeros((ny * size, nx * size), dtype=bool)
+            tiles[:self.grid.height, :self.grid.width] = fire
+            self.active_tiles = tiles.reshape(ny, size, nx, size).any(axis=(1, 3))
 
     def step(self, prob=0.2, humidity=0.4, wind=np.array([0,0]), **kwargs):
         """
@@ -129,18 +447,197 @@ class Simulation:
         prob : float
             Base ignition probability.
         humidity : float
-            Environmental humidity.
+            Environmental humidity. With array rules it can also be a per-cell
+            (height, width) array or `flamecell.rules.CoarseField`.
         wind : np.ndarray
-            Wind vector (dx, dy).
+            Wind vector (dx, dy); with array rules each component can be a
+            per-cell field, e.g. a (2, height, width) array.
+        kwargs : dict
+            Additional arguments passed to rule functions, e.g. temp (also
+            per cell with array rules).
+        """
+        if self.fire_count is None:
+            self.reset_active_front()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin(self)
+        if hasattr(self.rng, "start_step"):
+            self.rng.start_step(self.step_count)
+        # every engine also returns the flat indices of the cells it may have
+        # changed, for the history; None if it does not track them
+        if self.engine == "vector":
+            fire_change, ignitions, changed = self._step_vector(prob=prob, humidity=humidity, wind=wind, **kwargs)
+        elif self.engine == "sparse":
+            fire_change, ignitions, changed = self._step_sparse(prob=prob, humidity=humidity, wind=wind, **kwargs)
+        elif self.engine == "tiled":
+            fire_change, ignitions, changed = self._step_tiled(prob=prob, humidity=humidity, wind=wind, **kwargs)
+        else:
+            fire_change, ignitions, changed = self._step_cells(prob=prob, humidity=humidity, wind=wind, **kwargs)
+        self.fire_count += fire_change
+        self.burned_area += ignitions
+        self.step_count += 1
+        self._record_series()
+        if self.history is not None:
+            self.history.record(self.grid, self.step_count, cells=changed)
+            if profiler is not None:
+                profiler.mark("history")
+        if profiler is not None:
+            profiler.end(self, ignitions)
+
+    def _record_series(self):
+        # grow the series by doubling, so recording a step is O(1) on average
+        if len(self._series) <= self.step_count:
+            series = np.full((max(2 * len(self._series), self.step_count + 1, 64), 2), NEVER, dtype=TIME_DTYPE)
+            series[:len(self._series)] = self._series
+            self._series = series
+        self._series[self.step_count] = self.fire_count, self.burned_area
+
+    @property
+    def front_series(self):
+        """
+        Number of burning cells after every step so far, indexed by step
+        count; NEVER for steps before the fire was first counted.
+        """
+        return self._series[:self.step_count + 1, 0]
+
+    @property
+    def burned_series(self):
+        """
+        Number of burning and burned cells after every step so far, indexed
+        by step count; NEVER for steps before the fire was first counted.
+        """
+        return self._series[:self.step_count + 1, 1]
+
+    @property
+    def burn_duration(self):
+        """
+        Steps each cell has burned: from its ignition to its burn-out, or to
+        the current step if it is still burning; NEVER if it never burned.
+        """
+        ignited = self.ignite_time != NEVER
+        end = np.where(self.burnout_time != NEVER, self.burnout_time, self.step_count)
+        return np.where(ignited, end - self.ignite_time, NEVER).astype(TIME_DTYPE)
+
+    def record_history(self, path=None):
+        """
+        Start logging the cells changed by every following step.
+
+        Parameters
+        ----------
+        path : str, optional
+            Directory to write the log to as the run goes; kept in memory if omitted.
+
+        Returns
+        -------
+        History
+            The log, also available as `history`; close it when done if it
+            is written to disk.
+        """
+        self.history = History(self.grid, path=path, start_step=self.step_count)
+        return self.history
+
+    def profile(self, observers=(), log=None, run=None, count_changes=True):
+        """
+        Start timing the phases and rules of every following step.
+
+        Parameters
+        ----------
+        observers : sequence of callable, optional
+            Called with the `flamecell.profiling.StepStats` of every step.
+        log : str or file, optional
+            JSON-lines file the stats of every step are appended to.
+        run : str, optional
+            Label of the run in the stats and the log.
+        count_changes : bool, optional
+            Count the cells changed by each step (default is True).
+
+        Returns
+        -------
+        Profiler
+            The profiler, also available as `profiler`; set `profiler` to
+            None to stop profiling, and close it if it writes a log.
+        """
+        self.profiler = Profiler(observers, log=log, run=run, count_changes=count_changes)
+        return self.profiler
+
+    def run(self, max_steps=None, time_budget=None, stable_steps=None, callback=None, should_stop=None,
+            weather=None, **kwargs):
+        """
+        Step the simulation until a termination condition is met.
+
+        The conditions are checked before every step, in this order: a
+        cancellation request from `should_stop`, no burning cells left, no new
+        ignitions for `stable_steps` steps, `time_budget` seconds used and
+        `max_steps` reached. They use the fire counts kept up to date by
+        `step`, so no condition rescans the grid.
+
+        Parameters
+        ----------
+        max_steps : int, optional
+            Stop when `step_count` reaches this value (default is `self.max_steps`).
+        time_budget : float, optional
+            Wall-clock budget of this call in seconds.
+        stable_steps : int, optional
+            Stop once the burned area has not grown for this many steps.
+        callback : callable, optional
+            Called with the simulation after every step.
+        should_stop : callable, optional
+            Checked before every step; the run stops with reason "cancelled"
+            once it returns true, e.g. ``threading.Event().is_set``.
+        weather : WeatherSchedule, optional
+            Weather of every step (`flamecell.weather.WeatherSchedule`); its
+            temp, humidity and wind replace those in `kwargs`.
         kwargs : dict
-            Additional arguments passed to rule functions.
+            Arguments passed to `step`, e.g. prob, humidity, wind and temp.
+
+        Returns
+        -------
+        RunResult
+            Why the run stopped, and how many steps it ran.
         """
-        new_state = self.grid.state.copy()
+        max_steps = self.max_steps if max_steps is None else max_steps
+        if self.fire_count is None:
+            self.reset_active_front()
+        start = time.perf_counter()
+        steps = 0
+        unchanged = 0
+        while True:
+            if should_stop is not None and should_stop():
+                reason = "cancelled"
+            elif self.fire_count == 0:
+                reason = "extinguished"
+            elif stable_steps is not None and unchanged >= stable_steps:
+                reason = "stabilized"
+            elif time_budget is not None and time.perf_counter() - start >= time_budget:
+                reason = "time_budget"
+            elif self.step_count >= max_steps:
+                reason = "max_steps"
+            else:
+                burned_area = self.burned_area
+                if weather is None:
+                    self.step(**kwargs)
+                else:
+                    self.step(**{**kwargs, **weather.at(self.step_count)})
+                steps += 1
+                unchanged = unchanged + 1 if self.burned_area == burned_area else 0
+                if callback is not None:
+                    callback(self)
+                continue
+            return RunResult(reason, steps, self.step_count, time.perf_counter() - start)
+
+    def _step_cells(self, **kwargs):
+        profiler = self.profiler
+        timings = None if profiler is None else profiler.rules
+        # the per-cell rules work on state names, also for compact grids
+        state_names = self.grid.state_names()
+        new_state = state_names.copy()
         new_health = self.grid.health.copy()
+        fire_change = ignitions = 0
+        if profiler is not None:
+            profiler.mark("copy")
         for y in range(self.grid.height):
             for x in range(self.grid.width):
-                if new_state[y, x] == "FIRE":
-                    self.ignite_time[y, x] = self.step_count
+                burning_before = new_state[y, x] == "FIRE"
                 # calculate neighbors
                 neighbors = []
                 for dy in [-1, 0, 1]:
@@ -149,19 +646,157 @@ class Simulation:
                             continue
                         nx, ny = x + dx, y + dy
                         if 0 <= nx < self.grid.width and 0 <= ny < self.grid.height:
-                            neighbor_state = self.grid.state[ny, nx]
+                            neighbor_state = state_names[ny, nx]
                             neighbors.append((neighbor_state, dx, dy))
+                if profiler is not None:
+                    profiler.mark("neighbors")
                 # apply all the rules
-                state, health = self.ruleset.apply(x, y, self.grid.state, self.grid.health, neighbors, prob=prob, humidity=humidity, wind=wind, **kwargs)
+                state, health = self.ruleset.apply(x, y, state_names, self.grid.health, neighbors,
+                                                   timings=timings, **kwargs)
+                if profiler is not None:
+                    profiler.mark("rules")
                 new_state[y, x] = state
                 new_health[y, x] = health
+                if (state == "FIRE") != burning_before:
+                    fire_change += -1 if burning_before else 1
+                    ignitions += not burning_before
+                    if burning_before:
+                        self.burnout_time[y, x] = self.step_count + 1
+                    elif self.ignite_time[y, x] == NEVER:
+                        self.ignite_time[y, x] = self.step_count + 1
         # Apply new state
-        self.grid.state = new_state
+        self.grid.set_state(new_state)
         self.grid.health = new_health
-        self.step_count += 1
+        if profiler is not None:
+            profiler.mark("write")
+        return fire_change, ignitions, None
+
+    def _step_vector(self, **kwargs):
+        profiler = self.profiler
+        codes = self.grid.state_codes()
+        fire = codes == CellState.FIRE
+        if profiler is not None:
+            profiler.mark("prepare")
+        # neighbor fields always come from the state at the start of the step
+        fields = neighborhood_fields(fire)
+        if profiler is not None:
+            profiler.mark("neighbors")
+        state, health = codes.copy(), self.grid.health.copy()
+        if profiler is not None:
+            profiler.mark("copy")
+        new_state, new_health = self.ruleset.to_arrays().apply_arrays(
+            state, health, fields, timings=None if profiler is None else profiler.rules, rng=self.rng, **kwargs)
+        if profiler is not None:
+            profiler.mark("rules")
+        fire_change, ignitions = record_transitions(self.ignite_time, self.burnout_time, fire,
+                                                    new_state == CellState.FIRE, self.step_count + 1)
+        # the step has the old and new arrays at hand, so the history gets the exact changes
+        changed = None
+        if self.history is not None:
+            changed = np.flatnonzero((new_state != codes) | (new_health != self.grid.health))
+        self.grid.set_state(new_state)
+        self.grid.health = new_health
+        if profiler is not None:
+            profiler.mark("write")
+        return fire_change, ignitions, changed
+
+    def _step_sparse(self, **kwargs):
+        profiler = self.profiler
+        size = self.tile_size
+        height, width = self.grid.height, self.grid.width
+        # fire on a tile edge can spread into the surrounding tiles
+        active = self.active_tiles
+        padded = np.pad(active, 1)
+        evaluate = active.copy()
+        for dx, dy in NEIGHBOR_OFFSETS:
+            evaluate |= padded[1 + dy:1 + dy + active.shape[0], 1 + dx:1 + dx + active.shape[1]]
+        tile_y, tile_x = np.nonzero(evaluate)
+        if profiler is not None:
+            profiler.mark("prepare")
+        if len(tile_y) == 0:
+            if profiler is not None:
+                profiler.cells_evaluated = 0
+            return 0, 0, np.empty(0, dtype=np.intp)
+
+        # gather the evaluated tiles with a one-cell halo into a (tiles, size+2, size+2) stack
+        offsets = np.arange(-1, size + 1)
+        rows = tile_y[:, None] * size + offsets
+        cols = tile_x[:, None] * size + offsets
+        inside = ((rows >= 0) & (rows < height))[:, :, None] & ((cols >= 0) & (cols < width))[:, None, :]
+        rows = np.clip(rows, 0, height - 1)[:, :, None]
+        cols = np.clip(cols, 0, width - 1)[:, None, :]
+        state = self.grid.state[rows, cols]
+        state[~inside] = CellState.EMPTY
+        fields = neighborhood_fields(state == CellState.FIRE)
+
+        interior = (slice(None), slice(1, -1), slice(1, -1))
+        rows, cols = np.broadcast_arrays(rows[:, 1:-1], cols[:, :, 1:-1])
+        fields = Neighborhood(*(np.ascontiguousarray(field[interior]) for field in
+                                (fields.fire_count, fields.fire_dx, fields.fire_dy)),
+                              cells=rows * width + cols)
+        inside = inside[interior]
+        rows, cols = rows[inside], cols[inside]
+        state = np.ascontiguousarray(state[interior])
+        health = np.zeros(state.shape, dtype=self.grid.health.dtype)
+        health[inside] = self.grid.health[rows, cols]
+
+        fire = state[inside] == CellState.FIRE
+        if profiler is not None:
+            profiler.cells_evaluated = len(rows)
+            profiler.mark("neighbors")
+        state, health = self.ruleset.to_arrays().apply_arrays(
+            state, health, fields, timings=None if profiler is None else profiler.rules, rng=self.rng, **kwargs)
+        if profiler is not None:
+            profiler.mark("rules")
+        new_fire = state[inside] == CellState.FIRE
+        self.grid.state[rows, cols] = state[inside]
+        self.grid.health[rows, cols] = health[inside]
+        self.active_tiles[tile_y, tile_x] = ((state == CellState.FIRE) & inside).any(axis=(1, 2))
+        cells = rows * width + cols
+        fire_change, ignitions = record_transitions(self.ignite_time, self.burnout_time, fire, new_fire,
+                                                    self.step_count + 1, cells=cells)
+        if profiler is not None:
+            profiler.mark("write")
+        return fire_change, ignitions, cells
+
+    def _step_tiled(self, **kwargs):
+        if self.domain is None:
+            self.domain = DomainDecomposition(self.grid, self.ignite_time, self.burnout_time,
+                                              self.ruleset.to_arrays(), self.rng, self.workers)
+            self.grid.health = self.domain.health
+            self.ignite_time, self.burnout_time = self.domain.ignite_time, self.domain.burnout_time
+        result = self.domain.step(self.step_count, kwargs, changes=self.history is not None)
+        # the grid and ignition and burn-out times are views on the shared buffers
+        self.grid.state = self.domain.state
+        if self.profiler is not None:
+            self.profiler.mark("workers")
+        return result
+
+    def close(self):
+        """
+        Stop the worker processes of the tiled engine, keeping the grid and
+        ignition and burn-out times as regular arrays. Other engines have
+        nothing to close.
+        """
+        if self.domain is not None:
+            self.grid.state, self.grid.health, self.ignite_time, self.burnout_time = self.domain.close()
+            self.domain = None
 
+    def __enter__(self):
+        return self
 
-def raster_to_cell(pixel_value):
+    def __exit__(self, *exc):
+        self.close()
+
+
+# land-cover classes of the default raster and the cell states they become;
+# unlisted classes become EMPTY
+LANDCOVER_STATES = {4: "WATER", 5: "WATER", 31: "TREE", 22: "GRASS", 32: "GRASS"}
+
+# initial health of each cell state; unlisted states start at 0
+INITIAL_HEALTH = {"TREE": 10, "GRASS": 4}
+
+def raster_to_cell(pixel_value, mapping=None):
     """
     Convert raster pixel value to cell type.
 
@@ -169,6 +804,8 @@ def raster_to_cell(pixel_value):
     ----------
     pixel_value : int
         Raster pixel classification code.
+    mapping : dict, optional
+        Land-cover class to state name (default is `LANDCOVER_STATES`).
 
     Returns
     -------
@@ -182,39 +819,100 @@ def raster_to_cell(pixel_value):
     """
     if not isinstance(pixel_value, numbers.Integral):
         raise TypeError("Pixel Value should be non-negative integer")
-    
-    if pixel_value in (4, 5):
-        return "WATER"
-    if pixel_value == 31:
-        return "TREE"
-    if pixel_value in (22, 32):
-        return "GRASS"
-    return "EMPTY"
-
-def raster_to_grid(data):
+    mapping = LANDCOVER_STATES if mapping is None else mapping
+    return mapping.get(pixel_value, "EMPTY")
+
+def landcover_lut(mapping=None, health=None, size=None):
+    """
+    Build lookup tables from land-cover class to state code and initial health.
+
+    Parameters
+    ----------
+    mapping : dict, optional
+        Land-cover class to state name (default is `LANDCOVER_STATES`).
+    health : dict, optional
+        State name to initial health (default is `INITIAL_HEALTH`).
+    size : int, optional
+        Number of table entries; at least one more than the largest class.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        (state_lut, health_lut) indexed by class; unmapped classes are EMPTY
+        with health 0.
+
+    Raises
+    ------
+    ValueError
+        If a class is negative, a state name is unknown or a health value does
+        not fit the health of compact grids.
+    """
+    mapping = LANDCOVER_STATES if mapping is None else mapping
+    health = INITIAL_HEALTH if health is None else health
+    if any(code < 0 for code in mapping):
+        raise ValueError("Land-cover classes must be non-negative integers")
+    unknown = (set(mapping.values()) | set(health)) - set(CellState.__members__)
+    if unknown:
+        raise ValueError(f"Unknown cell states {sorted(unknown)}")
+    limit = np.iinfo(HEALTH_DTYPE)
+    if any(not limit.min <= value <= limit.max for value in health.values()):
+        raise ValueError(f"Initial health must lie in [{limit.min}, {limit.max}]")
+    size = max(size or 0, max(mapping, default=0) + 1)
+    state_lut = np.full(size, CellState.EMPTY, dtype=STATE_DTYPE)
+    for code, name in mapping.items():
+        state_lut[code] = CellState[name]
+    health_by_state = np.zeros(len(CellState), dtype=HEALTH_DTYPE)
+    for name, value in health.items():
+        health_by_state[CellState[name]] = value
+    return state_lut, health_by_state[state_lut]
+
+def raster_to_grid(data, compact=False, mapping=None, health=None):
     """
     Convert raster data into a Grid object.
 
+    Classes are mapped to states and initial health with lookup tables, in one
+    indexing operation per array.
+
     Parameters
     ----------
     data : np.ndarray
         Raster classification matrix.
+    compact : bool, optional
+        Return a compact grid with integer state codes (default is False).
+    mapping : dict, optional
+        Land-cover class to state name (default is `LANDCOVER_STATES`), e.g. for
+        other land-cover products.
+    health : dict, optional
+        State name to initial health (default is `INITIAL_HEALTH`).
 
     Returns
     -------
     Grid
         Initialized simulation grid.
+
+    Raises
+    ------
+    TypeError
+        If the raster does not hold integers.
     """
+    data = np.asarray(data)
+    if not np.issubdtype(data.dtype, np.integer):
+        raise TypeError("Raster values should be non-negative integers")
     height, width = data.shape
-    grid = Grid(width, height)
-    for y in range(height):
-        for x in range(width):
-            state = raster_to_cell(data[y,x])
-            grid.state[y, x] = state
-            if state == "TREE":
-                grid.health[y, x] = 10
-            elif state =="GRASS":
-                grid.health[y, x] = 4
+    if data.dtype.itemsize <= 2 and np.issubdtype(data.dtype, np.unsignedinteger):
+        # small unsigned rasters index a table covering every possible value
+        state_lut, health_lut = landcover_lut(mapping, health, size=np.iinfo(data.dtype).max + 1)
+        index = data
+    else:
+        state_lut, health_lut = landcover_lut(mapping, health)
+        # out-of-table classes point to an appended EMPTY entry
+        state_lut = np.append(state_lut, STATE_DTYPE(CellState.EMPTY))
+        health_lut = np.append(health_lut, HEALTH_DTYPE(0))
+        index = np.where((data >= 0) & (data < len(state_lut) - 1), data, len(state_lut) - 1)
+    grid = Grid(width, height, compact=compact)
+    codes = state_lut[index]
+    grid.set_state(codes)
+    grid.health = health_lut[index] if compact else health_lut[index].astype(int)
     return grid
 
 def grid_to_img(grid):
@@ -231,12 +929,7 @@ def grid_to_img(grid):
     np.ndarray
         RGB image array.
     """
-    img = np.zeros((grid.height, grid.width, 3), dtype=np.uint8)
-    for y in range(grid.height):
-        for x in range(grid.width):
-            r, g, b = color_map[grid.state[y][x]]
-            img[y, x] = [int(r * 255), int(g * 255), int(b * 255)]
-    return img
+    return render_grid(grid)
 
 def plot_grid(grid):
     """
@@ -252,18 +945,13 @@ def plot_grid(grid):
     matplotlib.figure.Figure
         Figure object for visualization.
     """
-    img = np.zeros((grid.height, grid.width, 3))
-    for y in range(grid.height):
-        for x in range(grid.width):
-            img[y, x] = color_map[grid.state[y][x]]
-
-    fig, ax = plt.subplots()
-    ax.imshow(img, interpolation='none')
+    fig, ax = _lazy("plt").subplots()
+    ax.imshow(render_grid(grid, dtype=float), interpolation='none')
     ax.set_xticks([])
     ax.set_yticks([])
     return fig
 
-def plot_risk_map(sim):
+def plot_risk_map(sim, risk=None):
     """
     Overlay risk heatmap based on ignition time over the current grid state.
 
@@ -271,22 +959,23 @@ def plot_risk_map(sim):
     ----------
     sim : Simulation
         Simulation object.
+    risk : np.ndarray, optional
+        Per-cell values to overlay instead of the ignition step of the burned
+        cells (`sim.ignite_time`), e.g. the burn probability of an ensemble or
+        an arrival-time map; NaN cells are not overlaid.
 
     Returns
     -------
     matplotlib.figure.Figure
         Figure object with overlayed heatmap.
     """
-    base = np.zeros((sim.grid.height, sim.grid.width, 3))
-    for y in range(sim.grid.height):
-        for x in range(sim.grid.width):
-            base[y, x] = color_map[sim.grid.state[y][x]]
-
-    fig, ax = plt.subplots()
-    ax.imshow(base, interpolation='none')
+    # risk heatmap in red scale blended over the states; NaN cells show the state only
+    if risk is None:
+        risk = np.where(sim.ignite_time == NEVER, np.nan, sim.ignite_time)
+    img = render_grid(sim.grid, overlay=risk, cmap='hot', alpha=0.4, dtype=float)
 
-    # Overlay risk heatmap in red scale with transparency
-    heat = ax.imshow(sim.ignite_time, cmap='hot', alpha=0.4, interpolation='none')
+    fig, ax = _lazy("plt").subplots()
+    ax.imshow(img, interpolation='none')
 
     ax.set_xticks([])
     ax.set_yticks([])
@@ -312,7 +1001,7 @@ def get_current_wind(lat, lon):
         f"latitude={lat}&longitude={lon}&current=wind_speed_10m,wind_direction_10m"
     )
     try:
-        response = requests.get(url, timeout=10)
+        response = _lazy("requests").get(url, timeout=10)
         response.raise_for_status()
         data = response.json()
         wind_speed = data['current']['wind_speed_10m']
@@ -343,7 +1032,7 @@ def get_current_humidity(lat, lon):
         f"latitude={lat}&longitude={lon}&current=relative_humidity_2m"
     )
     try:
-        response = requests.get(url, timeout=10)
+        response = _lazy("requests").get(url, timeout=10)
         response.raise_for_status()
         data = response.json()
         humidity = data['current']['relative_humidity_2m']
@@ -371,7 +1060,7 @@ def get_current_temperature(lat, lon):
         f"latitude={lat}&longitude={lon}&current=temperature_2m"
     )
     try:
-        response = requests.get(url, timeout=10)
+        response = _lazy("requests").get(url, timeout=10)
         response.raise_for_status()
         data = response.json()
         temp = data['current']['temperature_2m']
@@ -386,8 +1075,8 @@ def crop_and_resample(src, bounds, output_size=(128, 128)):
 
     Parameters
     ----------
-    src : rasterio.DatasetReader
-        Open land use map.
+    src : rasterio.DatasetReader or RasterSource
+        Open land use map; a `RasterSource` serves the crop from its tile caches.
     bounds : dict
         Leaflet-style bounds with '_southWest' and '_northEast'.
     output_size : tuple
@@ -398,15 +1087,20 @@ def crop_and_resample(src, bounds, output_size=(128, 128)):
     tuple
         (resampled data, transform)
     """
+    # a RasterSource can only exist once flamecell.raster has been imported
+    raster = sys.modules.get("flamecell.raster")
+    if raster is not None and isinstance(src, raster.RasterSource):
+        return src.crop(bounds, output_size)
+
     south = bounds['_southWest']['lat']
     west = bounds['_southWest']['lng']
     north = bounds['_northEast']['lat']
     east = bounds['_northEast']['lng']
 
     src_crs = src.crs  # Get CRS from the raster dataset
-    bounds_projected = transform_bounds('EPSG:4326', src_crs, west, south, east, north)
+    bounds_projected = _lazy("transform_bounds")('EPSG:4326', src_crs, west, south, east, north)
     # Create window from bounds
-    window = from_bounds(*bounds_projected, transform=src.transform)
+    window = _lazy("from_bounds")(*bounds_projected, transform=src.transform)
 
     # Calculate the transform and shape of the windowed output
     transform = src.window_transform(window)
@@ -420,7 +1114,7 @@ def crop_and_resample(src, bounds, output_size=(128, 128)):
             output_size[0]   # width
         ),
         #resampling=Resampling.nearest,
-        resampling=Resampling.mode,
+        resampling=_lazy("Resampling").mode,
     )
     return data, transform
 
@@ -443,4 +1137,3 @@ def normalize(arr):
     arr /= arr.max()
     arr *= 255
     return arr.astype('uint8')
-
@@ -0,0 +1,111 @@
+"""
+Forest Fire Simulation Framework
+
+This module defines the compact integer coding of cell states.
+"""
+
+from enum import IntEnum
+
+import numpy as np
+
+
+class CellState(IntEnum):
+    """
+    Integer codes of the cell states, stored as uint8 in compact grids.
+
+    The member names are the state strings used by the rules and `color_map`.
+    """
+    EMPTY = 0
+    TREE = 1
+    GRASS = 2
+    WATER = 3
+    FIRE = 4
+    ASH = 5
+
+# state name for each code, indexable by a code array
+STATE_NAMES = np.array([state.name for state in CellState], dtype=object)
+
+STATE_DTYPE = np.uint8
+# health of compact grids; large enough for the TREE (10) and GRASS (4) start values
+HEALTH_DTYPE = np.int8
+# step numbers of the per-cell ignition and burn-out times; NEVER marks cells
+# the transition has not happened to
+TIME_DTYPE = np.int32
+NEVER = -1
+
+_CODE_OF = {state.name: int(state) for state in CellState}
+
+def encode_states(names):
+    """
+    Convert an array of state names to uint8 state codes.
+
+    Parameters
+    ----------
+    names : np.ndarray
+        Array of state strings.
+
+    Returns
+    -------
+    np.ndarray
+        Array of `CellState` codes with the same shape.
+
+    Raises
+    ------
+    KeyError
+        If an element is not a known state name.
+    """
+    names = np.asarray(names, dtype=object)
+    codes = np.fromiter(map(_CODE_OF.__getitem__, names.ravel()), dtype=STATE_DTYPE, count=names.size)
+    return codes.reshape(names.shape)
+
+def decode_states(codes):
+    """
+    Convert an array of state codes to state names.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        Array of `CellState` codes.
+
+    Returns
+    -------
+    np.ndarray
+        Object array of state strings with the same shape.
+    """
+    return STATE_NAMES[codes]
+
+def record_transitions(ignite_time, burnout_time, fire, new_fire, step, cells=None):
+    """
+    Store the step of the fire transitions of a step.
+
+    Only the cells that changed are written: ignitions keep the first step a
+    cell caught fire, burn-outs the last step it stopped burning.
+
+    Parameters
+    ----------
+    ignite_time, burnout_time : np.ndarray
+        First ignition and burn-out steps, updated in place.
+    fire, new_fire : np.ndarray
+        Masks of the burning cells before and after the step, same shape.
+    step : int
+        Step count after the step.
+    cells : np.ndarray, optional
+        Flat index into the time arrays of every element of the masks, when
+        the masks hold gathered cells; None if they have the shape of the
+        time arrays.
+
+    Returns
+    -------
+    tuple
+        (change in burning cells, number of ignitions).
+    """
+    changed = np.flatnonzero(fire != new_fire)
+    started = new_fire.ravel()[changed]
+    if cells is not None:
+        changed = cells.ravel()[changed]
+    ignited, burned_out = changed[started], changed[~started]
+    ignited = ignited[ignite_time.flat[ignited] == NEVER]
+    ignite_time.flat[ignited] = step
+    burnout_time.flat[burned_out] = step
+    ignitions = len(changed) - len(burned_out)
+    return ignitions - len(burned_out), ignitions
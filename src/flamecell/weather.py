@@ -0,0 +1,387 @@
+"""
+Forest Fire Simulation Framework
+
+This module fetches weather from the Open-Meteo API with one pooled HTTP
+session, requesting all variables the simulation needs in a single call and
+caching the results for a while per (rounded) location, and turns hourly
+forecasts or CSV records into per-step weather schedules for a run.
+"""
+
+import csv
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import requests
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Open-Meteo variables of the current weather, in the order of `Weather`
+CURRENT_VARIABLES = ("temperature_2m", "relative_humidity_2m", "wind_speed_10m", "wind_direction_10m")
+
+# CSV columns read by `WeatherSchedule.from_csv`, in the order of `Weather`
+CSV_COLUMNS = ("temperature", "humidity", "wind_speed", "wind_direction")
+
+def wind_vector(speed, direction):
+    """
+    Wind vector (dx, dy) from speed and direction in degrees.
+
+    Parameters
+    ----------
+    speed, direction : float or np.ndarray
+        Wind speed and direction.
+
+    Returns
+    -------
+    np.ndarray
+        Array with the x and y components in the last axis.
+    """
+    radians = np.radians(direction)
+    return np.stack([speed * np.cos(radians), speed * np.sin(radians)], axis=-1)
+
+class WeatherError(Exception):
+    """Raised when weather data cannot be fetched or understood."""
+
+
+@dataclass
+class Weather:
+    """
+    Weather at one location and time.
+
+    Attributes
+    ----------
+    temperature : float
+        Air temperature at 2 m in °C.
+    humidity : float
+        Relative humidity at 2 m in %.
+    wind_speed : float
+        Wind speed at 10 m in km/h.
+    wind_direction : float
+        Wind direction at 10 m in degrees.
+    time : str
+        Time of the observation (ISO 8601, as returned by the API).
+    latitude, longitude : float
+        Location the data was requested for.
+    """
+    temperature: float
+    humidity: float
+    wind_speed: float
+    wind_direction: float
+    time: str
+    latitude: float
+    longitude: float
+
+    @property
+    def wind(self):
+        """Wind vector (dx, dy) as passed to the rules."""
+        return wind_vector(self.wind_speed, self.wind_direction)
+
+@dataclass
+class Forecast:
+    """
+    Hourly weather at one location.
+
+    Attributes
+    ----------
+    time : np.ndarray
+        Times of the records (datetime64).
+    temperature, humidity, wind_speed, wind_direction : np.ndarray
+        Hourly values in the units of `Weather`.
+    latitude, longitude : float
+        Location the data was requested for.
+    """
+    time: np.ndarray
+    temperature: np.ndarray
+    humidity: np.ndarray
+    wind_speed: np.ndarray
+    wind_direction: np.ndarray
+    latitude: float
+    longitude: float
+
+class WeatherClient:
+    """
+    Cached client of the Open-Meteo forecast API.
+
+    Parameters
+    ----------
+    base_url : str, optional
+        Forecast endpoint (default is `OPEN_METEO_URL`); point it to a local
+        server in tests.
+    ttl : float, optional
+        Seconds a result stays cached (default is 600).
+    precision : int, optional
+        Decimals latitude and longitude are rounded to; nearby requests share
+        a cache entry (default is 2, about 1 km).
+    timeout : float, optional
+        Timeout of a request in seconds (default is 10).
+    session : requests.Session, optional
+        Session to send requests with; a new one if omitted.
+    clock : callable, optional
+        Time source in seconds for the cache (default is `time.monotonic`).
+    """
+
+    def __init__(self, base_url=OPEN_METEO_URL, ttl=600, precision=2, timeout=10, session=None,
+                 clock=time.monotonic):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.precision = precision
+        self.timeout = timeout
+        self.session = requests.Session() if session is None else session
+        self.clock = clock
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _location(self, lat, lon):
+        return round(float(lat), self.precision), round(float(lon), self.precision)
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > self.clock():
+                return entry[1]
+            return None
+
+    def _store(self, key, value):
+        with self._lock:
+            self._cache[key] = (self.clock() + self.ttl, value)
+
+    def fetch(self, params):
+        """
+        Send one request to the API.
+
+        Parameters
+        ----------
+        params : dict
+            Query parameters.
+
+        Returns
+        -------
+        dict
+            Decoded JSON response.
+
+        Raises
+        ------
+        WeatherError
+            If the request fails or the response is not JSON.
+        """
+        try:
+            response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise WeatherError(f"Weather request failed: {e}") from e
+        try:
+            return response.json()
+        except ValueError as e:
+            raise WeatherError(f"Weather response is not valid JSON: {e}") from e
+
+    def current(self, lat, lon):
+        """
+        Current temperature, humidity and wind at a location.
+
+        Parameters
+        ----------
+        lat, lon : float
+            Latitude. Longitude.
+
+        Returns
+        -------
+        Weather
+            Current weather, possibly from the cache.
+
+        Raises
+        ------
+        WeatherError
+            If the data cannot be fetched or is incomplete.
+        """
+        lat, lon = self._location(lat, lon)
+        key = ("current", lat, lon)
+        weather = self._cached(key)
+        if weather is not None:
+            return weather
+        data = self.fetch({"latitude": lat, "longitude": lon, "current": ",".join(CURRENT_VARIABLES)})
+        try:
+            current = data["current"]
+            weather = Weather(*(float(current[name]) for name in CURRENT_VARIABLES),
+                              time=current["time"], latitude=lat, longitude=lon)
+        except (KeyError, TypeError, ValueError) as e:
+            raise WeatherError(f"Weather response is missing {e}") from e
+        self._store(key, weather)
+        return weather
+
+    def forecast(self, lat, lon, hours=48):
+        """
+        Hourly forecast of temperature, humidity and wind from now on.
+
+        Parameters
+        ----------
+        lat, lon : float
+            Latitude. Longitude.
+        hours : int, optional
+            Number of hours (default is 48).
+
+        Returns
+        -------
+        Forecast
+            Hourly records, possibly from the cache.
+
+        Raises
+        ------
+        WeatherError
+            If the data cannot be fetched or is incomplete.
+        """
+        lat, lon = self._location(lat, lon)
+        key = ("forecast", lat, lon, hours)
+        forecast = self._cached(key)
+        if forecast is not None:
+            return forecast
+        data = self.fetch({"latitude": lat, "longitude": lon, "hourly": ",".join(CURRENT_VARIABLES),
+                           "forecast_hours": hours})
+        try:
+            hourly = data["hourly"]
+            forecast = Forecast(np.array(hourly["time"], dtype="datetime64[m]"),
+                                *(np.array(hourly[name], dtype=float) for name in CURRENT_VARIABLES),
+                                latitude=lat, longitude=lon)
+        except (KeyError, TypeError, ValueError) as e:
+            raise WeatherError(f"Weather response is missing {e}") from e
+        self._store(key, forecast)
+        return forecast
+
+    def clear_cache(self):
+        """Forget all cached results."""
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        """Close the HTTP session."""
+        self.session.close()
+
+
+class WeatherSchedule:
+    """
+    Weather for every step of a run, interpolated from timed records.
+
+    All per-step values are computed when the schedule is built: `at` only
+    looks up a prepared dict, so stepping does no I/O or interpolation.
+    Temperature and humidity are interpolated linearly; wind is interpolated
+    as a vector, so directions do not wrap around through 180 degrees. Steps
+    past the last record keep its weather.
+
+    Parameters
+    ----------
+    hours : array_like
+        Times of the records in hours, increasing.
+    temperature, humidity, wind_speed, wind_direction : array_like
+        Values of the records in the units of `Weather`.
+    steps : int
+        Number of steps to prepare.
+    step_minutes : float, optional
+        Simulated minutes per step (default is 60).
+    start : float, optional
+        Time of step 0 on the `hours` axis (default is the first record).
+    """
+
+    def __init__(self, hours, temperature, humidity, wind_speed, wind_direction, steps, step_minutes=60,
+                 start=None):
+        hours = np.asarray(hours, dtype=float)
+        if len(hours) == 0:
+            raise ValueError("A weather schedule needs at least one record")
+        start = hours[0] if start is None else start
+        times = start + np.arange(steps) * step_minutes / 60
+        self.step_minutes = step_minutes
+        self.temperature = np.interp(times, hours, np.asarray(temperature, dtype=float))
+        self.humidity = np.interp(times, hours, np.asarray(humidity, dtype=float))
+        records = wind_vector(np.asarray(wind_speed, dtype=float), np.asarray(wind_direction, dtype=float))
+        self.wind = np.stack([np.interp(times, hours, records[:, i]) for i in (0, 1)], axis=-1)
+        self._kwargs = [{"temp": float(t), "humidity": float(h), "wind": w}
+                        for t, h, w in zip(self.temperature, self.humidity, self.wind)]
+
+    def __len__(self):
+        return len(self._kwargs)
+
+    def at(self, step):
+        """
+        Weather arguments of a step, as passed to `Simulation.step`.
+
+        Parameters
+        ----------
+        step : int
+            Step number.
+
+        Returns
+        -------
+        dict
+            ``temp``, ``humidity`` and ``wind`` of the step.
+        """
+        return self._kwargs[min(step, len(self._kwargs) - 1)]
+
+    @classmethod
+    def from_forecast(cls, forecast, steps, step_minutes=60, start=None):
+        """
+        Schedule from an hourly `Forecast`.
+
+        Parameters
+        ----------
+        forecast : Forecast
+            Hourly records, e.g. from `WeatherClient.forecast`.
+        steps : int
+            Number of steps to prepare.
+        step_minutes : float, optional
+            Simulated minutes per step (default is 60).
+        start : np.datetime64, optional
+            Time of step 0 (default is the first record).
+
+        Returns
+        -------
+        WeatherSchedule
+            Per-step weather.
+        """
+        hours = (forecast.time - forecast.time[0]) / np.timedelta64(1, "h")
+        if start is not None:
+            start = (np.datetime64(start, "m") - forecast.time[0]) / np.timedelta64(1, "h")
+        return cls(hours, forecast.temperature, forecast.humidity, forecast.wind_speed,
+                   forecast.wind_direction, steps, step_minutes=step_minutes, start=start)
+
+    @classmethod
+    def from_csv(cls, path, steps, step_minutes=60):
+        """
+        Schedule from a CSV file of weather records.
+
+        The file has a header with the columns ``temperature``, ``humidity``,
+        ``wind_speed`` and ``wind_direction`` and either ``hour`` (hours since
+        the start) or ``time`` (ISO 8601 timestamps); step 0 is the first row.
+
+        Parameters
+        ----------
+        path : str
+            CSV file.
+        steps : int
+            Number of steps to prepare.
+        step_minutes : float, optional
+            Simulated minutes per step (default is 60).
+
+        Returns
+        -------
+        WeatherSchedule
+            Per-step weather.
+
+        Raises
+        ------
+        ValueError
+            If a column is missing or a value cannot be read.
+        """
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        if not rows:
+            raise ValueError(f"No weather records in {path}")
+        columns = set(rows[0])
+        missing = [name for name in CSV_COLUMNS if name not in columns]
+        if missing or not columns & {"hour", "time"}:
+            raise ValueError(f"Weather CSV {path} needs the columns {CSV_COLUMNS} and 'hour' or 'time'")
+        if "hour" in columns:
+            hours = np.array([row["hour"] for row in rows], dtype=float)
+        else:
+            times = np.array([row["time"] for row in rows], dtype="datetime64[m]")
+            hours = (times - times[0]) / np.timedelta64(1, "h")
+        values = [np.array([row[name] for row in rows], dtype=float) for name in CSV_COLUMNS]
+        return cls(hours, *values, steps, step_minutes=step_minutes)
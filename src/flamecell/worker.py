@@ -0,0 +1,183 @@
+"""
+Forest Fire Simulation Framework
+
+This module runs a simulation in a background thread that publishes frames
+into a bounded queue, so a user interface can poll and draw at its own pace
+while the simulation keeps stepping.
+"""
+
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+import numpy as np
+
+from flamecell.render import LiveView
+
+
+@dataclass
+class Frame:
+    """
+    Snapshot published by a `SimulationWorker`.
+
+    Attributes
+    ----------
+    step : int
+        Step count of the simulation when the frame was taken.
+    image : np.ndarray
+        Downsampled uint8 RGB image of the grid.
+    fire_count : int
+        Number of burning cells.
+    burned_area : int
+        Number of cells that have ignited so far.
+    elapsed : float
+        Seconds since the worker started.
+    """
+    step: int
+    image: np.ndarray
+    fire_count: int
+    burned_area: int
+    elapsed: float
+
+class SimulationWorker:
+    """
+    Run `Simulation.run` in a daemon thread with pause, resume and cancel.
+
+    After every `every`-th step the worker renders a frame and puts it in a
+    queue of at most `max_frames` entries; when the queue is full the oldest
+    frame is dropped, so a slow reader only skips frames and never holds up
+    the simulation.
+
+    Parameters
+    ----------
+    sim : Simulation
+        Simulation to run; it must not be stepped elsewhere while running.
+    every : int, optional
+        Publish a frame every n-th step (default is 1).
+    max_frames : int, optional
+        Capacity of the frame queue (default is 4).
+    max_size : int, optional
+        Maximum frame side in pixels (default is 512).
+    """
+
+    def __init__(self, sim, every=1, max_frames=4, max_size=512):
+        self.sim = sim
+        self.frames = queue.Queue(maxsize=max_frames)
+        self.result = None
+        self.error = None
+        self._view = LiveView(every=every, max_size=max_size)
+        self._resume = threading.Event()
+        self._resume.set()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def start(self, **kwargs):
+        """
+        Start the run in the background.
+
+        Parameters
+        ----------
+        kwargs : dict
+            Arguments passed to `Simulation.run`, e.g. max_steps, prob,
+            humidity, wind and temp.
+        """
+        if self._thread is not None:
+            raise RuntimeError("Worker has already been started")
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, kwargs=kwargs, daemon=True)
+        self._thread.start()
+
+    def _run(self, **kwargs):
+        try:
+            self._publish()
+            self.result = self.sim.run(callback=self._after_step, should_stop=self._cancel.is_set, **kwargs)
+            self._publish()
+        except Exception as e:
+            self.error = e
+
+    def _after_step(self, sim):
+        if self._view.should_render(sim.step_count):
+            self._publish()
+        # block here while paused; cancel also releases the pause
+        self._resume.wait()
+
+    def _publish(self):
+        profiler = self.sim.profiler
+        with nullcontext() if profiler is None else profiler.time("render"):
+            image = self._view.render(self.sim.grid)
+        frame = Frame(self.sim.step_count, image, self.sim.fire_count, self.sim.burned_area,
+                      time.perf_counter() - self._start)
+        while True:
+            try:
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def latest(self):
+        """
+        Take all queued frames and return the newest one.
+
+        Returns
+        -------
+        Frame or None
+            The newest frame, or None if no frame is queued.
+        """
+        frame = None
+        while True:
+            try:
+                frame = self.frames.get_nowait()
+            except queue.Empty:
+                return frame
+
+    def pause(self):
+        """Pause after the current step."""
+        self._resume.clear()
+
+    def resume(self):
+        """Continue a paused run."""
+        self._resume.set()
+
+    def cancel(self):
+        """Stop the run after the current step."""
+        self._cancel.set()
+        self._resume.set()
+
+    @property
+    def paused(self):
+        """True while the run is paused."""
+        return not self._resume.is_set()
+
+    @property
+    def running(self):
+        """True while the background thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def done(self):
+        """True once the run has finished, been cancelled or failed."""
+        return self._thread is not None and not self._thread.is_alive()
+
+    def join(self, timeout=None):
+        """
+        Wait for the background thread to finish.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait in seconds.
+
+        Returns
+        -------
+        RunResult or None
+            Result of the run, or None if it has not finished.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.result
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import sys
+sys.path.append("../src")
+from flamecell.sim_utils import RuleSet, Simulation, raster_to_grid
+from flamecell.rules import ignite, burning
+from flamecell.states import CellState
+
+
+def _ruleset():
+    ruleset = RuleSet()
+    ruleset.add_rule(burning)
+    ruleset.add_rule(ignite)
+    return ruleset
+
+def _grid(size, fuel="mixed", compact=True, fire=None, fire_health=None):
+    # "mixed" is a random patchwork of tree, grass, empty and water cells,
+    # "forest" is trees with health 4 everywhere; `fire` indexes the burning
+    # cells, the centre by default
+    if fuel == "mixed":
+        grid = raster_to_grid(np.random.RandomState(0).choice([31, 32, 0, 5], size=(size, size)), compact=compact)
+    else:
+        grid = raster_to_grid(np.full((size, size), 31), compact=compact)
+        grid.health[:] = 4
+    fire = (size // 2, size // 2) if fire is None else fire
+    grid.state[fire] = CellState.FIRE if compact else "FIRE"
+    if fire_health is not None:
+        grid.health[fire] = fire_health
+    return grid
+
+@pytest.fixture
+def ruleset():
+    """Burning and ignite rules."""
+    return _ruleset()
+
+@pytest.fixture
+def make_grid():
+    """Factory of square grids with burning cells, see `_grid`."""
+    return _grid
+
+@pytest.fixture
+def make_sim():
+    """Factory of simulations of a `make_grid` grid with the burning and ignite rules."""
+    def make(size, engine="vector", fuel="mixed", compact=True, fire=None, fire_health=None, **kwargs):
+        grid = _grid(size, fuel, compact, fire, fire_health)
+        return Simulation(grid, _ruleset(), engine=engine, **kwargs)
+    return make
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import sys
+sys.path.append("../src")
+from flamecell.sim_utils import Simulation, RuleSet, raster_to_grid, plot_risk_map
+from flamecell.arrival import arrival_time, expected_burn_steps, edge_cost, BLOCKED
+from flamecell.benchmark import synthetic_landcover
+from flamecell.states import CellState
+
+
+def _grid(size=48, seed=3):
+    grid = raster_to_grid(synthetic_landcover(size, patch=4, seed=seed), compact=True)
+    grid.state[size // 2, size // 2] = CellState.FIRE
+    return grid
+
+def test_expected_burn_steps_and_edge_cost():
+    steps = expected_burn_steps([0, 1, 2, 4])
+    assert np.allclose(steps, [1, 1, 1.5, 2.875])
+    # certain ignition takes one step, a stronger chance spreads sooner
+    assert np.isclose(edge_cost(np.array(1.0), np.array(5.0)), 1)
+    assert edge_cost(np.array(0.5), np.array(5.0)) < edge_cost(np.array(0.2), np.array(5.0))
+    assert edge_cost(np.array(0.0), np.array(5.0)) == BLOCKED
+    assert edge_cost(np.array(0.001), np.array(1.0)) == BLOCKED
+
+def test_sweep_matches_dijkstra():
+    grid = _grid()
+    kwargs = dict(humidity=30, wind=np.array([8, -3]))
+    sweep = arrival_time(grid, **kwargs)
+    exact = arrival_time(grid, method="dijkstra", **kwargs)
+    assert np.array_equal(np.isnan(sweep), np.isnan(exact))
+    assert np.allclose(sweep[~np.isnan(sweep)], exact[~np.isnan(exact)], atol=1e-3)
+    assert sweep.dtype == np.float32
+
+def test_arrival_is_zero_at_fire_and_nan_where_fire_cannot_go():
+    grid = _grid()
+    times = arrival_time(grid, humidity=30)
+    codes = grid.state_codes()
+    assert times[codes == CellState.FIRE].max() == 0
+    burnable = (codes == CellState.TREE) | (codes == CellState.GRASS)
+    assert np.isnan(times[~burnable & (codes != CellState.FIRE)]).all()
+    assert (times[~np.isnan(times) & (codes != CellState.FIRE)] >= 1).all()
+
+def test_wind_speeds_up_spread_as_in_ignite():
+    grid = raster_to_grid(np.full((21, 21), 31), compact=True)
+    grid.state[10, 10] = CellState.FIRE
+    calm = arrival_time(grid)
+    windy = arrival_time(grid, wind=np.array([20, 0]))
+    assert calm[10, 20] == pytest.approx(calm[10, 0])
+    # like `ignite`, wind favors burning neighbors at +dx, so the fire runs towards -x
+    assert windy[10, 0] < calm[10, 0] < windy[10, 20]
+
+def test_arrival_map_plots_as_risk():
+    grid = _grid(24)
+    sim = Simulation(grid, RuleSet())
+    fig = plot_risk_map(sim, risk=arrival_time(grid))
+    assert fig is not None
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        arrival_time(_grid(8), method="astar")
@@ -0,0 +1,36 @@
+import json
+import numpy as np
+import sys
+sys.path.append("../src")
+from flamecell.benchmark import compare, fire_grid, main, measure, synthetic_landcover
+from flamecell.states import CellState
+
+
+def test_synthetic_inputs_are_reproducible():
+    data = synthetic_landcover(40, patch=8)
+    assert data.shape == (40, 40) and data.dtype == np.uint8
+    np.testing.assert_array_equal(data, synthetic_landcover(40, patch=8))
+    grid = fire_grid(64, 0.1)
+    burnable = np.isin(grid.state, [CellState.TREE, CellState.GRASS, CellState.FIRE]).sum()
+    assert (grid.state == CellState.FIRE).sum() == int(burnable * 0.1)
+
+def test_measure_uses_fresh_setup_and_traces_memory():
+    calls = []
+    result = measure(lambda value: calls.append(np.ones(100000)), setup=lambda: len(calls), repeat=3)
+    assert len(calls) == 4
+    assert 0 <= result["best"] <= result["median"]
+    assert result["peak_bytes"] >= 800000
+
+def test_benchmark_writes_comparable_results(tmp_path, capsys):
+    out = tmp_path / "results.json"
+    args = ["--sizes", "32", "--densities", "0.05", "--steps", "2", "--repeat", "1", "--raster-size", "256"]
+    main(args + ["-o", str(out)])
+    report = json.loads(out.read_text())
+    cases = {(r["case"], r.get("engine"), r.get("reader")) for r in report["results"]}
+    assert {("step", "vector", None), ("step", "sparse", None), ("raster_to_grid", None, None),
+            ("grid_to_img", None, None), ("plot_grid", None, None), ("crop", None, "rasterio"),
+            ("crop", None, "RasterSource warm")} <= cases
+    assert report["environment"]["numpy"] == np.__version__
+    rows = compare(report, report)
+    assert len(rows) == len(report["results"])
+    assert all(speedup == 1 for *_, speedup in rows)
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import sys
+sys.path.append("../src")
+from flamecell.parallel import CounterRNG
+from flamecell.checkpoint import save_checkpoint, load_checkpoint
+
+KWARGS = {"prob": 0.5, "humidity": 10, "wind": np.array([3, 1])}
+
+@pytest.fixture
+def sim_factory(make_sim):
+    # 24x24 mixed grid in 8x8 tiles
+    def make(engine="vector", compact=True, **kwargs):
+        return make_sim(24, engine, compact=compact, tile_size=8, **kwargs)
+    return make
+
+def _steps(sim, n):
+    for _ in range(n):
+        sim.step(**KWARGS)
+
+@pytest.mark.parametrize("engine, kwargs", [
+    ("vector", {"seed": 3}),
+    ("sparse", {"rng": CounterRNG(4)}),
+])
+def test_resumed_run_continues_identically(tmp_path, engine, kwargs, sim_factory, ruleset):
+    sim = sim_factory(engine, **kwargs)
+    _steps(sim, 4)
+    save_checkpoint(sim, str(tmp_path / "ckpt"))
+    _steps(sim, 6)
+
+    resumed = load_checkpoint(str(tmp_path / "ckpt"), ruleset)
+    assert resumed.engine == engine and resumed.step_count == 4
+    assert isinstance(resumed.grid.state, np.memmap)
+    _steps(resumed, 6)
+    np.testing.assert_array_equal(resumed.grid.state, sim.grid.state)
+    np.testing.assert_array_equal(resumed.grid.health, sim.grid.health)
+    np.testing.assert_array_equal(resumed.ignite_time, sim.ignite_time)
+    np.testing.assert_array_equal(resumed.burnout_time, sim.burnout_time)
+    np.testing.assert_array_equal(resumed.burned_series, sim.burned_series)
+    assert (resumed.fire_count, resumed.burned_area) == (sim.fire_count, sim.burned_area)
+
+def test_global_random_state_is_restored(tmp_path, sim_factory, ruleset):
+    np.random.seed(5)
+    sim = sim_factory("cell", compact=False)
+    _steps(sim, 3)
+    save_checkpoint(sim, str(tmp_path / "ckpt"))
+    _steps(sim, 3)
+    np.random.seed(99)
+    resumed = load_checkpoint(str(tmp_path / "ckpt"), ruleset)
+    assert not resumed.grid.compact
+    _steps(resumed, 3)
+    np.testing.assert_array_equal(resumed.grid.state, sim.grid.state)
+
+def test_forks_do_not_modify_checkpoint(tmp_path, sim_factory, ruleset):
+    sim = sim_factory(seed=1)
+    _steps(sim, 3)
+    path = str(tmp_path / "ckpt")
+    save_checkpoint(sim, path)
+    saved = sim.grid.state.copy()
+    forks = [load_checkpoint(path, ruleset) for _ in range(2)]
+    forks[0].rng = np.random.RandomState(10)
+    forks[1].rng = np.random.RandomState(11)
+    for fork in forks:
+        _steps(fork, 5)
+    assert not np.array_equal(forks[0].grid.state, forks[1].grid.state)
+    np.testing.assert_array_equal(load_checkpoint(path, ruleset, mmap_mode="r").grid.state, saved)
+
+def test_save_over_loaded_checkpoint(tmp_path, sim_factory, ruleset):
+    path = str(tmp_path / "ckpt")
+    sim = sim_factory(seed=2)
+    save_checkpoint(sim, path)
+    resumed = load_checkpoint(path, ruleset)
+    _steps(resumed, 2)
+    save_checkpoint(resumed, path)
+    again = load_checkpoint(path, ruleset)
+    assert again.step_count == 2
+    np.testing.assert_array_equal(again.grid.state, resumed.grid.state)
+
+def test_engine_switch_rebuilds_active_front(tmp_path, sim_factory, ruleset):
+    sim = sim_factory("vector", rng=CounterRNG(6))
+    _steps(sim, 3)
+    save_checkpoint(sim, str(tmp_path / "ckpt"))
+    _steps(sim, 3)
+    resumed = load_checkpoint(str(tmp_path / "ckpt"), ruleset, engine="sparse")
+    _steps(resumed, 3)
+    np.testing.assert_array_equal(resumed.grid.state, sim.grid.state)
+
+def test_unsupported_rng(tmp_path, sim_factory):
+    sim = sim_factory(rng=object())
+    with pytest.raises(TypeError, match="Cannot save the state"):
+        save_checkpoint(sim, str(tmp_path / "ckpt"))
@@ -0,0 +1,89 @@
+import json
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.warp import transform
+import sys
+sys.path.append("../src")
+from flamecell.cli import ScenarioRunner, load_scenarios, main
+from flamecell.states import CellState
+
+
+def _write_raster(path, size=200):
+    # forest with a lake in the top left corner, 10 m pixels
+    data = np.full((size, size), 31, dtype=np.uint8)
+    data[:size // 4, :size // 4] = 5
+    with rasterio.open(path, "w", driver="GTiff", width=size, height=size, count=1, dtype="uint8",
+                       crs="EPSG:3035", transform=from_origin(4000000.0, 3000000.0, 10, 10)) as dst:
+        dst.write(data, 1)
+    return str(path)
+
+def test_run_writes_results(tmp_path):
+    raster = _write_raster(tmp_path / "map.tif")
+    out = tmp_path / "out"
+    code = main(["run", "--raster", raster, "--resolution", "40", "--ignite", "30", "30", "--ignite", "1", "1",
+                 "--steps", "5", "--seed", "3", "--humidity", "10", "--name", "one", "-o", str(out)])
+    assert code == 0
+    stats = json.loads((out / "one" / "stats.json").read_text())
+    assert (stats["reason"], stats["step_count"], stats["cells"]) == ("max_steps", 5, 1600)
+    state = np.load(out / "one" / "state.npy")
+    assert state.shape == (40, 40) and (state[:10, :10] == CellState.WATER).all()
+    assert stats["burned_area"] == np.isin(state, [CellState.FIRE, CellState.ASH]).sum() > 1
+    assert np.load(out / "one" / "ignite_time.npy").shape == (40, 40)
+    assert stats["weather"]["source"] == "fixed"
+    assert stats["weather"]["humidity"] == 10
+    assert json.loads((out / "summary.json").read_text())[0]["name"] == "one"
+
+def test_run_records_the_scheduled_weather(tmp_path):
+    raster = _write_raster(tmp_path / "map.tif")
+    csv = tmp_path / "weather.csv"
+    csv.write_text("hour,temperature,humidity,wind_speed,wind_direction\n0,20,10,0,0\n4,28,30,0,0\n")
+    out = tmp_path / "out"
+    code = main(["run", "--raster", raster, "--resolution", "40", "--ignite", "30", "30", "--steps", "5",
+                 "--seed", "3", "--weather-csv", str(csv), "--name", "csv", "-o", str(out)])
+    assert code == 0
+    weather = json.loads((out / "csv" / "stats.json").read_text())["weather"]
+    assert (weather["source"], weather["step_minutes"]) == ("csv", 60)
+    assert weather["temp"] == [20, 22, 24, 26, 28]
+    assert weather["humidity"] == [10, 15, 20, 25, 30]
+    assert len(weather["wind"]) == 5
+
+def test_scenario_file_shares_raster_and_reports_failures(tmp_path, capsys):
+    raster = _write_raster(tmp_path / "map.tif")
+    path = tmp_path / "scenarios.json"
+    path.write_text(json.dumps({"defaults": {"resolution": 32, "max_steps": 3},
+                                "scenarios": [{"ignitions": [[20, 20]], "seed": 1},
+                                              {"ignitions": [[20, 20]], "seed": 1, "name": "same"},
+                                              {"ignitions": [[1, 1]], "name": "lake"}]}))
+    code = main(["run", "--scenarios", str(path), "--raster", raster, "-o", str(tmp_path / "out")])
+    assert code == 1
+    summary = json.loads((tmp_path / "out" / "summary.json").read_text())
+    assert [stats["name"] for stats in summary] == ["scenario_000", "same", "lake"]
+    assert "burnable" in summary[2]["error"]
+    assert "lake: failed" in capsys.readouterr().out
+    np.testing.assert_array_equal(np.load(tmp_path / "out" / "scenario_000" / "state.npy"),
+                                  np.load(tmp_path / "out" / "same" / "state.npy"))
+
+def test_runner_reuses_crops_and_converts_latlon_ignitions(tmp_path):
+    raster = _write_raster(tmp_path / "map.tif")
+    with ScenarioRunner() as runner:
+        scenario = {"raster": raster, "resolution": 50, "ignitions": [[40, 40]], "bounds": None,
+                    "ignitions_latlon": []}
+        first, grid_transform, crs, _ = runner.grid(scenario)
+        src = runner.raster(raster)
+        reads = src.tile_reads
+        second = runner.grid(scenario)[0]
+        assert src.tile_reads == reads and len(runner._rasters) == 1
+        np.testing.assert_array_equal(first.state, second.state)
+        # centre of cell (30, 20) as latitude and longitude
+        x, y = grid_transform * (30.5, 20.5)
+        lons, lats = transform(crs, "EPSG:4326", [x], [y])
+        grid = runner.grid({**scenario, "ignitions": [], "ignitions_latlon": [[lats[0], lons[0]]]})[0]
+        assert list(zip(*np.nonzero(grid.state == CellState.FIRE))) == [(20, 30)]
+
+def test_load_scenarios_rejects_unknown_keys(tmp_path):
+    path = tmp_path / "bad.json"
+    path.write_text(json.dumps([{"ignition": [[1, 1]]}]))
+    with pytest.raises(ValueError, match="Unknown scenario keys"):
+        load_scenarios(str(path))
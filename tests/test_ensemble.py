@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+import sys
+sys.path.append("../src")
+from flamecell.sim_utils import Simulation
+from flamecell.states import CellState, NEVER
+from flamecell.ensemble import EnsembleResult, BatchSimulation, run_ensemble, run_batched_ensemble
+
+
+@pytest.fixture
+def grid(make_grid):
+    # forest with a fire in the centre
+    return make_grid(10, fuel="forest")
+
+WEATHER = {"prob": 0.3, "humidity": 30, "wind": np.array([5, 0])}
+
+def test_ensemble_result_statistics():
+    result = EnsembleResult((1, 2), max_steps=10, time_bins=10)
+    burned = np.array([[True, False]])
+    for t in (2, 4, 6, 8):
+        result.add(burned, np.array([[t, 0]]), "extinguished")
+    assert result.n_runs == 4
+    np.testing.assert_array_equal(result.burn_probability, [[1.0, 0.0]])
+    assert result.mean_ignite_time[0, 0] == 5.0
+    assert np.isnan(result.mean_ignite_time[0, 1])
+    assert result.ignite_time_quantile(0.5)[0, 0] == pytest.approx(5.0)
+    assert result.reasons == {"extinguished": 4}
+
+def test_ensemble_result_reads_burned_cells_from_ignition_times():
+    result = EnsembleResult((1, 3), max_steps=10, time_bins=10)
+    result.add(None, np.array([[[0, 3, NEVER]], [[0, NEVER, NEVER]]]))
+    np.testing.assert_array_equal(result.burn_probability, [[1.0, 0.5, 0.0]])
+    np.testing.assert_array_equal(result.mean_ignite_time[:, :2], [[0.0, 3.0]])
+    assert np.isnan(result.mean_ignite_time[0, 2])
+
+def test_ensemble_result_keeps_no_histogram_by_default():
+    result = EnsembleResult((1, 1), max_steps=10)
+    result.add(np.array([[True]]), np.array([[3]]))
+    assert result.time_hist is None
+    assert result.mean_ignite_time[0, 0] == 3.0
+    with pytest.raises(ValueError):
+        result.ignite_time_quantile(0.5)
+
+def test_ensemble_result_merge():
+    a = EnsembleResult((1, 1), max_steps=4, time_bins=4)
+    b = EnsembleResult((1, 1), max_steps=4, time_bins=4)
+    a.add(np.array([[True]]), np.array([[1]]))
+    b.add(np.array([[False]]), np.array([[0]]))
+    a.merge(b)
+    assert a.n_runs == 2
+    assert a.burn_probability[0, 0] == 0.5
+
+def test_run_ensemble_is_reproducible_across_chunking(grid, ruleset):
+    first = run_ensemble(grid, ruleset, 6, weather=WEATHER, seed=7, workers=1, max_steps=50, time_bins=16)
+    second = run_ensemble(grid, ruleset, 6, weather=WEATHER, seed=7, workers=1, max_steps=50, time_bins=16, chunk_size=4)
+    assert first.n_runs == 6
+    np.testing.assert_array_equal(first.burn_count, second.burn_count)
+    np.testing.assert_array_equal(first.time_hist, second.time_hist)
+    # the input grid is left untouched
+    assert grid.state[5, 5] == CellState.FIRE
+    assert np.count_nonzero(grid.state == CellState.ASH) == 0
+
+def test_run_ensemble_process_pool_matches_in_process(grid, ruleset):
+    serial = run_ensemble(grid, ruleset, 4, weather=WEATHER, seed=3, workers=1, max_steps=50)
+    parallel = run_ensemble(grid, ruleset, 4, weather=WEATHER, seed=3, workers=2, max_steps=50)
+    np.testing.assert_array_equal(serial.burn_count, parallel.burn_count)
+    np.testing.assert_allclose(serial.time_sum, parallel.time_sum)
+
+def test_run_ensemble_rejects_empty_ensemble(grid, ruleset):
+    with pytest.raises(ValueError):
+        run_ensemble(grid, ruleset, 0)
+
+@pytest.mark.parametrize("engine", ["cell", "tiled"])
+def test_run_ensemble_rejects_unseeded_engines(grid, ruleset, engine):
+    with pytest.raises(ValueError):
+        run_ensemble(grid, ruleset, 2, engine=engine, workers=1)
+
+class _FixedDraws:
+    # deterministic stand-in for a RandomState
+    def rand(self, *shape):
+        return np.full(shape, 0.2)
+
+    def randint(self, low, high, size=None):
+        return np.ones(size, dtype=int)
+
+def test_batch_simulation_matches_single_simulation(grid, ruleset):
+    batch = BatchSimulation(grid, ruleset, 3)
+    sim = Simulation(grid.to_compact(), ruleset, engine="vector")
+    batch.rng = sim.rng = _FixedDraws()
+    for _ in range(6):
+        batch.step(**WEATHER)
+        sim.step(**WEATHER)
+    for run in range(3):
+        np.testing.assert_array_equal(batch.state[run], sim.grid.state)
+        np.testing.assert_array_equal(batch.ignite_time[run], sim.ignite_time)
+    np.testing.assert_array_equal(batch.fire_count, np.count_nonzero(sim.grid.state == CellState.FIRE))
+
+def test_batch_simulation_pop_removes_realizations(grid, ruleset):
+    batch = BatchSimulation(grid, ruleset, 4, seed=0)
+    burned, ignite_time = batch.pop(np.array([True, False, True, False]))
+    assert burned.shape == (2, 10, 10)
+    assert ignite_time.shape == (2, 10, 10)
+    assert len(batch.state) == len(batch.fire_count) == 2
+
+def test_run_batched_ensemble(grid, ruleset):
+    first = run_batched_ensemble(grid, ruleset, 10, weather=WEATHER, seed=5, max_steps=50, batch_size=4, time_bins=16)
+    second = run_batched_ensemble(grid, ruleset, 10, weather=WEATHER, seed=5, max_steps=50, batch_size=4, time_bins=16)
+    assert first.n_runs == 10
+    assert sum(first.reasons.values()) == 10
+    assert first.burn_probability[5, 5] == 1.0
+    np.testing.assert_array_equal(first.burn_count, second.burn_count)
+    np.testing.assert_array_equal(first.time_hist, second.time_hist)
+
+def test_run_batched_ensemble_records_max_steps(grid, ruleset):
+    grid.health[5, 5] = 100
+    result = run_batched_ensemble(grid, ruleset, 8, weather={"prob": 0.0}, seed=1, max_steps=3, batch_size=3)
+    assert result.reasons == {"max_steps": 8}
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import sys
+sys.path.append("../src")
+from flamecell.history import History, TRANSITION_DTYPE
+
+
+def _run_and_snapshot(sim, steps=12):
+    snapshots = {sim.step_count: (sim.grid.state_codes().copy(), sim.grid.health.copy())}
+    for _ in range(steps):
+        sim.step(prob=0.6, humidity=10)
+        snapshots[sim.step_count] = (sim.grid.state_codes().copy(), sim.grid.health.copy())
+    return snapshots
+
+def test_history_rebuilds_every_step(make_sim):
+    sim = make_sim(20, seed=1)
+    history = sim.record_history()
+    snapshots = _run_and_snapshot(sim)
+    assert (history.start_step, history.end_step) == (0, 12)
+    for step, (state, health) in snapshots.items():
+        rebuilt_state, rebuilt_health = history.state_at(step)
+        np.testing.assert_array_equal(rebuilt_state, state)
+        np.testing.assert_array_equal(rebuilt_health, health)
+    # only changed cells are logged
+    assert 0 < len(history.transitions) < 12 * 400
+    assert history.nbytes == len(history.transitions) * TRANSITION_DTYPE.itemsize
+    with pytest.raises(ValueError, match="outside the recorded steps"):
+        history.state_at(13)
+
+def test_history_frames_are_lazy_and_match(make_sim):
+    sim = make_sim(20, compact=False, seed=1)
+    sim.step(prob=0.6, humidity=10)
+    history = sim.record_history()
+    snapshots = _run_and_snapshot(sim, steps=8)
+    frames = history.frames(start=3, every=2)
+    step, state, health = next(frames)
+    assert step == 3
+    np.testing.assert_array_equal(state, snapshots[3][0])
+    rest = list(frames)
+    assert [s for s, _, _ in rest] == [5, 7, 9]
+    for step, state, health in rest:
+        np.testing.assert_array_equal(state, snapshots[step][0])
+        np.testing.assert_array_equal(health, snapshots[step][1])
+
+def test_history_on_disk(tmp_path, make_sim):
+    sim = make_sim(20, engine="sparse", seed=1)
+    history = sim.record_history(path=str(tmp_path / "run"))
+    snapshots = _run_and_snapshot(sim)
+    history.close()
+    loaded = History.load(str(tmp_path / "run"))
+    assert isinstance(loaded.transitions, np.memmap)
+    assert loaded.end_step == 12
+    for step, (state, health) in snapshots.items():
+        np.testing.assert_array_equal(loaded.state_at(step)[0], state)
+    assert [s for s, _, _ in loaded.frames()] == list(range(13))
+
+@pytest.mark.parametrize("engine", ["vector", "sparse", "tiled"])
+def test_history_from_step_changes_matches_full_diff(make_sim, engine):
+    sim = make_sim(20, engine=engine, seed=1, workers=2)
+    history = sim.record_history()
+    full = History(sim.grid)
+    with sim:
+        for _ in range(8):
+            sim.step(prob=0.6, humidity=10)
+            full.record(sim.grid, sim.step_count)
+    np.testing.assert_array_equal(history.transitions, full.transitions)
+    assert len(history.transitions) > 0
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+import sys
+from multiprocessing.shared_memory import SharedMemory
+sys.path.append("../src")
+from flamecell.sim_utils import Grid, RuleSet, Simulation, raster_to_grid
+from flamecell.rules import ignite, burning, CoarseField, array_rule
+from flamecell.states import CellState
+from flamecell.parallel import CounterRNG, StripField, strip_kwargs
+
+
+@array_rule
+def _failing_rule(state, health, fields, **kwargs):
+    raise ValueError("bad fuel")
+
+def test_counter_rng_is_keyed_by_position():
+    rng = CounterRNG(1)
+    rng.start_step(3)
+    whole = rng.rand_at(np.arange(10))
+    rng.start_step(3)
+    part = rng.rand_at(np.array([7, 2]))
+    np.testing.assert_array_equal(part, whole[[7, 2]])
+    assert ((whole >= 0) & (whole < 1)).all()
+    # later calls and steps give different numbers
+    assert not np.array_equal(rng.rand_at(np.arange(10)), whole)
+    rng.start_step(4)
+    assert not np.array_equal(rng.rand_at(np.arange(10)), whole)
+
+def test_counter_rng_integers_in_range():
+    rng = CounterRNG(2)
+    draws = rng.randint_at(1, 3, np.arange(1000))
+    assert set(np.unique(draws)) == {1, 2}
+
+def _scenario():
+    rng = np.random.RandomState(0)
+    grid = raster_to_grid(rng.choice([31, 32, 31, 0], size=(30, 23)), compact=True)
+    grid.state[15, 11] = CellState.FIRE
+    grid.state[0, 3] = CellState.FIRE
+    ruleset = RuleSet()
+    ruleset.add_rule(burning)
+    ruleset.add_rule(ignite)
+    return grid, ruleset
+
+def test_engines_agree_with_counter_rng():
+    results = {}
+    for engine, options in [("vector", {}), ("sparse", {"tile_size": 8}), ("tiled", {"workers": 3})]:
+        grid, ruleset = _scenario()
+        with Simulation(grid, ruleset, engine=engine, rng=CounterRNG(11), **options) as sim:
+            sim.run(max_steps=25, prob=0.3, humidity=30, wind=np.array([5, -3]))
+            counts = (sim.fire_count, sim.burned_area)
+        results[engine] = (grid.state, grid.health, sim.ignite_time, sim.burnout_time, sim.burned_series, counts)
+    for engine in ("sparse", "tiled"):
+        for expected, actual in zip(results["vector"], results[engine]):
+            np.testing.assert_array_equal(expected, actual)
+
+def test_engines_agree_with_per_cell_weather():
+    humidity = CoarseField(np.array([[10, 60], [40, 20]]), block=(15, 12), shape=(30, 23))
+    wind = np.stack(np.meshgrid(np.linspace(-5, 5, 23), np.linspace(3, -3, 30)))
+    results = []
+    for engine, options, field in [("vector", {}, humidity.toarray()), ("vector", {}, humidity),
+                                   ("sparse", {"tile_size": 8}, humidity), ("tiled", {"workers": 2}, humidity)]:
+        grid, ruleset = _scenario()
+        with Simulation(grid, ruleset, engine=engine, rng=CounterRNG(5), **options) as sim:
+            sim.run(max_steps=20, prob=0.4, humidity=field, wind=wind, temp=np.full((30, 23), 30.0))
+        results.append((grid.state, grid.health, sim.ignite_time, sim.burnout_time))
+    for result in results[1:]:
+        for expected, actual in zip(results[0], result):
+            np.testing.assert_array_equal(expected, actual)
+
+def test_tiled_engine_seed_is_reproducible_and_close_releases_arrays():
+    states = []
+    for _ in range(2):
+        grid, ruleset = _scenario()
+        sim = Simulation(grid, ruleset, engine="tiled", workers=2, seed=4)
+        for _ in range(10):
+            sim.step(prob=0.3, humidity=30)
+        sim.close()
+        assert sim.domain is None
+        states.append(grid.state)
+    np.testing.assert_array_equal(states[0], states[1])
+    assert states[0].base is None
+
+def test_tiled_engine_needs_compact_grid():
+    with pytest.raises(ValueError, match="compact grid"):
+        Simulation(Grid(3, 3), RuleSet(), engine="tiled")
+
+def test_tiled_engine_reports_worker_errors_and_releases_memory():
+    grid, _ = _scenario()
+    ruleset = RuleSet()
+    ruleset.add_rule(_failing_rule)
+    sim = Simulation(grid, ruleset, engine="tiled", workers=2)
+    with pytest.raises(ValueError, match="bad fuel"):
+        sim.step()
+    with pytest.raises(ValueError, match="bad fuel"):
+        sim.step()
+    names = [block.name for block in sim.domain._blocks]
+    sim.close()
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+def test_tiled_engine_closes_after_a_worker_died():
+    grid, ruleset = _scenario()
+    sim = Simulation(grid, ruleset, engine="tiled", workers=2)
+    sim.step(prob=0.3)
+    names = [block.name for block in sim.domain._blocks]
+    sim.domain._processes[0].kill()
+    sim.domain._processes[0].join()
+    with pytest.raises(RuntimeError, match="exited"):
+        sim.step(prob=0.3)
+    sim.close()
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+def test_workers_get_only_their_rows_of_per_cell_fields():
+    wind = np.stack(np.meshgrid(np.arange(23.0), np.arange(30.0)))
+    humidity = CoarseField(np.array([[10, 60]]), block=(30, 12), shape=(30, 23))
+    kwargs = strip_kwargs({"wind": wind, "temp": np.full((30, 23), 25.0), "humidity": humidity, "prob": 0.3},
+                          10, 20, (30, 23))
+    assert kwargs["prob"] == 0.3 and kwargs["humidity"] is humidity
+    assert isinstance(kwargs["temp"], StripField) and kwargs["temp"].values.shape == (10, 23)
+    rows, cols = np.array([10, 19]), np.array([0, 22])
+    np.testing.assert_array_equal(kwargs["wind"][0].at(rows, cols), wind[0][rows, cols])
+    np.testing.assert_array_equal(kwargs["wind"][1].at(rows, cols), wind[1][rows, cols])
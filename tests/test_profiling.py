@@ -0,0 +1,62 @@
+import io
+import numpy as np
+import pytest
+import sys
+sys.path.append("../src")
+from flamecell.profiling import read_log, summarize
+from flamecell.render import LiveView
+
+
+@pytest.fixture
+def sim_factory(make_sim):
+    # forest in 8x8 tiles with a fire line down column 20
+    def make(engine, compact=True):
+        return make_sim(40, engine, fuel="forest", compact=compact, fire=(slice(None), 20), seed=0, tile_size=8)
+    return make
+
+def test_profile_times_phases_and_rules_and_counts_cells(sim_factory):
+    for engine, phases in [("vector", {"prepare", "neighbors", "copy", "rules", "write"}),
+                           ("sparse", {"prepare", "neighbors", "rules", "write"}),
+                           ("cell", {"copy", "neighbors", "rules", "write"})]:
+        sim = sim_factory(engine, compact=engine != "cell")
+        seen = []
+        profiler = sim.profile(observers=[seen.append], run=engine)
+        before = sim.grid.state_codes().copy(), sim.grid.health.copy()
+        sim.step(prob=0.5, humidity=30)
+        stats = seen[0]
+        assert set(stats.phases) == phases
+        rules = {"burning", "ignite"} if engine == "cell" else {"burning_array", "ignite_array"}
+        assert set(stats.rules) == rules
+        assert sum(stats.phases.values()) <= stats.elapsed + 1e-9
+        changed = (sim.grid.state_codes() != before[0]) | (sim.grid.health != before[1])
+        assert stats.cells_changed == np.count_nonzero(changed)
+        assert (stats.step, stats.fire_count, stats.burned_area) == (1, sim.fire_count, sim.burned_area)
+        assert stats.run == engine and profiler.steps == seen
+        # only the tiles around the fire line are evaluated
+        assert stats.cells_evaluated == (40 * 3 * 8 if engine == "sparse" else 1600)
+
+def test_profile_log_and_summary_aggregate_runs(tmp_path, sim_factory):
+    path = str(tmp_path / "profile.jsonl")
+    for run in ("a", "b"):
+        sim = sim_factory("vector")
+        sim.record_history()
+        profiler = sim.profile(log=path, run=run)
+        sim.run(max_steps=3, prob=0.5, humidity=30)
+        view = LiveView(every=1)
+        view.update(sim, force=True)
+        profiler.close()
+    records = read_log(path)
+    assert [(r["run"], r["step"]) for r in records] == [(run, step) for run in "ab" for step in (1, 2, 3)]
+    assert "history" in records[0]["phases"]
+    assert profiler.extra["render"] > 0
+    table = summarize(records)
+    assert "step (6 steps)" in table and "rule ignite_array" in table and "cells changed" in table
+    assert "render (outside steps)" in profiler.summary()
+
+def test_profiling_can_be_stopped(sim_factory):
+    sim = sim_factory("vector")
+    profiler = sim.profile(log=io.StringIO(), count_changes=False)
+    sim.step()
+    sim.profiler = None
+    sim.step()
+    assert len(profiler.steps) == 1 and profiler.steps[0].cells_changed == -1
@@ -0,0 +1,162 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+import sys
+sys.path.append("../src")
+from flamecell import raster
+from flamecell.raster import LRUCache, RasterSource, build_overviews, mode_resample, overview_path
+from flamecell.sim_utils import crop_and_resample
+from flamecell.benchmark import synthetic_landcover
+
+ORIGIN = (4000000.0, 3000000.0)
+
+def _write_raster(path, size=1000):
+    # four land-cover quadrants on a 10 m grid
+    data = np.full((size, size), 31, dtype=np.uint8)
+    data[:size // 2, size // 2:] = 32
+    data[size // 2:, :size // 2] = 5
+    data[size // 2:, size // 2:] = 22
+    with rasterio.open(path, "w", driver="GTiff", width=size, height=size, count=1, dtype="uint8",
+                       crs="EPSG:3035", transform=from_origin(*ORIGIN, 10, 10)) as dst:
+        dst.write(data, 1)
+    return data
+
+def _bounds(x0, y0, x1, y1):
+    # projected box relative to the raster origin, in metres
+    return (ORIGIN[0] + x0, ORIGIN[1] - y1, ORIGIN[0] + x1, ORIGIN[1] - y0)
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert len(cache) == 2 and cache.get("a") == 1 and cache.get("c") == 3
+
+def test_read_native_resolution(tmp_path):
+    path = tmp_path / "lc.tif"
+    data = _write_raster(path)
+    with RasterSource(str(path), tile_size=64) as source:
+        out, transform = source.read(_bounds(4000, 4000, 6000, 6000), output_size=(200, 200))
+    assert out.shape == (1, 200, 200)
+    np.testing.assert_array_equal(out[0], data[400:600, 400:600])
+    assert transform.a == 10 and transform.c == ORIGIN[0] + 4000
+
+def test_read_coarse_level_keeps_classes(tmp_path):
+    path = tmp_path / "lc.tif"
+    _write_raster(path)
+    with RasterSource(str(path), tile_size=64) as source:
+        out, _ = source.read(_bounds(0, 0, 10000, 10000), output_size=(100, 100))
+        assert source.level_for(100) == 3
+    assert out.shape == (1, 100, 100)
+    assert out[0, 10, 10] == 31 and out[0, 10, 90] == 32
+    assert out[0, 90, 10] == 5 and out[0, 90, 90] == 22
+
+def test_repeated_and_nearby_crops_reuse_tiles(tmp_path):
+    path = tmp_path / "lc.tif"
+    _write_raster(path)
+    with RasterSource(str(path), tile_size=64) as source:
+        first, _ = source.read(_bounds(1000, 1000, 3000, 3000), output_size=(100, 100))
+        reads = source.tile_reads
+        again, _ = source.read(_bounds(1000, 1000, 3000, 3000), output_size=(100, 100))
+        assert source.tile_reads == reads
+        np.testing.assert_array_equal(first, again)
+        # a small pan only needs the tiles that came into view
+        source.read(_bounds(1200, 1000, 3200, 3000), output_size=(100, 100))
+        assert source.tile_reads - reads < reads
+
+def test_disk_cache_survives_reopen(tmp_path):
+    path = tmp_path / "lc.tif"
+    _write_raster(path)
+    box = _bounds(0, 0, 5000, 5000)
+    with RasterSource(str(path), tile_size=64, cache_dir=str(tmp_path / "cache")) as source:
+        first, _ = source.read(box, output_size=(64, 64))
+        assert source.tile_reads > 0
+    with RasterSource(str(path), tile_size=64, cache_dir=str(tmp_path / "cache")) as source:
+        second, _ = source.read(box, output_size=(64, 64))
+        assert source.tile_reads == 0
+    np.testing.assert_array_equal(first, second)
+
+def test_outside_raster_is_zero(tmp_path):
+    path = tmp_path / "lc.tif"
+    _write_raster(path)
+    with RasterSource(str(path), tile_size=64) as source:
+        out, _ = source.read(_bounds(-2000, -2000, 2000, 2000), output_size=(40, 40))
+    assert (out[0, :20, :20] == 0).all()
+    assert (out[0, 20:, 20:] == 31).all()
+
+def test_crop_and_resample_uses_raster_source(tmp_path):
+    path = tmp_path / "lc.tif"
+    data = _write_raster(path)
+    west, south, east, north = transform_bounds("EPSG:3035", "EPSG:4326", *_bounds(2000, 2000, 3000, 3000))
+    bounds = {"_southWest": {"lat": south, "lng": west}, "_northEast": {"lat": north, "lng": east}}
+    with RasterSource(str(path)) as source:
+        out, _ = crop_and_resample(source, bounds, output_size=(32, 32))
+    assert out.shape == (1, 32, 32)
+    assert (out == 31).all()
+
+def test_mode_resample_keeps_the_majority_class():
+    data = np.full((1, 6, 6), 31, dtype=np.uint8)
+    data[0, 1::3, 1::3] = 32
+    data[0, :3, 3:] = 5
+    out = mode_resample(data, 2, 2)
+    np.testing.assert_array_equal(out, [[[31, 5], [31, 31]]])
+    # ties go to the value met first
+    np.testing.assert_array_equal(mode_resample(np.array([[[2, 1], [1, 2]]]), 1, 1), [[[2]]])
+
+def test_mode_resample_blocks_match_one_pass(monkeypatch):
+    rng = np.random.RandomState(0)
+    data = rng.choice([5, 22, 31, 32], size=(2, 90, 70)).astype(np.uint8)
+    whole = mode_resample(data, 30, 20)
+    # one output row per block, with the classes sorted instead of counted
+    monkeypatch.setattr(raster, "MODE_BLOCK", 1)
+    np.testing.assert_array_equal(mode_resample(data, 30, 20), whole)
+
+def test_downsampled_crop_matches_mode_resampling(tmp_path):
+    path = tmp_path / "lc.tif"
+    data = synthetic_landcover(600, patch=12, seed=2).astype(np.uint8)
+    with rasterio.open(path, "w", driver="GTiff", width=600, height=600, count=1, dtype="uint8",
+                       crs="EPSG:3035", transform=from_origin(*ORIGIN, 10, 10)) as dst:
+        dst.write(data, 1)
+    west, south, east, north = transform_bounds("EPSG:3035", "EPSG:4326", *_bounds(1000, 1000, 5000, 5000))
+    bounds = {"_southWest": {"lat": south, "lng": west}, "_northEast": {"lat": north, "lng": east}}
+    for size in (100, 130, 270):
+        with rasterio.open(path) as src:
+            expected, _ = crop_and_resample(src, bounds, output_size=(size, size))
+        with RasterSource(str(path), tile_size=64) as source:
+            out, _ = crop_and_resample(source, bounds, output_size=(size, size))
+        assert out.shape == expected.shape
+        # the crops differ only where tiles snap the window by a fraction of a pixel
+        assert (out == expected).mean() > 0.9
+
+def test_build_overviews_levels(tmp_path):
+    path = tmp_path / "lc.tif"
+    _write_raster(path)
+    out = build_overviews(str(path), levels=3, block_size=300)
+    assert out == overview_path(str(path))
+    with rasterio.open(out) as dst:
+        assert (dst.width, dst.height) == (500, 500)
+        assert dst.res == (20.0, 20.0)
+        assert dst.overviews(1) == [2, 4]
+        data = dst.read(1)
+    assert data[100, 100] == 31 and data[100, 400] == 32
+    assert data[400, 100] == 5 and data[400, 400] == 22
+
+def test_coarse_crop_reads_from_overviews(tmp_path):
+    path = tmp_path / "lc.tif"
+    _write_raster(path)
+    box = _bounds(0, 0, 10000, 10000)
+    with RasterSource(str(path), tile_size=64) as source:
+        assert source.overviews is None
+        direct, _ = source.read(box, output_size=(125, 125))
+        direct_bytes = source.bytes_read
+    build_overviews(str(path), levels=4)
+    with RasterSource(str(path), tile_size=64) as source:
+        assert source.overviews == overview_path(str(path))
+        pyramid, _ = source.read(box, output_size=(125, 125))
+        assert source.bytes_read * 20 < direct_bytes
+    np.testing.assert_array_equal(pyramid, direct)
+    with RasterSource(str(path), tile_size=64, overviews=False) as source:
+        assert source.overviews is None
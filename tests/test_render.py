@@ -0,0 +1,112 @@
+import numpy as np
+import sys
+sys.path.append("../src")
+from flamecell.sim_utils import Grid, raster_to_grid
+from flamecell.states import CellState
+from flamecell.render import PALETTE, PALETTE_FLOAT, LiveView, color_map, colormap_lut, overlay_bins, render_grid
+
+
+def test_palette_matches_color_map():
+    for state in CellState:
+        r, g, b = color_map[state.name]
+        assert list(PALETTE[state]) == [int(r * 255), int(g * 255), int(b * 255)]
+        assert np.allclose(PALETTE_FLOAT[state], (r, g, b))
+
+def test_render_grid_matches_per_cell_colors():
+    rng = np.random.RandomState(0)
+    grid = raster_to_grid(rng.choice([31, 32, 0, 5], size=(6, 7)))
+    grid.state[2, 3] = "FIRE"
+    img = render_grid(grid)
+    assert img.shape == (6, 7, 3) and img.dtype == np.uint8
+    for y in range(6):
+        for x in range(7):
+            r, g, b = color_map[grid.state[y, x]]
+            assert list(img[y, x]) == [int(r * 255), int(g * 255), int(b * 255)]
+    # compact grids and raw code arrays render the same
+    np.testing.assert_array_equal(render_grid(grid.to_compact()), img)
+    np.testing.assert_array_equal(render_grid(grid.to_compact().state), img)
+
+def test_render_grid_float():
+    grid = Grid(2, 1, compact=True)
+    grid.state[0, 1] = CellState.WATER
+    img = render_grid(grid, dtype=np.float32)
+    assert img.dtype == np.float32
+    assert np.allclose(img[0], [color_map["EMPTY"], color_map["WATER"]])
+
+def test_overlay_bins_scale_and_nan():
+    bins = overlay_bins(np.array([[1.0, 3.0, 2.0, np.nan]]))
+    assert list(bins[0]) == [0, 255, 127, 256]
+    # a constant field maps to the bottom of the colormap
+    assert (overlay_bins(np.ones((2, 2))) == 0).all()
+    assert (overlay_bins(np.full((2, 2), np.nan)) == 256).all()
+
+def test_render_grid_overlay_uint8():
+    grid = Grid(2, 1, compact=True)
+    img = render_grid(grid, overlay=np.array([[0.0, 1.0]]), cmap="gray", alpha=1.0)
+    assert img.dtype == np.uint8
+    assert list(img[0, 0]) == [0, 0, 0] and list(img[0, 1]) == [255, 255, 255]
+
+def test_render_grid_overlay_blends_and_skips_nan():
+    grid = Grid(3, 1, compact=True)
+    img = render_grid(grid, overlay=np.array([[0.0, 1.0, np.nan]]), alpha=0.4, dtype=float)
+    empty = PALETTE_FLOAT[CellState.EMPTY]
+    hot = colormap_lut("hot")
+    assert np.allclose(img[0, 0], 0.6 * empty + 0.4 * hot[0])
+    assert np.allclose(img[0, 1], 0.6 * empty + 0.4 * hot[-1])
+    assert np.allclose(img[0, 2], empty)
+
+class _Target:
+    def __init__(self):
+        self.images = []
+        self.figures = []
+
+    def image(self, frame):
+        self.images.append(frame)
+
+    def pyplot(self, figure):
+        self.figures.append(figure)
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _sim_like(size, step):
+    grid = Grid(size, size, compact=True)
+    grid.state[:, : size // 2] = CellState.TREE
+    return type("Sim", (), {"grid": grid, "step_count": step})()
+
+def test_live_view_downsamples_frames():
+    target = _Target()
+    view = LiveView(target, max_size=64)
+    assert view.update(_sim_like(256, 1))
+    frame = target.images[0]
+    assert frame.shape == (64, 64, 3) and frame.dtype == np.uint8
+    assert list(frame[0, 0]) == list(PALETTE[CellState.TREE])
+
+def test_live_view_throttles_by_step_and_rate():
+    target = _Target()
+    clock = _Clock()
+    view = LiveView(target, every=2, fps=10, clock=clock)
+    shown = []
+    for step in range(1, 11):
+        clock.now = step * 0.03
+        shown.append(view.update(_sim_like(4, step)))
+    # even steps only, and at least 0.1 s apart
+    assert shown == [False, True, False, False, False, True, False, False, False, True]
+    assert view.update(_sim_like(4, 11), force=True)
+    assert view.frames_shown == len(target.images) == 4
+
+def test_live_view_reuses_one_figure():
+    import matplotlib.pyplot as plt
+    target = _Target()
+    view = LiveView(target, use_figure=True)
+    open_figures = len(plt.get_fignums())
+    for step in range(50):
+        view.update(_sim_like(8, step))
+    assert len(set(map(id, target.figures))) == 1
+    assert len(target.figures[0].axes[0].images) == 1
+    assert len(plt.get_fignums()) == open_figures
+    np.testing.assert_array_equal(target.figures[0].axes[0].images[0].get_array(), view.frame)
@@ -2,7 +2,9 @@ import numpy as np
 import pytest
 import sys
 sys.path.append("../src")
-from flamecell.rules import ignite, burning
+from flamecell.rules import ignite, burning, ignite_array, ignite1_array, burning_array, neighborhood_fields, ARRAY_EQUIVALENTS
+from flamecell.rules import CoarseField, field_at
+from flamecell.states import CellState
 
 @pytest.mark.parametrize("state, neighbors, expected", [
     ("TREE", [("FIRE", 0, 1)], "FIRE"),
@@ -30,4 +32,78 @@ def test_burning_still_fire(monkeypatch):
     monkeypatch.setattr(np.random, "randint", lambda a, b: 1)
     new_state, new_health = burning(0, 0, "FIRE", 3, [])
     assert new_state == "FIRE"
-    assert new_health == 2
\ No newline at end of file
+    assert new_health == 2
+
+def _codes(rows):
+    return np.array([[CellState[name] for name in row] for row in rows], dtype=np.uint8)
+
+def test_neighborhood_fields_counts_and_offsets():
+    fire = np.zeros((3, 3), dtype=bool)
+    fire[1, 2] = True
+    fields = neighborhood_fields(fire)
+    assert fields.fire_count[1, 1] == 1
+    assert fields.fire_count[1, 0] == 0
+    # the fire is at dx=+1 of the center cell
+    assert fields.fire_dx[1, 1] == 1
+    assert fields.fire_dy[1, 1] == 0
+    assert fields.wind_alignment(np.array([2, 0]))[1, 1] == 2
+
+def test_ignite_array_ignites_flammable_cells_next_to_fire(monkeypatch):
+    monkeypatch.setattr(np.random, "rand", lambda n: np.zeros(n))
+    state = _codes([["TREE", "FIRE", "WATER"], ["GRASS", "EMPTY", "TREE"], ["TREE", "TREE", "TREE"]])
+    fields = neighborhood_fields(state == CellState.FIRE)
+    new_state, _ = ignite_array(state, np.zeros((3, 3)), fields, prob=1.0, humidity=0.0)
+    np.testing.assert_array_equal(new_state, _codes([["FIRE", "FIRE", "WATER"], ["FIRE", "EMPTY", "FIRE"], ["TREE", "TREE", "TREE"]]))
+
+def test_ignite1_array_ignites_every_flammable_neighbor():
+    state = _codes([["FIRE", "GRASS", "TREE"]])
+    new_state, _ = ignite1_array(state, np.zeros((1, 3)), neighborhood_fields(state == CellState.FIRE))
+    np.testing.assert_array_equal(new_state, _codes([["FIRE", "FIRE", "TREE"]]))
+
+def test_burning_array(monkeypatch):
+    monkeypatch.setattr(np.random, "randint", lambda a, b, size: np.full(size, 2))
+    state = _codes([["FIRE", "FIRE", "TREE"]])
+    health = np.array([[2, 5, 10]], dtype=np.int8)
+    new_state, new_health = burning_array(state, health, None)
+    np.testing.assert_array_equal(new_state, _codes([["ASH", "FIRE", "TREE"]]))
+    np.testing.assert_array_equal(new_health, [[0, 3, 10]])
+
+def test_array_rules_are_tagged():
+    assert ignite_array.rule_kind == "array"
+    assert not hasattr(ignite, "rule_kind")
+    assert ARRAY_EQUIVALENTS[burning] is burning_array
+
+def test_coarse_field_lookup_and_upsampling():
+    field = CoarseField([[1.0, 2.0], [3.0, 4.0]], block=(2, 3), shape=(4, 5))
+    np.testing.assert_array_equal(field.at(np.array([0, 1, 3]), np.array([2, 3, 4])), [1, 2, 4])
+    np.testing.assert_array_equal(field.toarray(), [[1, 1, 1, 2, 2]] * 2 + [[3, 3, 3, 4, 4]] * 2)
+    smooth = field.interpolate()
+    assert smooth.shape == (4, 5)
+    assert smooth[0, 0] == 1.0 and smooth[-1, -1] == 4.0
+    assert 1.0 < smooth[1, 2] < smooth[2, 3] < 4.0
+
+def test_field_at_windowed_and_mapped_cells():
+    grid_field = np.arange(20.0).reshape(4, 5)
+    fields = neighborhood_fields(np.zeros((3, 2, 2), dtype=bool))
+    assert field_at(7.0, fields, np.array([0]), (3, 2, 2)) == 7.0
+    # leading axes are ignored, the window starts at row 1, column 2
+    fields.origin = (1, 2)
+    np.testing.assert_array_equal(field_at(grid_field, fields, np.array([0, 3, 7]), (3, 2, 2)), [7, 13, 13])
+    mapped = neighborhood_fields(np.zeros((1, 2), dtype=bool))
+    mapped.cells = np.array([[6, 19]])
+    np.testing.assert_array_equal(field_at(grid_field, mapped, np.array([1, 0]), (1, 2)), [19, 6])
+    coarse = CoarseField([[0.0, 1.0], [2.0, 3.0]], block=(2, 3), shape=(4, 5))
+    np.testing.assert_array_equal(field_at(coarse, mapped, np.array([1, 0]), (1, 2)), [3, 0])
+
+def test_ignite_array_per_cell_humidity():
+    state = np.full((3, 6), CellState.TREE, dtype=np.uint8)
+    state[1, 2:4] = CellState.FIRE
+    # humid enough on the left to stop any ignition, dry on the right
+    humidity = np.zeros((3, 6))
+    humidity[:, :3] = 120
+    rng = type("Draws", (), {"rand": staticmethod(lambda n: np.zeros(n))})()
+    new_state, _ = ignite_array(state.copy(), np.zeros((3, 6)), neighborhood_fields(state == CellState.FIRE),
+                                prob=1.0, humidity=humidity, rng=rng)
+    ignited = (new_state == CellState.FIRE) & (state != CellState.FIRE)
+    assert not ignited[:, :3].any()
+    assert ignited[:, 4].all() and ignited[[0, 2], 3].all()
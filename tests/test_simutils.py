@@ -4,16 +4,20 @@ from unittest.mock import patch, MagicMock
 import sys
 sys.path.append("../src")
 from flamecell.sim_utils import Grid, RuleSet, Simulation
+from flamecell.rules import ignite, burning, ignite_array, burning_array, array_rule
+from flamecell.states import CellState, NEVER, encode_states, decode_states
 from flamecell.sim_utils import (
     raster_to_cell,
     raster_to_grid,
+    landcover_lut,
     grid_to_img,
     plot_grid,
     plot_risk_map,
     get_current_wind,
     get_current_humidity,
     get_current_temperature,
-    crop_and_resample
+    crop_and_resample,
+    color_map
 )
 
 def test_grid_init():
@@ -204,4 +208,303 @@ def test_crop_and_resample_mocks(transform_bounds_mock, from_bounds_mock):
 
     data, transform = crop_and_resample(mock_src, bounds)
     assert data.shape == (1, 128, 128)
-    assert transform == "dummy_window_transform"
\ No newline at end of file
+    assert transform == "dummy_window_transform"
+
+def _random_grid(size, seed=0):
+    rng = np.random.RandomState(seed)
+    grid = raster_to_grid(rng.choice([31, 32, 0, 5], size=(size, size)))
+    grid.state[size // 2, size // 2] = "FIRE"
+    grid.health[size // 2, size // 2] = 3
+    return grid
+
+def test_simulation_unknown_engine():
+    with pytest.raises(ValueError, match="Unknown engine"):
+        Simulation(Grid(3, 3), RuleSet(), engine="gpu")
+
+def test_vector_engine_matches_cell_engine(monkeypatch):
+    # with deterministic draws both engines must produce identical grids
+    monkeypatch.setattr(np.random, "rand", lambda *shape: np.full(shape, 0.12) if shape else 0.12)
+    monkeypatch.setattr(np.random, "randint", lambda a, b, size=None: np.ones(size, dtype=int) if size is not None else 1)
+    grids = {}
+    for engine in ("cell", "vector"):
+        ruleset = RuleSet()
+        ruleset.add_rule(burning)
+        ruleset.add_rule(ignite)
+        sim = Simulation(_random_grid(12), ruleset, engine=engine)
+        for _ in range(6):
+            sim.step(prob=0.2, humidity=30, wind=np.array([10, -5]), temp=25)
+        grids[engine] = (sim.grid.state, sim.grid.health, sim.ignite_time)
+    for cell, vector in zip(grids["cell"], grids["vector"]):
+        np.testing.assert_array_equal(cell, vector)
+
+def test_vector_engine_rejects_unknown_rule():
+    ruleset = RuleSet()
+    ruleset.add_rule(lambda x, y, state, health, neighbors, **kwargs: (state, health))
+    sim = Simulation(Grid(3, 3), ruleset, engine="vector")
+    with pytest.raises(ValueError, match="no array equivalent"):
+        sim.step()
+
+def test_compact_grid_dtypes_and_conversion():
+    grid = Grid(4, 3, compact=True)
+    assert grid.state.dtype == np.uint8
+    assert grid.health.dtype == np.int8
+    grid.state[0, 0] = CellState.TREE
+    assert grid.state_names()[0, 0] == "TREE"
+    strings = grid.to_strings()
+    assert strings.state[0, 0] == "TREE"
+    assert strings.state[2, 3] == "EMPTY"
+    np.testing.assert_array_equal(strings.to_compact().state, grid.state)
+
+def test_encode_decode_roundtrip():
+    names = np.array([["FIRE", "ASH"], ["WATER", "GRASS"]], dtype=object)
+    codes = encode_states(names)
+    assert codes.dtype == np.uint8
+    assert codes[0, 0] == CellState.FIRE
+    np.testing.assert_array_equal(decode_states(codes), names)
+
+def test_set_state_converts_representation():
+    grid = Grid(2, 1)
+    grid.set_state(np.array([[CellState.FIRE, CellState.ASH]], dtype=np.uint8))
+    assert list(grid.state[0]) == ["FIRE", "ASH"]
+    compact = Grid(2, 1, compact=True)
+    compact.set_state(np.array([["TREE", "WATER"]], dtype=object))
+    assert list(compact.state[0]) == [CellState.TREE, CellState.WATER]
+
+def test_raster_to_grid_compact():
+    grid = raster_to_grid(np.array([[31, 32], [5, 0]]), compact=True)
+    np.testing.assert_array_equal(grid.state, [[CellState.TREE, CellState.GRASS], [CellState.WATER, CellState.EMPTY]])
+    np.testing.assert_array_equal(grid.health, [[10, 4], [0, 0]])
+
+@pytest.mark.parametrize("engine", ["cell", "vector"])
+def test_engines_keep_compact_representation(monkeypatch, engine):
+    monkeypatch.setattr(np.random, "rand", lambda *shape: np.full(shape, 0.12) if shape else 0.12)
+    monkeypatch.setattr(np.random, "randint", lambda a, b, size=None: np.ones(size, dtype=int) if size is not None else 1)
+    ruleset = RuleSet()
+    ruleset.add_rule(burning)
+    ruleset.add_rule(ignite)
+    strings = Simulation(_random_grid(12), ruleset, engine=engine)
+    compact = Simulation(_random_grid(12).to_compact(), ruleset, engine=engine)
+    for _ in range(4):
+        strings.step(prob=0.2, humidity=30, wind=np.array([10, -5]), temp=25)
+        compact.step(prob=0.2, humidity=30, wind=np.array([10, -5]), temp=25)
+    assert compact.grid.state.dtype == np.uint8
+    np.testing.assert_array_equal(compact.grid.state_names(), strings.grid.state)
+    np.testing.assert_array_equal(compact.grid.health, strings.grid.health)
+
+def test_ruleset_rejects_mixed_rule_kinds():
+    ruleset = RuleSet()
+    ruleset.add_rule(burning)
+    with pytest.raises(ValueError, match="Cannot add array rule to a RuleSet of cell rules"):
+        ruleset.add_rule(ignite_array)
+    with pytest.raises(ValueError, match="Unknown rule kind"):
+        RuleSet().add_rule(burning, kind="tile")
+
+def test_cell_engine_rejects_array_rules():
+    ruleset = RuleSet()
+    ruleset.add_rule(burning_array)
+    with pytest.raises(ValueError, match="cannot apply array rules"):
+        Simulation(Grid(3, 3), ruleset)
+
+def test_custom_array_rule_runs_in_vector_engine():
+    @array_rule
+    def soak(state, health, fields, moisture=0.0, **kwargs):
+        # wet fuel next to a fire turns to water
+        state[(fields.fire_count > 0) & (state == CellState.TREE) & (moisture > 0.5)] = CellState.WATER
+        return state, health
+
+    grid = Grid(3, 1, compact=True)
+    grid.state[0] = [CellState.FIRE, CellState.TREE, CellState.TREE]
+    ruleset = RuleSet()
+    ruleset.add_rule(soak)
+    sim = Simulation(grid, ruleset, engine="vector")
+    sim.step(moisture=0.8)
+    np.testing.assert_array_equal(grid.state[0], [CellState.FIRE, CellState.WATER, CellState.TREE])
+
+@pytest.mark.parametrize("size, tile_size", [(16, 4), (19, 5)])
+def test_sparse_engine_matches_vector_engine(monkeypatch, size, tile_size):
+    monkeypatch.setattr(np.random, "rand", lambda *shape: np.full(shape, 0.12))
+    monkeypatch.setattr(np.random, "randint", lambda a, b, size=None: np.ones(size, dtype=int))
+    results = {}
+    for engine in ("vector", "sparse"):
+        ruleset = RuleSet()
+        ruleset.add_rule(burning)
+        ruleset.add_rule(ignite)
+        grid = _random_grid(size).to_compact()
+        grid.state[0, size - 1] = CellState.FIRE
+        sim = Simulation(grid, ruleset, engine=engine, tile_size=tile_size)
+        for _ in range(10):
+            sim.step(prob=0.3, humidity=30, wind=np.array([10, -5]), temp=25)
+        results[engine] = (grid.state, grid.health, sim.ignite_time)
+    for vector, sparse in zip(results["vector"], results["sparse"]):
+        np.testing.assert_array_equal(vector, sparse)
+
+def test_sparse_engine_needs_compact_grid():
+    with pytest.raises(ValueError, match="compact grid"):
+        Simulation(Grid(3, 3), RuleSet(), engine="sparse")
+
+def test_sparse_engine_tracks_active_tiles():
+    ruleset = RuleSet()
+    ruleset.add_rule(burning)
+    grid = Grid(8, 8, compact=True)
+    sim = Simulation(grid, ruleset, engine="sparse", tile_size=4)
+    sim.step()
+    assert not sim.active_tiles.any()
+    grid.state[5, 6] = CellState.FIRE
+    grid.health[5, 6] = 1
+    sim.reset_active_front()
+    np.testing.assert_array_equal(sim.active_tiles, [[False, False], [False, True]])
+    sim.step()
+    assert grid.state[5, 6] == CellState.ASH
+    assert not sim.active_tiles.any()
+
+def _burning_ruleset():
+    ruleset = RuleSet()
+    ruleset.add_rule(burning)
+    ruleset.add_rule(ignite)
+    return ruleset
+
+@pytest.mark.parametrize("engine", ["cell", "vector", "sparse"])
+def test_fire_counts_follow_the_grid(engine):
+    np.random.seed(3)
+    sim = Simulation(_random_grid(15).to_compact(), _burning_ruleset(), engine=engine, tile_size=4)
+    for _ in range(8):
+        sim.step(prob=0.5, humidity=20)
+        codes = sim.grid.state
+        assert sim.fire_count == np.count_nonzero(codes == CellState.FIRE)
+        assert sim.burned_area == np.count_nonzero((codes == CellState.FIRE) | (codes == CellState.ASH))
+
+@pytest.mark.parametrize("engine", ["cell", "vector", "sparse"])
+def test_ignition_and_burnout_times_follow_transitions(engine):
+    np.random.seed(4)
+    sim = Simulation(_random_grid(15).to_compact(), _burning_ruleset(), engine=engine, tile_size=4)
+    start = sim.grid.state == CellState.FIRE
+    previous = start.copy()
+    for step in range(1, 10):
+        sim.step(prob=0.5, humidity=20)
+        fire = sim.grid.state == CellState.FIRE
+        # cells get the step they caught fire and keep it while burning
+        assert (sim.ignite_time[fire & ~previous] == step).all()
+        assert (sim.burnout_time[previous & ~fire] == step).all()
+        previous = fire
+    codes = sim.grid.state
+    burned = (codes == CellState.FIRE) | (codes == CellState.ASH)
+    np.testing.assert_array_equal(sim.ignite_time != NEVER, burned)
+    assert (sim.ignite_time[start] == 0).all()
+    assert ((sim.burnout_time != NEVER) == (codes == CellState.ASH)).all()
+    duration = sim.burn_duration
+    assert (duration[~burned] == NEVER).all()
+    np.testing.assert_array_equal(duration[codes == CellState.ASH],
+                                  (sim.burnout_time - sim.ignite_time)[codes == CellState.ASH])
+    np.testing.assert_array_equal(duration[codes == CellState.FIRE],
+                                  sim.step_count - sim.ignite_time[codes == CellState.FIRE])
+
+def test_fire_series_are_recorded_per_step():
+    np.random.seed(5)
+    sim = Simulation(_random_grid(15).to_compact(), _burning_ruleset(), engine="vector")
+    counts = []
+    sim.run(max_steps=6, prob=0.5, humidity=20, callback=lambda s: counts.append((s.fire_count, s.burned_area)))
+    assert len(sim.front_series) == len(sim.burned_series) == 7
+    np.testing.assert_array_equal(sim.front_series[1:], [fire for fire, _ in counts])
+    np.testing.assert_array_equal(sim.burned_series[1:], [area for _, area in counts])
+    assert (np.diff(sim.burned_series) >= 0).all()
+    assert sim.burned_series[-1] == np.count_nonzero(sim.ignite_time != NEVER)
+
+def test_run_stops_when_extinguished():
+    grid = Grid(3, 3, compact=True)
+    grid.state[1, 1] = CellState.FIRE
+    grid.health[1, 1] = 1
+    sim = Simulation(grid, _burning_ruleset(), engine="vector")
+    result = sim.run(max_steps=50)
+    assert result.reason == "extinguished"
+    assert result.steps == 1
+    assert result.step_count == sim.step_count == 1
+
+def test_run_stops_at_max_steps_and_calls_back():
+    grid = Grid(3, 3, compact=True)
+    grid.state[1, 1] = CellState.FIRE
+    grid.health[1, 1] = 100
+    seen = []
+    sim = Simulation(grid, _burning_ruleset(), engine="vector")
+    result = sim.run(max_steps=5, callback=lambda s: seen.append(s.step_count))
+    assert result.reason == "max_steps"
+    assert seen == [1, 2, 3, 4, 5]
+
+def test_run_stops_when_burned_area_stabilizes():
+    grid = Grid(3, 3, compact=True)
+    grid.state[1, 1] = CellState.FIRE
+    grid.health[1, 1] = 100
+    sim = Simulation(grid, _burning_ruleset(), engine="vector")
+    result = sim.run(stable_steps=3)
+    assert result.reason == "stabilized"
+    assert result.steps == 3
+
+def test_run_stops_on_time_budget():
+    grid = Grid(3, 3, compact=True)
+    grid.state[1, 1] = CellState.FIRE
+    grid.health[1, 1] = 100
+    sim = Simulation(grid, _burning_ruleset(), engine="vector")
+    assert sim.run(time_budget=0).reason == "time_budget"
+
+def test_run_stops_when_cancelled():
+    grid = Grid(3, 3, compact=True)
+    grid.state[1, 1] = CellState.FIRE
+    grid.health[1, 1] = 100
+    sim = Simulation(grid, _burning_ruleset(), engine="vector")
+    result = sim.run(max_steps=50, should_stop=lambda: sim.step_count >= 2)
+    assert result.reason == "cancelled"
+    assert result.steps == 2
+
+def test_plot_risk_map_accepts_custom_risk():
+    grid = Grid(2, 2)
+    sim = Simulation(grid, ruleset=MagicMock())
+    fig = plot_risk_map(sim, risk=np.array([[0.0, 0.5], [1.0, np.nan]]))
+    img = fig.axes[0].images[0].get_array()
+    empty = np.array(color_map["EMPTY"])
+    # the overlay is blended into the one image; NaN cells keep the state color
+    assert len(fig.axes[0].images) == 1
+    assert np.allclose(img[1, 0], 0.6 * empty + 0.4)
+    assert np.allclose(img[1, 1], empty)
+
+def test_raster_to_grid_type_error():
+    with pytest.raises(TypeError):
+        raster_to_grid(np.array([[31.0, 32.0]]))
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.int16, np.int64])
+def test_raster_to_grid_lookup_matches_raster_to_cell(dtype):
+    values = [0, 4, 5, 22, 31, 32, 40, 200]
+    data = np.array([values], dtype=dtype)
+    grid = raster_to_grid(data)
+    assert list(grid.state[0]) == [raster_to_cell(int(v)) for v in values]
+
+def test_raster_to_grid_handles_classes_outside_the_table():
+    grid = raster_to_grid(np.array([[-3, 31, 70000]]), compact=True)
+    np.testing.assert_array_equal(grid.state[0], [CellState.EMPTY, CellState.TREE, CellState.EMPTY])
+
+def test_raster_to_grid_custom_mapping_and_health():
+    mapping = {10: "TREE", 20: "GRASS", 80: "WATER"}
+    grid = raster_to_grid(np.array([[10, 20, 80, 31]], dtype=np.uint8), compact=True,
+                          mapping=mapping, health={"TREE": 12, "GRASS": 3})
+    np.testing.assert_array_equal(grid.state[0], [CellState.TREE, CellState.GRASS, CellState.WATER, CellState.EMPTY])
+    np.testing.assert_array_equal(grid.health[0], [12, 3, 0, 0])
+    assert raster_to_cell(80, mapping) == "WATER"
+
+@pytest.mark.parametrize("mapping, health", [
+    ({1: "LAVA"}, None),
+    ({-1: "TREE"}, None),
+    (None, {"TREE": 500}),
+])
+def test_landcover_lut_validation(mapping, health):
+    with pytest.raises(ValueError):
+        landcover_lut(mapping, health)
+
+def test_core_import_does_not_load_io_or_plotting():
+    import os
+    import subprocess
+    import flamecell
+    code = ("import sys, flamecell.sim_utils as su; "
+            "heavy = [m for m in ('matplotlib', 'requests', 'rasterio') if m in sys.modules]; "
+            "su.plt; print(heavy, 'matplotlib.pyplot' in sys.modules)")
+    src = os.path.dirname(os.path.dirname(flamecell.__file__))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         env={**os.environ, "PYTHONPATH": src, "MPLBACKEND": "Agg"}).stdout
+    assert out.split() == ["[]", "True"]
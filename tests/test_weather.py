@@ -0,0 +1,136 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pytest
+import sys
+sys.path.append("../src")
+from flamecell.sim_utils import Grid, RuleSet, Simulation
+from flamecell.rules import array_rule
+from flamecell.weather import CURRENT_VARIABLES, Weather, WeatherClient, WeatherError, WeatherSchedule
+
+CURRENT = {"time": "2024-07-01T12:00", "temperature_2m": 24.5, "relative_humidity_2m": 35,
+           "wind_speed_10m": 12.0, "wind_direction_10m": 90}
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(parse_qs(urlparse(self.path).query))
+        status, body = server.reply
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.requests = []
+    httpd.reply = (200, json.dumps({"current": CURRENT}))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def _client(server, **kwargs):
+    return WeatherClient(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1/forecast", **kwargs)
+
+def test_current_requests_all_variables_at_once(server):
+    weather = _client(server).current(51.16571, 10.45149)
+    assert weather == Weather(24.5, 35.0, 12.0, 90.0, "2024-07-01T12:00", 51.17, 10.45)
+    assert len(server.requests) == 1
+    query = server.requests[0]
+    assert query["current"] == [",".join(CURRENT_VARIABLES)]
+    assert query["latitude"] == ["51.17"] and query["longitude"] == ["10.45"]
+    np.testing.assert_allclose(weather.wind, [0.0, 12.0], atol=1e-9)
+
+def test_current_is_cached_per_rounded_location(server):
+    now = [0.0]
+    client = _client(server, ttl=60, clock=lambda: now[0])
+    client.current(51.161, 10.451)
+    client.current(51.164, 10.449)
+    assert len(server.requests) == 1
+    client.current(48.0, 11.0)
+    assert len(server.requests) == 2
+    now[0] = 61
+    client.current(51.161, 10.451)
+    assert len(server.requests) == 3
+    client.clear_cache()
+    client.current(51.161, 10.451)
+    assert len(server.requests) == 4
+
+@pytest.mark.parametrize("reply, message", [
+    ((500, "{}"), "request failed"),
+    ((200, "not json"), "not valid JSON"),
+    ((200, json.dumps({"current": {"time": "now"}})), "missing"),
+])
+def test_current_errors(server, reply, message):
+    server.reply = reply
+    client = _client(server)
+    with pytest.raises(WeatherError, match=message):
+        client.current(50, 10)
+    # failures are not cached
+    server.reply = (200, json.dumps({"current": CURRENT}))
+    assert client.current(50, 10).temperature == 24.5
+
+def test_unreachable_server():
+    client = WeatherClient(base_url="http://127.0.0.1:9/forecast", timeout=1)
+    with pytest.raises(WeatherError, match="request failed"):
+        client.current(50, 10)
+
+def test_forecast_single_request_and_cache(server):
+    server.reply = (200, json.dumps({"hourly": {
+        "time": ["2024-07-01T00:00", "2024-07-01T01:00", "2024-07-01T02:00"],
+        "temperature_2m": [20, 22, 24], "relative_humidity_2m": [50, 40, 30],
+        "wind_speed_10m": [10, 10, 10], "wind_direction_10m": [0, 90, 180]}}))
+    client = _client(server)
+    forecast = client.forecast(50, 10, hours=3)
+    assert client.forecast(50, 10, hours=3) is forecast
+    assert len(server.requests) == 1
+    assert server.requests[0]["hourly"] == [",".join(CURRENT_VARIABLES)]
+    assert server.requests[0]["forecast_hours"] == ["3"]
+    np.testing.assert_array_equal(forecast.temperature, [20, 22, 24])
+
+    schedule = WeatherSchedule.from_forecast(forecast, steps=6, step_minutes=30)
+    assert len(schedule) == 6
+    np.testing.assert_allclose(schedule.temperature, [20, 21, 22, 23, 24, 24])
+    np.testing.assert_allclose(schedule.humidity, [50, 45, 40, 35, 30, 30])
+    # wind is interpolated as a vector: halfway between east and north
+    np.testing.assert_allclose(schedule.at(1)["wind"], [5, 5], atol=1e-9)
+    assert schedule.at(100) == schedule.at(5)
+
+def test_schedule_from_csv(tmp_path):
+    path = tmp_path / "weather.csv"
+    path.write_text("time,temperature,humidity,wind_speed,wind_direction\n"
+                    "2024-07-01T06:00,10,80,0,0\n"
+                    "2024-07-01T08:00,30,20,4,0\n")
+    schedule = WeatherSchedule.from_csv(str(path), steps=5)
+    np.testing.assert_allclose(schedule.temperature, [10, 20, 30, 30, 30])
+    assert schedule.at(1) == {"temp": 20.0, "humidity": 50.0, "wind": pytest.approx(np.array([2.0, 0.0]))}
+    hourly = tmp_path / "hourly.csv"
+    hourly.write_text("hour,temperature,humidity,wind_speed,wind_direction\n0,1,2,3,4\n")
+    assert WeatherSchedule.from_csv(str(hourly), steps=2).at(1)["temp"] == 1.0
+    bad = tmp_path / "bad.csv"
+    bad.write_text("hour,temperature\n0,1\n")
+    with pytest.raises(ValueError, match="needs the columns"):
+        WeatherSchedule.from_csv(str(bad), steps=2)
+
+def test_run_uses_schedule():
+    grid = Grid(3, 3, compact=True)
+    grid.state[1, 1] = 4
+    grid.health[1, 1] = 100
+    seen = []
+    @array_rule
+    def record(state, health, fields, **kwargs):
+        seen.append((kwargs["temp"], kwargs["humidity"], kwargs["prob"]))
+        return state, health
+    ruleset = RuleSet()
+    ruleset.add_rule(record)
+    schedule = WeatherSchedule([0, 3], [10, 40], [60, 30], [0, 0], [0, 0], steps=4)
+    Simulation(grid, ruleset, engine="vector").run(max_steps=5, weather=schedule, prob=0.3, humidity=99)
+    assert seen == [(10, 60, 0.3), (20, 50, 0.3), (30, 40, 0.3), (40, 30, 0.3), (40, 30, 0.3)]
@@ -0,0 +1,55 @@
+import time
+import pytest
+import sys
+sys.path.append("../src")
+from flamecell.worker import SimulationWorker
+
+
+def _wait_for(condition, timeout=5.0):
+    end = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < end, "timed out"
+        time.sleep(0.001)
+
+@pytest.fixture
+def sim(make_sim):
+    # a long-burning fire in a forest
+    return make_sim(16, fuel="forest", fire_health=100, seed=0)
+
+def test_worker_runs_to_completion_with_bounded_queue(sim):
+    worker = SimulationWorker(sim, max_frames=2, max_size=8)
+    worker.start(max_steps=30, prob=0.5)
+    result = worker.join(timeout=10)
+    assert worker.done and worker.error is None
+    assert result.reason == "max_steps" and result.step_count == 30
+    assert worker.frames.qsize() <= 2
+    frame = worker.latest()
+    assert frame.step == 30
+    assert frame.image.shape == (8, 8, 3)
+    assert frame.fire_count == worker.sim.fire_count
+    assert worker.latest() is None
+
+def test_worker_pause_resume_cancel(sim):
+    worker = SimulationWorker(sim)
+    worker.pause()
+    worker.start(max_steps=100000, prob=0.5)
+    _wait_for(lambda: worker.sim.step_count == 1)
+    time.sleep(0.05)
+    # paused after the first step
+    assert worker.paused and worker.running and worker.sim.step_count == 1
+    worker.resume()
+    _wait_for(lambda: worker.sim.step_count > 5)
+    worker.cancel()
+    result = worker.join(timeout=10)
+    assert result.reason == "cancelled"
+    assert not worker.running
+
+def test_worker_reports_errors(sim):
+    # a cell rule without an array form cannot run on the vector engine
+    sim.ruleset.add_rule(lambda *args, **kwargs: None)
+    worker = SimulationWorker(sim)
+    worker.start(max_steps=5)
+    assert worker.join(timeout=10) is None
+    assert isinstance(worker.error, ValueError)
+    with pytest.raises(RuntimeError):
+        worker.start()